@@ -0,0 +1,327 @@
+"""
+Click counters for campaign reporting.
+
+Every redirect (302 or fallback page) counts one click under its key
+``(route, env_type, src, campaign, ad_id)``. Keys are interned once into
+an index; counts live in arrays indexed by it:
+
+- totals since the worker started
+- per-minute counts in a ring of CLICK_ROLLUP_MINUTES slots, each slot
+  reused (and zeroed) when its minute comes round again
+
+Recording a click is a dict lookup and two array increments, with no I/O.
+Every CLICK_PUBLISH_INTERVAL seconds each worker writes its counts to
+``worker_<pid>.json`` in the ``clicks`` subdirectory of the metrics
+directory; /clicks adds up the files of the running workers (its own counts
+taken live), so it reports every worker, the others as of their last write.
+Every CLICK_SUMMARY_INTERVAL seconds each worker also logs the clicks
+counted since its previous summary as one "Click summary" line, so summing
+those lines gives totals across restarts.
+
+Once CLICK_MAX_KEYS keys exist, clicks with a new key are counted under
+``(route, env_type, "(other)", "(other)", "(other)")``, so memory stays
+bounded whatever values src, campaign and ad_id take.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from array import array
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.metrics import clear_metrics_dir, metrics_dir, pid_running, worker_pid
+
+logger = get_logger("clicks")
+
+ClickKey = Tuple[str, str, Optional[str], Optional[str], Optional[str]]
+KEY_FIELDS = ("route", "env_type", "src", "campaign", "ad_id")
+OVERFLOW = "(other)"
+
+# False in contexts whose redirects are not real clicks (the warmup)
+_counting: ContextVar[bool] = ContextVar("count_clicks", default=True)
+
+
+def pause_counting() -> None:
+    """Stop counting clicks in the current context (e.g. the warmup task)."""
+    _counting.set(False)
+
+
+def counting() -> bool:
+    """Whether redirects in the current context are clicks."""
+    return _counting.get()
+
+
+def _zeros(length: int) -> array:
+    return array("Q", bytes(8 * length))
+
+
+def _minute_iso(minute: int) -> str:
+    return datetime.fromtimestamp(minute * 60, timezone.utc).isoformat()
+
+
+def clicks_dir() -> str:
+    """Return the directory holding the per-worker click count files."""
+    return os.path.join(metrics_dir(), "clicks")
+
+
+def clear_click_files() -> int:
+    """Delete every worker's click count file (in the gunicorn master)."""
+    return clear_metrics_dir(clicks_dir(), ".json")
+
+
+class ClickCounters:
+    """
+    Click counts of this worker, by key, in total and per minute.
+
+    Args:
+        minutes: Length of the per-minute ring (minutes of history kept)
+        max_keys: Distinct keys counted before new ones fold into OVERFLOW
+        directory: Where the worker's counts are published for /clicks
+    """
+
+    def __init__(self, minutes: int, max_keys: int, directory: str) -> None:
+        self.minutes = minutes
+        self.max_keys = max_keys
+        self.directory = directory
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget every count (a forked worker starts from zero)."""
+        # A file under this PID was left by an exited process
+        try:
+            os.unlink(self.path())
+        except OSError:
+            pass
+        self.started = time.time()
+        self.overflowed = 0
+        self._index: Dict[ClickKey, int] = {}
+        self._keys: List[ClickKey] = []
+        self._totals = _zeros(0)
+        self._summarized = _zeros(0)  # totals at the previous summary
+        self._last_summary = self.started
+        self._slot_minute = array("q", [-1]) * self.minutes
+        self._slots = [_zeros(0) for _ in range(self.minutes)]
+
+    def record(
+        self,
+        route: str,
+        env_type: str,
+        src: Optional[str],
+        campaign: Optional[str],
+        ad_id: Optional[str],
+    ) -> None:
+        """Count one click."""
+        key = (route, env_type, src, campaign, ad_id)
+        index = self._index.get(key)
+        if index is None:
+            index = self._add(key)
+        self._totals[index] += 1
+
+        minute = int(time.time() // 60)
+        slot = minute % self.minutes
+        counts = self._slots[slot]
+        if self._slot_minute[slot] != minute:
+            self._slot_minute[slot] = minute
+            counts = self._slots[slot] = _zeros(len(self._keys))
+        elif index >= len(counts):
+            counts.frombytes(bytes(8 * (len(self._keys) - len(counts))))
+        counts[index] += 1
+
+    def _add(self, key: ClickKey) -> int:
+        """Index of a key not seen yet (or of its overflow key)."""
+        if len(self._keys) >= self.max_keys:
+            self.overflowed += 1
+            key = (key[0], key[1], OVERFLOW, OVERFLOW, OVERFLOW)
+            index = self._index.get(key)
+            if index is not None:
+                return index
+        # src, campaign and ad_id repeat across keys: keep one copy of each
+        route, env_type, *values = key
+        key = (route, env_type, *(sys.intern(v) if v else v for v in values))
+        index = len(self._keys)
+        self._index[key] = index
+        self._keys.append(key)
+        self._totals.append(0)
+        self._summarized.append(0)
+        return index
+
+    def path(self) -> str:
+        """This worker's click count file."""
+        return os.path.join(self.directory, f"worker_{os.getpid()}.json")
+
+    def export(self) -> Dict[str, Any]:
+        """Keys, totals and the minutes held in the ring, as plain JSON data."""
+        return {
+            "pid": os.getpid(),
+            "started": self.started,
+            "overflowed": self.overflowed,
+            "keys": self._keys,
+            "totals": self._totals.tolist(),
+            "minutes": [
+                [minute, self._slots[slot].tolist()]
+                for slot, minute in enumerate(self._slot_minute)
+                if minute >= 0
+            ],
+        }
+
+    def publish(self) -> None:
+        """Write this worker's counts for /clicks (replacing the previous file)."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.export(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    async def run_publishing(self, interval: float) -> None:
+        """Publish every `interval` seconds (runs until cancelled)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.publish()
+            except OSError as exc:
+                logger.warning("Could not publish click counts", extra={"error": str(exc)})
+
+    def snapshot(self, minutes: int) -> Dict[str, Any]:
+        """Totals and the last `minutes` minutes of every running worker, for /clicks."""
+        exports = [self.export()]
+        exports.extend(read_exports(self.directory, skip_pid=os.getpid()))
+        return aggregate(exports, min(minutes, self.minutes))
+
+    def summarize(self) -> None:
+        """Log the clicks counted since the previous summary, as one line."""
+        now = time.time()
+        counts = [
+            [*key, total - summarized]
+            for key, total, summarized in zip(self._keys, self._totals, self._summarized)
+            if total != summarized
+        ]
+        interval = round(now - self._last_summary, 1)
+        self._summarized = array("Q", self._totals)
+        self._last_summary = now
+        if not counts:
+            return
+        logger.info(
+            "Click summary",
+            extra={
+                "clicks": sum(count[-1] for count in counts),
+                "interval_s": interval,
+                "fields": KEY_FIELDS,
+                "counts": counts,
+            },
+        )
+
+    async def run_summaries(self, interval: float) -> None:
+        """Log a summary every `interval` seconds (runs until cancelled)."""
+        while True:
+            await asyncio.sleep(interval)
+            self.summarize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._keys),
+            "max_keys": self.max_keys,
+            "total": sum(self._totals),
+            "overflowed": self.overflowed,
+        }
+
+
+def read_exports(directory: str, skip_pid: int = 0) -> List[Dict[str, Any]]:
+    """
+    Load the published counts of the running workers.
+
+    Files of workers that have exited are deleted; unreadable ones skipped.
+    """
+    exports = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return exports
+    for name in names:
+        pid = worker_pid(name, ".json")
+        if pid is None or pid == skip_pid:
+            continue
+        path = os.path.join(directory, name)
+        if not pid_running(pid):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                exports.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return exports
+
+
+def aggregate(exports: Iterable[Dict[str, Any]], minutes: int) -> Dict[str, Any]:
+    """
+    Add up exported counts, for /clicks.
+
+    Args:
+        exports: Counts of each worker, as returned by ClickCounters.export
+        minutes: Minutes of recent counts, the current one included
+
+    Returns:
+        Totals and recent counts per key, clicks per minute newest first
+    """
+    current = int(time.time() // 60)
+    per_minute = dict.fromkeys(range(current, current - minutes, -1), 0)
+    rows: Dict[ClickKey, List[int]] = {}  # key -> [total, recent]
+    workers = overflowed = 0
+    started = time.time()
+    for export in exports:
+        workers += 1
+        overflowed += export["overflowed"]
+        started = min(started, export["started"])
+        keys = [tuple(key) for key in export["keys"]]
+        for key, total in zip(keys, export["totals"]):
+            rows.setdefault(key, [0, 0])[0] += total
+        for minute, counts in export["minutes"]:
+            if minute in per_minute:
+                for key, count in zip(keys, counts):
+                    rows[key][1] += count
+                per_minute[minute] += sum(counts)
+
+    clicks = [
+        {**dict(zip(KEY_FIELDS, key)), "total": total, "recent": recent}
+        for key, (total, recent) in rows.items()
+    ]
+    clicks.sort(key=lambda row: row["total"], reverse=True)
+    return {
+        "workers": workers,
+        "since": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "total": sum(row["total"] for row in clicks),
+        "keys": len(rows),
+        "overflowed": overflowed,
+        "minutes": len(per_minute),
+        "per_minute": [
+            {"minute": _minute_iso(minute), "clicks": count}
+            for minute, count in per_minute.items()
+        ],
+        "clicks": clicks,
+    }
+
+
+click_counters: Optional[ClickCounters] = None
+if settings.enable_click_counters:
+    click_counters = ClickCounters(
+        settings.click_rollup_minutes, settings.click_max_keys, clicks_dir()
+    )
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=click_counters.reset)
+
+
+def get_click_stats() -> Dict[str, Any]:
+    """Return click counter sizes for this worker."""
+    if click_counters is None:
+        return {"enabled": False}
+    return {"enabled": True, **click_counters.stats()}
@@ -0,0 +1,181 @@
+"""
+Compressed responses for the HTML fallback pages and their stylesheets.
+
+The pages are several KB of mostly static CSS and JS, and a campaign link
+renders the same bytes for every visitor, so compressed bodies are kept in
+an LRU cache keyed by the rendered page: a repeat visit costs one dict
+lookup instead of a compression run. Brotli is used when the ``brotli``
+package is installed and the client accepts it, gzip otherwise.
+
+Only complete HTML and CSS bodies are touched; redirects, JSON and
+anything below the minimum size pass through unchanged. A compressed body
+is a different representation, so its ETag gets the encoding as a suffix
+(``"<hash>"`` becomes ``"<hash>-br"``).
+"""
+
+import gzip
+from functools import lru_cache
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.timing import mark
+
+try:  # Optional, better compression ratio for text
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+# Encodings we can produce, in order of preference
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+VARY_HEADER = (b"vary", b"Accept-Encoding")
+COMPRESSIBLE_TYPES = (b"text/html", b"text/css")
+
+# Brotli above 5 costs many times the CPU for a few percent smaller pages
+# (quality 11 takes ~15ms per page); cache misses happen on the event loop
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 9
+
+
+@lru_cache(maxsize=64)
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the response encoding for an Accept-Encoding header.
+
+    Args:
+        accept_encoding: Raw header value (may be empty)
+
+    Returns:
+        "br", "gzip", or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+@lru_cache(maxsize=settings.compression_cache_size)
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a response body, cached by (body, encoding).
+
+    Each distinct page is compressed once per worker and then served from
+    the cache.
+    """
+    if encoding == "br":
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of a body compressed with `encoding` (unchanged if not quoted)."""
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    """True for HTML/CSS responses that are not already encoded."""
+    compressible = False
+    for key, value in headers:
+        if key == b"content-encoding":
+            return False
+        if key == b"content-type":
+            compressible = value.startswith(COMPRESSIBLE_TYPES)
+    return compressible
+
+
+class CompressionMiddleware:
+    """
+    Compress HTML and CSS responses according to the client's Accept-Encoding.
+
+    The response start is held back until the body arrives, so the
+    Content-Length can be rewritten; streamed bodies are sent as they are.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = b""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept_encoding = value
+                break
+        encoding = negotiate(accept_encoding.decode("latin-1"))
+        held: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal held
+            if message["type"] == "http.response.start":
+                if _is_compressible(message.get("headers", [])):
+                    held = message
+                    return
+                await send(message)
+                return
+
+            if held is None:
+                await send(message)
+                return
+
+            start, held = held, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            headers = []
+            for key, value in start.get("headers", []):
+                if key == b"content-length":
+                    continue
+                if key == b"etag" and encoding is not None:
+                    value = encoded_etag(value.decode("latin-1"), encoding).encode("latin-1")
+                headers.append((key, value))
+            headers.append(VARY_HEADER)
+            if encoding is not None:
+                started = perf_counter()
+                body = compress(body, encoding)
+                mark("compress", started)
+                headers.append((b"content-encoding", encoding.encode("ascii")))
+            headers.append((b"content-length", str(len(body)).encode("ascii")))
+
+            await send({**start, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def get_compression_stats() -> Dict[str, Any]:
+    """Return compression cache counters for this worker."""
+    info = compress.cache_info()
+    return {
+        "enabled": settings.enable_compression,
+        "encodings": list(ENCODINGS),
+        "cache_hits": info.hits,
+        "cache_misses": info.misses,
+        "cache_size": info.currsize,
+    }
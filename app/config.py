@@ -29,15 +29,25 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     workers: int = 4
+    preload_app: bool = True  # gunicorn: import once in the master, fork workers
 
     # Logging
     log_level: str = "INFO"
     log_format: str = "json"  # json or text
+    log_queue_enabled: bool = True  # write logs from a background thread
+    log_queue_size: int = 10000  # max records buffered before overflow
+    log_queue_overflow: str = "drop_oldest"  # drop_oldest or block
+    log_batch_size: int = 256  # max records per write to stdout
 
     # Security
     allowed_origins: List[str] = ["*"]
     rate_limit_requests: int = 100
     rate_limit_window: int = 60  # seconds
+    rate_limit_table_size: int = 65536  # client buckets shared by all workers
+    rate_limit_file: str = ""  # defaults to <tmpdir>/tal_redirector_ratelimit.db
+    # Proxies whose X-Forwarded-For is believed: addresses/networks, comma-separated,
+    # or * for whichever peer connects (see app.proxies)
+    trusted_proxies: str = ""
 
     # WhatsApp defaults
     default_whatsapp_message: str = ""
@@ -46,10 +56,58 @@ class Settings(BaseSettings):
     phone_min_length: int = 10
     phone_max_length: int = 15
 
+    # Short links (/s/{code}): JSON file or SQLite database, empty to disable
+    short_links_file: str = ""
+
+    # Caches
+    ua_cache_size: int = 1024  # distinct User-Agents kept classified
+    phone_cache_size: int = 256  # distinct phone inputs kept normalized
+    link_cache_size: int = 256  # (phone, text) URL bundles kept built
+    qr_cache_size: int = 256  # rendered QR codes kept per worker
+    qr_max_url_length: int = 160  # longer wa.me URLs are encoded without their text
+    compression_cache_size: int = 256  # compressed HTML pages kept per worker
+
     # Feature flags
     enable_metrics: bool = True
+    enable_rate_limit: bool = False  # needs TRUSTED_PROXIES behind a load balancer
+    enable_compression: bool = True
+    enable_static_assets: bool = True  # serve page stylesheets from /static
+    enable_fast_path: bool = True  # serve redirect 302s without the router
+    enable_server_timing: bool = True  # per-phase Server-Timing header and log
+    enable_warmup: bool = True  # warm each worker up; /ready is 503 until done
+
+    enable_click_counters: bool = True  # count clicks per route/env/src/campaign/ad
+
+    # Click counters (per worker, see app.clicks)
+    click_rollup_minutes: int = 60  # minutes of per-minute counts kept
+    click_max_keys: int = 10000  # distinct keys before new ones fold into "(other)"
+    click_summary_interval: int = 60  # seconds between summary log lines, 0 = never
+    click_publish_interval: int = 10  # seconds between writes of a worker's counts for /clicks
+    clicks_token: str = ""  # bearer token for /clicks; without one it is off in production
+
+    # Click journal (append-only binary records per click, see app.journal)
+    journal_dir: str = ""  # directory of the journal segments, empty to disable
+    journal_segment_bytes: int = 64 * 1024 * 1024  # size at which a segment rotates
+    journal_commit_interval_ms: int = 50  # group commit (write + fsync) interval
+    journal_max_pending: int = 100000  # clicks buffered between commits, then dropped
+    journal_ip_salt: str = ""  # key for hashing client IPs; empty = random per worker
+
+    # Warmup: in-process requests sent to each redirect route at startup
+    warmup_requests_per_route: int = 7
+
+    # Compression (gzip, or brotli when installed) of the HTML pages
+    compression_min_size: int = 1024  # bytes; smaller bodies are sent as-is
+
+    # Metrics (one memory-mapped file per worker, summed on /metrics)
+    metrics_dir: str = ""  # defaults to <tmpdir>/tal_redirector_metrics
+    metrics_token: str = ""  # bearer token for /metrics; without one it is off in production
     enable_request_logging: bool = True
 
+    # Request profiling (off unless a secret or a sample rate is set)
+    profiling_secret: str = ""  # HMAC key for the signed X-Profile header
+    profiling_sample_rate: float = 0.0  # fraction of requests profiled
+    profiling_buffer_size: int = 32  # profiles kept per worker
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -0,0 +1,123 @@
+"""
+Raw ASGI fast path for the redirect routes.
+
+Almost all traffic is /w, answered with a plain 302 to wa.me, and every
+other redirect route answers safe environments the same way. This layer
+sits in front of the FastAPI router and serves those 302s itself: it parses
+the query string, applies the same limits as the routes' Query parameters
+and the same phone validation, and sends the redirect from prebuilt header
+bytes, skipping dependency resolution, pydantic validation and Response
+objects.
+
+Anything it cannot answer with a 302 goes to the router unchanged: invalid
+or repeated parameters, fallback pages, other methods. Error pages, 422s
+and pages therefore come from exactly the same code as before.
+"""
+
+from time import perf_counter
+from typing import Dict
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.proxies import client_ip
+from app.strategies import STRATEGIES, RedirectStrategy, log_redirect, shows_page
+from app.timing import mark
+from app.utils import classify_ua, get_link_target, normalize_phone
+
+# Same limits as the redirect routes' query parameters (routes.py)
+_PHONE_LENGTH = (10, 15)
+_MAX_LENGTHS = {"text": 1000, "src": 50, "campaign": 100, "ad_id": 100}
+_DEBUG_VALUES = {"0": 0, "1": 1}
+
+_CONTENT_LENGTH_0 = (b"content-length", b"0")
+
+
+class FastPathMiddleware:
+    """
+    Serve redirect-route 302s without going through the FastAPI router.
+
+    Args:
+        app: The application to fall back to
+        strategies: Redirect strategies whose routes are served here
+    """
+
+    def __init__(
+        self, app: ASGIApp, strategies: Dict[str, RedirectStrategy] = STRATEGIES
+    ) -> None:
+        self.app = app
+        self.strategies = {strategy.path: strategy for strategy in strategies.values()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] == "GET":
+            strategy = self.strategies.get(scope["path"])
+            if strategy is not None and await self._redirect(strategy, scope, send):
+                return
+        await self.app(scope, receive, send)
+
+    async def _redirect(self, strategy: RedirectStrategy, scope: Scope, send: Send) -> bool:
+        """Send the 302 if the request is a plain redirect; False to fall back."""
+        params: Dict[str, str] = {}
+        # Decoded exactly like Starlette's QueryParams
+        for name, value in parse_qsl(
+            scope["query_string"].decode("latin-1"), keep_blank_values=True
+        ):
+            if name in params:
+                return False
+            params[name] = value
+
+        phone = params.get("phone")
+        if phone is None or not _PHONE_LENGTH[0] <= len(phone) <= _PHONE_LENGTH[1]:
+            return False
+        for name, max_length in _MAX_LENGTHS.items():
+            value = params.get(name)
+            if value is not None and len(value) > max_length:
+                return False
+
+        log_fields = {}
+        if strategy.debug_param:
+            debug = _DEBUG_VALUES.get(params.get("debug", "0"))
+            if debug is None:
+                return False
+            log_fields["debug_mode"] = debug == 1
+
+        # Phases timed here add to the router's if the request falls back
+        started = perf_counter()
+        error = normalize_phone(phone).error
+        started = mark("validate", started)
+        if error:
+            return False
+
+        ua_info = classify_ua(_user_agent(scope))
+        started = mark("classify", started)
+        if shows_page(strategy, ua_info):
+            return False
+
+        target = get_link_target(phone, params.get("text"))
+        started = mark("url", started)
+        log_redirect(
+            strategy, ua_info, client_ip(scope), target,
+            params.get("src"), params.get("campaign"), params.get("ad_id"),
+            False, **log_fields,
+        )
+        mark("log", started)
+        # wa_url is ASCII and holds no characters RedirectResponse would quote
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 302,
+                "headers": [
+                    _CONTENT_LENGTH_0,
+                    (b"location", target.wa_url.encode("latin-1")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+        return True
+
+
+def _user_agent(scope: Scope) -> str:
+    for key, value in scope["headers"]:
+        if key == b"user-agent":
+            return value.decode("latin-1")
+    return ""
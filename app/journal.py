@@ -0,0 +1,479 @@
+"""
+Append-only binary click journal, for attribution.
+
+Off unless JOURNAL_DIR is set. Every click (see app.clicks) is then also
+appended to the journal as one fixed-width 32-byte record:
+
+    timestamp   int64   microseconds since the epoch, UTC
+    route       uint8   id of the redirect route (/w, /wc, ...)
+    env_type    uint8   id of the environment (android_linkedin_webview, ...)
+    flags       uint8   bit 0: the fallback page was shown
+    src         uint32  string id, 0 if absent
+    campaign    uint32  string id, 0 if absent
+    ad_id       uint32  string id, 0 if absent
+    ip_hash     uint64  keyed BLAKE2b of the client IP (never the IP itself)
+
+Appending only puts a tuple on an in-memory deque. A background thread
+commits whatever accumulated every JOURNAL_COMMIT_INTERVAL_MS: the batch
+is packed and written with one write() and one fsync() (group commit), so
+the fsync cost is shared by every click in the batch. A full deque drops
+clicks and counts them rather than slowing requests down; the clicks of a
+commit that fails are counted as dropped too.
+
+Each worker writes its own segments, ``clicks-<pid>-<time>-<seq>.bin``,
+and starts a new one once the current one reaches JOURNAL_SEGMENT_BYTES.
+Ids are assigned per segment and written, before any record that uses
+them, to the segment's ``.strings`` sidecar (JSON lines ``[kind, id,
+value]``), so every segment can be read on its own.
+
+``JournalSegment`` reads a segment through mmap, and ``count_clicks``
+aggregates any number of them, at millions of records per second:
+
+    python -m app.journal /var/lib/tal/journal --by campaign,src --since 2024-06-01
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("journal")
+
+MAGIC = b"TALCLICK"
+VERSION = 1
+# magic, version, record size, reserved
+HEADER = struct.Struct("<8sII16x")
+# timestamp, route, env_type, flags, (pad), src, campaign, ad_id, ip_hash
+RECORD = struct.Struct("<qBBBxIIIQ")
+FIELDS = ("timestamp", "route", "env_type", "flags", "src", "campaign", "ad_id", "ip_hash")
+FLAG_PAGE = 1
+
+# Field -> (memoryview format, byte offset in the record), for column reads
+COLUMNS = {
+    "timestamp": ("q", 0),
+    "route": ("B", 8),
+    "env_type": ("B", 9),
+    "flags": ("B", 10),
+    "src": ("I", 12),
+    "campaign": ("I", 16),
+    "ad_id": ("I", 20),
+    "ip_hash": ("Q", 24),
+}
+
+# Id namespace of each string field; "string" ids start at 1 (0 = absent)
+_KINDS = {
+    "route": "route",
+    "env_type": "env_type",
+    "src": "string",
+    "campaign": "string",
+    "ad_id": "string",
+}
+
+_TIMESTAMP = struct.Struct("<q")
+
+
+# =============================================================================
+# Writer
+# =============================================================================
+
+
+class ClickJournal:
+    """
+    Writes clicks to journal segments from a background thread.
+
+    Args:
+        directory: Where segments are written (created if missing)
+        segment_bytes: Size at which a new segment is started
+        commit_interval: Seconds between group commits
+        max_pending: Clicks buffered between commits before new ones are dropped
+        ip_salt: Key for hashing client IPs; empty for a random key per worker
+            (hashes then only compare within one worker's lifetime)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int,
+        commit_interval: float,
+        max_pending: int,
+        ip_salt: str,
+    ) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.max_pending = max_pending
+        self._ip_key = hashlib.blake2b(
+            ip_salt.encode() if ip_salt else os.urandom(32), digest_size=32
+        ).digest()
+        self.reset_after_fork()
+
+    def reset_after_fork(self) -> None:
+        """Threads and open segments do not survive fork(); start afresh."""
+        self._pending: Deque[tuple] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._records = None
+        self._strings = None
+        self._size = 0
+        self._sequence = 0
+        self._ids: Dict[str, Dict[str, int]] = {}
+        self.appended = self.dropped = 0
+        self.written = self.commits = self.segments = self.errors = 0
+
+    def append(
+        self,
+        route: str,
+        env_type: str,
+        page: bool,
+        src: Optional[str],
+        campaign: Optional[str],
+        ad_id: Optional[str],
+        client_ip: str,
+    ) -> None:
+        """Queue one click for the next commit."""
+        if self._thread is None:
+            self.start()
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(
+            (time.time_ns() // 1000, route, env_type, page, src, campaign, ad_id, client_ip)
+        )
+        self.appended += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="click-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Commit everything queued so far and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.commit_interval):
+            self._commit_pending()
+        self._commit_pending()
+        for file in (self._records, self._strings):
+            if file is not None:
+                file.close()
+
+    def _commit_pending(self) -> None:
+        """Commit every click queued since the previous commit."""
+        pending = self._pending
+        batch = [pending.popleft() for _ in range(len(pending))]
+        if not batch:
+            return
+        try:
+            self._commit(batch)
+        except Exception:
+            # Whatever went wrong, the thread keeps running for later clicks
+            self.errors += 1
+            self.dropped += len(batch)
+            logger.exception("Click journal commit failed", extra={"clicks": len(batch)})
+            # Start a new segment next time rather than append after a
+            # partial write, or reuse ids whose strings were never written
+            self._size = self.segment_bytes
+            return
+        self.written += len(batch)
+        self.commits += 1
+
+    def _commit(self, batch: List[tuple]) -> None:
+        """Write and fsync a batch of clicks."""
+        if self._records is None or self._size >= self.segment_bytes:
+            self._rotate()
+
+        new_strings: List[bytes] = []
+        data = bytearray(RECORD.size * len(batch))
+        for offset, (timestamp, route, env_type, page, src, campaign, ad_id, ip) in zip(
+            range(0, len(data), RECORD.size), batch
+        ):
+            RECORD.pack_into(
+                data,
+                offset,
+                timestamp,
+                self._id("route", route, new_strings),
+                self._id("env_type", env_type, new_strings),
+                FLAG_PAGE if page else 0,
+                self._id("string", src, new_strings),
+                self._id("string", campaign, new_strings),
+                self._id("string", ad_id, new_strings),
+                self._hash_ip(ip),
+            )
+
+        # Ids are durable before any record that refers to them
+        if new_strings:
+            self._strings.write(b"".join(new_strings))
+            os.fsync(self._strings.fileno())
+        self._records.write(data)
+        os.fsync(self._records.fileno())
+        self._size += len(data)
+
+    def _rotate(self) -> None:
+        """Close the current segment and start a new one."""
+        for file in (self._records, self._strings):
+            if file is not None:
+                file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        name = f"clicks-{os.getpid()}-{stamp}-{self._sequence:04d}"
+        base = os.path.join(self.directory, name)
+        self._records = open(f"{base}.bin", "ab", buffering=0)
+        self._strings = open(f"{base}.strings", "ab", buffering=0)
+        self._records.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self._size = HEADER.size
+        self._ids = {"route": {}, "env_type": {}, "string": {}}
+        self.segments += 1
+
+        # Make the new files' directory entries durable too
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _id(self, kind: str, value: Optional[str], new_strings: List[bytes]) -> int:
+        """Id of a value in the current segment, assigning one if new."""
+        if not value and kind == "string":
+            return 0
+        ids = self._ids[kind]
+        id_ = ids.get(value)
+        if id_ is None:
+            id_ = ids[value] = len(ids) + (kind == "string")
+            new_strings.append(json.dumps([kind, id_, value]).encode() + b"\n")
+        return id_
+
+    def _hash_ip(self, client_ip: str) -> int:
+        if not client_ip:
+            return 0
+        digest = hashlib.blake2b(client_ip.encode(), key=self._ip_key, digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "thread_alive": self._thread is not None and self._thread.is_alive(),
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "dropped": self.dropped,
+            "written": self.written,
+            "commits": self.commits,
+            "segments": self.segments,
+            "errors": self.errors,
+        }
+
+
+click_journal: Optional[ClickJournal] = None
+if settings.journal_dir:
+    click_journal = ClickJournal(
+        settings.journal_dir,
+        settings.journal_segment_bytes,
+        settings.journal_commit_interval_ms / 1000,
+        settings.journal_max_pending,
+        settings.journal_ip_salt,
+    )
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=click_journal.reset_after_fork)
+
+
+def get_journal_stats() -> Dict[str, Any]:
+    """Return click journal counters for this worker."""
+    if click_journal is None:
+        return {"enabled": False}
+    return {"enabled": True, **click_journal.stats()}
+
+
+# =============================================================================
+# Reader
+# =============================================================================
+
+
+class JournalSegment:
+    """
+    One journal segment, memory-mapped for reading.
+
+    A record cut short by a crash at the end of the file is ignored.
+
+    Args:
+        path: The segment's .bin file (its .strings sidecar sits next to it)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} click journal segment")
+        self.count = (len(self._mmap) - HEADER.size) // RECORD.size
+        self.names = self._read_strings(path[: -len(".bin")] + ".strings")
+
+    @staticmethod
+    def _read_strings(path: str) -> Dict[str, Dict[int, str]]:
+        names: Dict[str, Dict[int, str]] = {"route": {}, "env_type": {}, "string": {0: None}}
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    kind, id_, value = json.loads(line)
+                except ValueError:
+                    break  # cut short by a crash
+                names[kind][id_] = value
+        return names
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "JournalSegment":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _timestamp(self, index: int) -> int:
+        return _TIMESTAMP.unpack_from(self._mmap, HEADER.size + index * RECORD.size)[0]
+
+    def _bisect(self, timestamp: int) -> int:
+        """Index of the first record at or after `timestamp` (records are in time order)."""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._timestamp(mid) < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _view(self, since: Optional[int], until: Optional[int]) -> memoryview:
+        """Bytes of the records with since <= timestamp < until."""
+        start = self._bisect(since) if since is not None else 0
+        end = self._bisect(until) if until is not None else self.count
+        return memoryview(self._mmap)[
+            HEADER.size + start * RECORD.size : HEADER.size + max(start, end) * RECORD.size
+        ]
+
+    def records(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[Tuple[int, ...]]:
+        """
+        Raw records (tuples in FIELDS order, ids not decoded).
+
+        Args:
+            since, until: Only records with since <= timestamp < until (µs)
+        """
+        return RECORD.iter_unpack(self._view(since, until))
+
+    def column(
+        self, field: str, since: Optional[int] = None, until: Optional[int] = None
+    ) -> memoryview:
+        """
+        One field of every record, as a strided view of the mapped file.
+
+        Iterating it yields the raw values without unpacking whole records,
+        which makes it the fast way to scan a few fields.
+
+        Args:
+            field: Any of FIELDS
+            since, until: Only records with since <= timestamp < until (µs)
+        """
+        format, offset = COLUMNS[field]
+        view = self._view(since, until).cast(format)
+        return view[offset // view.itemsize :: RECORD.size // view.itemsize]
+
+    def decode(self, field: str, value: int) -> Any:
+        """Name behind an id of a string field; other values as they are."""
+        kind = _KINDS.get(field)
+        return self.names[kind].get(value) if kind is not None else value
+
+
+def segment_paths(paths: Iterable[str]) -> List[str]:
+    """Segment files named or found (in directories), oldest first."""
+    found: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(glob.glob(os.path.join(path, "clicks-*.bin")))
+        else:
+            found.append(path)
+    return sorted(found, key=os.path.getmtime)
+
+
+def count_clicks(
+    paths: Iterable[str],
+    by: Sequence[str],
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+) -> Tuple["Counter[Tuple[Any, ...]]", int]:
+    """
+    Count clicks by some fields across journal segments.
+
+    Counting runs on the raw ids, per segment; names are looked up once per
+    distinct key.
+
+    Args:
+        paths: Segment files and/or journal directories
+        by: Fields to group by (any of FIELDS but timestamp)
+        since, until: Only clicks with since <= timestamp < until (µs)
+
+    Returns:
+        (clicks per key, records scanned)
+    """
+    totals: "Counter[Tuple[Any, ...]]" = Counter()
+    scanned = 0
+    for path in segment_paths(paths):
+        with JournalSegment(path) as segment:
+            columns = [segment.column(field, since, until) for field in by]
+            counts = Counter(zip(*columns))
+            scanned += len(columns[0])
+            for column in columns:
+                column.release()  # the mapping cannot close while views exist
+            for ids, clicks in counts.items():
+                totals[
+                    tuple(segment.decode(field, id_) for field, id_ in zip(by, ids))
+                ] += clicks
+    return totals, scanned
+
+
+def _microseconds(value: str) -> int:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1_000_000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count clicks in click journal segments")
+    parser.add_argument("paths", nargs="+", help="segment files or journal directories")
+    parser.add_argument("--by", default="campaign", help="comma-separated fields")
+    parser.add_argument("--since", type=_microseconds, help="ISO 8601 time (UTC if naive)")
+    parser.add_argument("--until", type=_microseconds, help="ISO 8601 time (UTC if naive)")
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+
+    by = args.by.split(",")
+    start = time.perf_counter()
+    totals, scanned = count_clicks(args.paths, by, args.since, args.until)
+    elapsed = time.perf_counter() - start
+
+    print("\t".join([*by, "clicks"]))
+    for values, clicks in totals.most_common(args.top):
+        print("\t".join([*("" if v is None else str(v) for v in values), str(clicks)]))
+    rate = scanned / elapsed if elapsed else 0
+    print(f"\n{scanned} records in {elapsed:.3f}s ({rate / 1e6:.1f}M records/s)")
@@ -3,48 +3,284 @@ Structured logging configuration for production.
 
 Supports JSON format for log aggregation (ELK, CloudWatch, etc.)
 and text format for local development.
+
+By default records are handed to a bounded queue and formatted and written
+by a background thread in batches, so a slow stdout never blocks the event
+loop. When the queue is full the configured overflow policy applies.
 """
 
+import atexit
+import json
 import logging
+import os
+import queue
 import sys
+import threading
+from contextvars import ContextVar, Token
 from datetime import datetime, timezone
-from typing import Any, Dict
-
-from pythonjsonlogger import jsonlogger
+from logging.handlers import QueueHandler
+from typing import Any, Dict, List, Optional, TextIO, Tuple
 
 from app.config import settings
 
+OVERFLOW_POLICIES = ("drop_oldest", "block")
+
+
+try:  # Optional faster JSON backend
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+# Extra fields that collide with the formatter's own fields are dropped.
+_RESERVED_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {
+    "message", "asctime", "taskName",
+    "timestamp", "level", "service", "environment", "logger", "function", "line",
+}
+
+
+def _dumps_json(value: Any) -> bytes:
+    return json.dumps(
+        value, default=str, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _dumps_orjson(value: Any) -> bytes:
+    try:
+        return orjson.dumps(value, default=str)
+    except TypeError:  # e.g. integers wider than 64 bits
+        return _dumps_json(value)
+
+
+dumps = _dumps_orjson if orjson is not None else _dumps_json
+
+
+class FastJsonFormatter(logging.Formatter):
+    """
+    JSON formatter producing one compact object per record.
+
+    Emits the same fields as the previous python-json-logger based formatter
+    (timestamp, level, name, message, extra fields, service, environment,
+    logger, module, function, line), but:
+
+    - service and environment are serialized once, at construction
+    - level/name prefixes and per-call-site suffixes are cached
+    - the timestamp string is cached per millisecond
+    - `extra` fields are serialized straight to bytes, with orjson
+      when it is installed
+    """
+
+    def __init__(self, service: str, environment: str) -> None:
+        super().__init__()
+        self._static = (
+            b',"service":' + dumps(service) + b',"environment":' + dumps(environment)
+        )
+        self._heads: Dict[tuple, bytes] = {}
+        self._tails: Dict[tuple, bytes] = {}
+        self._ts_ms = -1
+        self._ts = b""
+
+    def _timestamp(self, created: float) -> bytes:
+        ms = int(created * 1000)
+        if ms != self._ts_ms:
+            self._ts = datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ).encode("ascii")
+            self._ts_ms = ms
+        return self._ts
+
+    def format_bytes(self, record: logging.LogRecord) -> bytes:
+        """Format a record as a UTF-8 encoded JSON object."""
+        head_key = (record.levelname, record.name)
+        head = self._heads.get(head_key)
+        if head is None:
+            head = self._heads[head_key] = (
+                b'","level":' + dumps(record.levelname)
+                + b',"name":' + dumps(record.name)
+                + b',"message":'
+            )
+
+        tail_key = (record.name, record.module, record.funcName, record.lineno)
+        tail = self._tails.get(tail_key)
+        if tail is None:
+            tail = self._tails[tail_key] = self._static + (
+                b',"logger":' + dumps(record.name)
+                + b',"module":' + dumps(record.module)
+                + b',"function":' + dumps(record.funcName)
+                + b',"line":' + dumps(record.lineno)
+                + b"}"
+            )
+
+        extra = {
+            key: value
+            for key, value in record.__dict__.items()
+            if key not in _RESERVED_ATTRS
+        }
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            extra["exc_info"] = record.exc_text
+        if record.stack_info:
+            extra["stack_info"] = self.formatStack(record.stack_info)
+
+        parts = [
+            b'{"timestamp":"',
+            self._timestamp(record.created),
+            head,
+            dumps(record.getMessage()),
+        ]
+        if extra:
+            parts.append(b"," + dumps(extra)[1:-1])
+        parts.append(tail)
+        return b"".join(parts)
+
+    def format(self, record: logging.LogRecord) -> str:
+        return self.format_bytes(record).decode("utf-8")
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler with an explicit policy for a full queue.
+
+    Records are enqueued unformatted; formatting happens on the writer
+    thread. With the 'drop_oldest' policy the oldest buffered record is
+    discarded to make room, with 'block' the caller waits for space.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[Any]", overflow: str) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown log overflow policy {overflow!r}, "
+                f"expected one of {OVERFLOW_POLICIES}"
+            )
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class BatchingLogWriter:
+    """
+    Background thread that drains the log queue and writes in batches.
+
+    Each batch is formatted and written to the stream with a single
+    write() and flush(), no matter how many records it holds.
+    """
 
-class CustomJsonFormatter(jsonlogger.JsonFormatter):
-    """Custom JSON formatter with additional fields."""
+    _STOP = object()
 
-    def add_fields(
+    def __init__(
         self,
-        log_record: Dict[str, Any],
-        record: logging.LogRecord,
-        message_dict: Dict[str, Any],
+        log_queue: "queue.Queue[Any]",
+        formatter: logging.Formatter,
+        stream: TextIO,
+        batch_size: int,
     ) -> None:
-        super().add_fields(log_record, record, message_dict)
+        self.queue = log_queue
+        self.formatter = formatter
+        self.stream = stream
+        self.batch_size = max(1, batch_size)
+        # Write encoded bytes straight to the binary stream when possible
+        self._binary = (
+            getattr(stream, "buffer", None)
+            if hasattr(formatter, "format_bytes")
+            else None
+        )
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the writer thread (also used to restart it after fork)."""
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
 
-        # Add timestamp in ISO format
-        log_record["timestamp"] = datetime.now(timezone.utc).isoformat()
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(timeout)
+        self._thread = None
 
-        # Add log level
-        log_record["level"] = record.levelname
+    def _run(self) -> None:
+        while True:
+            batch: List[logging.LogRecord] = []
+            item = self.queue.get()
+            stopping = item is self._STOP
+            if not stopping:
+                batch.append(item)
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
 
-        # Add service info
-        log_record["service"] = settings.app_name
-        log_record["environment"] = settings.environment
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        binary = self._binary
+        format_record = (
+            self.formatter.format_bytes  # type: ignore[attr-defined]
+            if binary is not None
+            else self.formatter.format
+        )
+        lines = []
+        for record in batch:
+            try:
+                lines.append(format_record(record))
+            except Exception:
+                self.errors += 1
+        if not lines:
+            return
+        try:
+            if binary is not None:
+                self.stream.flush()  # keep ordering with text writes
+                binary.write(b"\n".join(lines) + b"\n")
+                binary.flush()
+            else:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+        except Exception:
+            self.errors += 1
+            return
+        self.written += len(lines)
+        self.batches += 1
 
-        # Add source info
-        log_record["logger"] = record.name
-        log_record["module"] = record.module
-        log_record["function"] = record.funcName
-        log_record["line"] = record.lineno
 
-        # Remove default fields we've replaced
-        log_record.pop("levelname", None)
-        log_record.pop("asctime", None)
+_queue_handler: Optional[BoundedQueueHandler] = None
+_writer: Optional[BatchingLogWriter] = None
 
 
 def setup_logging() -> logging.Logger:
@@ -53,21 +289,20 @@ def setup_logging() -> logging.Logger:
 
     Returns the root logger configured for the application.
     """
+    global _queue_handler, _writer
+
     # Get root logger
     logger = logging.getLogger("tal_redirector")
     logger.setLevel(getattr(logging, settings.log_level.upper()))
 
     # Remove existing handlers
     logger.handlers.clear()
-
-    # Create handler
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(getattr(logging, settings.log_level.upper()))
+    shutdown_logging()
 
     # Set formatter based on config
     if settings.log_format == "json":
-        formatter = CustomJsonFormatter(
-            "%(timestamp)s %(level)s %(name)s %(message)s"
+        formatter: logging.Formatter = FastJsonFormatter(
+            settings.app_name, settings.environment
         )
     else:
         formatter = logging.Formatter(
@@ -75,7 +310,20 @@ def setup_logging() -> logging.Logger:
             datefmt="%Y-%m-%d %H:%M:%S",
         )
 
-    handler.setFormatter(formatter)
+    # Create handler
+    if settings.log_queue_enabled:
+        log_queue: "queue.Queue[Any]" = queue.Queue(maxsize=settings.log_queue_size)
+        _queue_handler = BoundedQueueHandler(log_queue, settings.log_queue_overflow)
+        handler: logging.Handler = _queue_handler
+        _writer = BatchingLogWriter(
+            log_queue, formatter, sys.stdout, settings.log_batch_size
+        )
+        _writer.start()
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(formatter)
+
+    handler.setLevel(getattr(logging, settings.log_level.upper()))
     logger.addHandler(handler)
 
     # Prevent propagation to root logger
@@ -84,8 +332,85 @@ def setup_logging() -> logging.Logger:
     return logger
 
 
+def shutdown_logging() -> None:
+    """Flush queued log records and stop the background writer."""
+    if _writer is not None:
+        _writer.stop()
+
+
+def _restart_writer_after_fork() -> None:
+    """
+    Threads do not survive fork(); give each worker its own writer.
+
+    The queue is replaced too, since the parent's writer may have held its
+    lock at the moment of the fork.
+    """
+    if _queue_handler is None or _writer is None:
+        return
+    log_queue: "queue.Queue[Any]" = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _queue_handler.queue = log_queue
+    _queue_handler.dropped = 0
+    _writer.queue = log_queue
+    _writer.written = _writer.batches = _writer.errors = 0
+    _writer.start()
+
+
+def get_log_stats() -> Dict[str, Any]:
+    """Return counters for the logging pipeline (reported on /health)."""
+    if _queue_handler is None or _writer is None:
+        return {"mode": "sync"}
+    return {
+        "mode": "queue",
+        "overflow_policy": _queue_handler.overflow,
+        "queued": _queue_handler.queue.qsize(),
+        "queue_size": _queue_handler.queue.maxsize,
+        "dropped": _queue_handler.dropped,
+        "written": _writer.written,
+        "batches": _writer.batches,
+        "errors": _writer.errors,
+    }
+
+
+# =============================================================================
+# Request log context
+# =============================================================================
+#
+# Each request produces a single log event. The tracking middleware binds a
+# fresh dict for the request, handlers add fields to it, and the middleware
+# emits it once the response is done.
+
+_request_log_fields: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "request_log_fields", default=None
+)
+
+
+def bind_request_log() -> Tuple[Dict[str, Any], Token]:
+    """Start collecting log fields for the current request."""
+    fields: Dict[str, Any] = {}
+    return fields, _request_log_fields.set(fields)
+
+
+def unbind_request_log(token: Token) -> None:
+    """Stop collecting log fields for the current request."""
+    _request_log_fields.reset(token)
+
+
+def log_request_fields(**fields: Any) -> None:
+    """
+    Add fields to the current request's log event.
+
+    Outside a request (no bound context) this is a no-op.
+    """
+    request_fields = _request_log_fields.get()
+    if request_fields is not None:
+        request_fields.update(fields)
+
+
 # Create module-level logger
 logger = setup_logging()
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_writer_after_fork)
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -0,0 +1,382 @@
+"""
+Request metrics shared across gunicorn workers.
+
+Every worker owns one fixed-size, memory-mapped file of float64 slots in the
+metrics directory and is its only writer, so recording a request is a few
+in-place additions with no locks. The /metrics endpoint sums the files of all
+workers and renders them in the Prometheus text exposition format.
+
+Label values are fixed tables (the router's routes, env types, status
+classes), so the memory used per worker never grows with traffic.
+
+Files are named after the worker's PID. When the metrics are collected, the
+file of a process that is no longer running is added into ``archive.db``
+(summed along with the live files) and deleted, so the exported counters
+never go down when a worker exits, crashes or is restarted. The only reset
+is the gunicorn master clearing the directory when it starts.
+"""
+
+import fcntl
+import mmap
+import os
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.utils import ENV_TYPES
+
+OTHER_ROUTE = "other"
+STATUS_CLASSES: Tuple[str, ...] = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+# Latency histogram bucket upper bounds, in seconds (+Inf is implicit)
+BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+_ENV_INDEX: Dict[str, int] = {env: i for i, env in enumerate(ENV_TYPES)}
+_UNKNOWN_ENV = _ENV_INDEX["unknown"]
+_N_ENVS = len(ENV_TYPES)
+_N_STATUS = len(STATUS_CLASSES)
+_HIST_WIDTH = len(BUCKETS) + 2
+_COUNTER_BASE = 1
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Summed slots of the workers that have exited since the master started
+ARCHIVE_NAME = "archive.db"
+
+
+def metrics_dir() -> str:
+    """Return the directory holding the per-worker metrics files."""
+    return settings.metrics_dir or os.path.join(
+        tempfile.gettempdir(), "tal_redirector_metrics"
+    )
+
+
+# =============================================================================
+# Slot Layout
+# =============================================================================
+
+
+class Layout:
+    """
+    Route labels and slot positions for a set of route path templates.
+
+    A path with parameters is labelled by its static part ("/s/{code}" is
+    "/s") and also matches every path below it; paths no route matches are
+    recorded as "other".
+
+    Slot layout: [signature][counters][histograms]
+      counter    (route, env, status)  -> 1 slot
+      histogram  (route, env)          -> len(BUCKETS) + 1 bucket slots + 1 sum slot
+
+    Args:
+        paths: Route path templates, as registered on the router
+    """
+
+    __slots__ = ("routes", "n_slots", "hist_base", "signature", "_index", "_prefixes")
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        routes: List[str] = []
+        prefixes: Dict[str, str] = {}
+        for path in paths:
+            route, has_params, _ = path.partition("/{")
+            route = route or "/"
+            if route not in routes:
+                routes.append(route)
+            if has_params:
+                prefixes[route.rstrip("/") + "/"] = route
+        routes.append(OTHER_ROUTE)
+
+        self.routes: Tuple[str, ...] = tuple(routes)
+        self._index = {route: i for i, route in enumerate(self.routes)}
+        # Longest first, so nested routes win over their parents
+        self._prefixes = tuple(
+            (prefix, self._index[route])
+            for prefix, route in sorted(prefixes.items(), key=lambda item: -len(item[0]))
+        )
+        self.hist_base = _COUNTER_BASE + len(self.routes) * _N_ENVS * _N_STATUS
+        self.n_slots = self.hist_base + len(self.routes) * _N_ENVS * _HIST_WIDTH
+        # Files written with a different layout (e.g. by an older deploy) are ignored
+        self.signature = float(
+            zlib.crc32(repr((self.routes, ENV_TYPES, STATUS_CLASSES, BUCKETS)).encode())
+        )
+
+    def route(self, path: str) -> int:
+        """Index of the route label a request path is recorded under."""
+        index = self._index.get(path)
+        if index is not None:
+            return index
+        for prefix, index in self._prefixes:
+            if path.startswith(prefix):
+                return index
+        return len(self.routes) - 1
+
+
+@lru_cache(maxsize=1)
+def layout() -> Layout:
+    """Layout for the app's routes, built on first use (after they are registered)."""
+    from app.routes import router
+
+    return Layout(route.path for route in router.routes)
+
+
+# =============================================================================
+# Worker Files
+# =============================================================================
+
+
+def worker_pid(name: str, suffix: str = ".db") -> Optional[int]:
+    """PID of the writer of a ``worker_<pid><suffix>`` file, or None for other files."""
+    if not name.startswith("worker_") or not name.endswith(suffix):
+        return None
+    try:
+        return int(name[len("worker_"):-len(suffix)])
+    except ValueError:
+        return None
+
+
+def pid_running(pid: int) -> bool:
+    """Whether a process with this PID exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # running as another user
+    return True
+
+
+def clear_metrics_dir(directory: Optional[str] = None, suffix: str = ".db") -> int:
+    """
+    Delete every worker file and the archive, e.g. in the gunicorn master before any fork.
+
+    Args:
+        directory: Directory of the files (default: the metrics directory)
+        suffix: Extension of the worker files
+
+    Returns:
+        Number of files deleted
+    """
+    directory = directory or metrics_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for name in names:
+        if name != ARCHIVE_NAME and worker_pid(name, suffix) is None:
+            continue
+        try:
+            os.unlink(os.path.join(directory, name))
+            deleted += 1
+        except OSError:
+            pass
+    return deleted
+
+
+class WorkerMetrics:
+    """
+    This process's slot file.
+
+    Opened lazily on the first record, and again in a forked child, so each
+    worker writes only its own file. Opening starts the file from zero: a
+    file left under the same PID belonged to a process that has exited.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._values: Optional[memoryview] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._layout: Optional[Layout] = None
+
+    def _open(self) -> memoryview:
+        current = layout()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"worker_{os.getpid()}.db")
+        size = current.n_slots * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        values = memoryview(self._mmap).cast("d")
+        values[0] = current.signature
+        self._layout = current
+        self._values = values
+        return values
+
+    def reset_after_fork(self) -> None:
+        """Drop the parent's mapping; the child opens its own file."""
+        self._values = None
+        self._mmap = None
+
+    def record(self, path: str, env_type: str, status_code: int, seconds: float) -> None:
+        """Count one request and add its latency to the histogram."""
+        values = self._values
+        if values is None:
+            values = self._open()
+        current = self._layout
+
+        route = current.route(path)
+        env = _ENV_INDEX.get(env_type, _UNKNOWN_ENV)
+        status = min(max(status_code // 100 - 1, 0), _N_STATUS - 1)
+
+        values[_COUNTER_BASE + (route * _N_ENVS + env) * _N_STATUS + status] += 1
+        hist = current.hist_base + (route * _N_ENVS + env) * _HIST_WIDTH
+        values[hist + bisect_left(BUCKETS, seconds)] += 1
+        values[hist + _HIST_WIDTH - 1] += seconds
+
+
+def _read_slots(path: str, current: Layout) -> Optional[array]:
+    """Slots of a file written with the current layout, or None."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) != current.n_slots * 8:
+        return None
+    values = array("d", data)
+    if values[0] != current.signature:
+        return None
+    return values
+
+
+def _add(totals: array, values: array) -> None:
+    for i in range(1, len(totals)):
+        if values[i]:
+            totals[i] += values[i]
+
+
+def _archive(directory: str, path: str, current: Layout) -> None:
+    """Add an exited worker's slots to the archive, then delete its file."""
+    values = _read_slots(path, current)
+    if values is not None:
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        archive = _read_slots(archive_path, current)
+        if archive is None:
+            archive = array("d", bytes(current.n_slots * 8))
+            archive[0] = current.signature
+        _add(archive, values)
+        temporary = f"{archive_path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(archive.tobytes())
+        os.replace(temporary, archive_path)
+    os.unlink(path)
+
+
+def collect(directory: Optional[str] = None) -> Tuple[array, int]:
+    """
+    Sum the slot files of all running workers and the archive.
+
+    Files of processes that have exited are moved into the archive first.
+    Collections take turns on a lock file, so a worker file is never
+    counted twice, or missed, while another collection archives it.
+
+    Returns:
+        Tuple of (summed slots, number of worker files included)
+    """
+    directory = directory or metrics_dir()
+    current = layout()
+    totals = array("d", bytes(current.n_slots * 8))
+    workers = 0
+    try:
+        lock = os.open(
+            os.path.join(directory, f"{ARCHIVE_NAME}.lock"), os.O_RDWR | os.O_CREAT, 0o644
+        )
+    except FileNotFoundError:
+        return totals, 0
+
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        for name in os.listdir(directory):
+            pid = worker_pid(name)
+            if pid is None:
+                continue
+            path = os.path.join(directory, name)
+            if not pid_running(pid):
+                try:
+                    _archive(directory, path, current)
+                except OSError:
+                    pass
+                continue
+            values = _read_slots(path, current)
+            if values is not None:
+                _add(totals, values)
+                workers += 1
+
+        archive = _read_slots(os.path.join(directory, ARCHIVE_NAME), current)
+        if archive is not None:
+            _add(totals, archive)
+    finally:
+        os.close(lock)
+    return totals, workers
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_prometheus(directory: Optional[str] = None) -> str:
+    """Render the aggregated metrics in Prometheus text format."""
+    totals, workers = collect(directory)
+    current = layout()
+    lines: List[str] = [
+        "# HELP tal_metrics_workers Worker metric files aggregated.",
+        "# TYPE tal_metrics_workers gauge",
+        f"tal_metrics_workers {workers}",
+        "# HELP tal_requests_total Total HTTP requests.",
+        "# TYPE tal_requests_total counter",
+    ]
+
+    for r, route in enumerate(current.routes):
+        for e, env in enumerate(ENV_TYPES):
+            base = _COUNTER_BASE + (r * _N_ENVS + e) * _N_STATUS
+            for s, status in enumerate(STATUS_CLASSES):
+                value = totals[base + s]
+                if value:
+                    lines.append(
+                        f'tal_requests_total{{route="{route}",env_type="{env}",'
+                        f'status="{status}"}} {_number(value)}'
+                    )
+
+    lines.append("# HELP tal_request_duration_seconds Request latency.")
+    lines.append("# TYPE tal_request_duration_seconds histogram")
+    for r, route in enumerate(current.routes):
+        for e, env in enumerate(ENV_TYPES):
+            hist = current.hist_base + (r * _N_ENVS + e) * _HIST_WIDTH
+            count = sum(totals[hist:hist + _HIST_WIDTH - 1])
+            if not count:
+                continue
+            labels = f'route="{route}",env_type="{env}"'
+            cumulative = 0.0
+            for b, bound in enumerate(BUCKETS):
+                cumulative += totals[hist + b]
+                lines.append(
+                    f'tal_request_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                    f"{_number(cumulative)}"
+                )
+            lines.append(
+                f'tal_request_duration_seconds_bucket{{{labels},le="+Inf"}} '
+                f"{_number(count)}"
+            )
+            lines.append(
+                f"tal_request_duration_seconds_sum{{{labels}}} "
+                f"{totals[hist + _HIST_WIDTH - 1]!r}"
+            )
+            lines.append(
+                f"tal_request_duration_seconds_count{{{labels}}} {_number(count)}"
+            )
+
+    return "\n".join(lines) + "\n"
+
+
+worker_metrics = WorkerMetrics(metrics_dir())
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=worker_metrics.reset_after_fork)
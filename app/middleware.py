@@ -1,85 +1,167 @@
 """
 Middleware for request tracking, logging, and security.
+
+Implemented as raw ASGI middleware: headers are appended to the
+``http.response.start`` message in place instead of wrapping every request
+in Starlette's BaseHTTPMiddleware task and stream machinery.
 """
 
+import logging
+import os
 import time
-import uuid
-from typing import Callable
+from typing import Any, Dict, Optional
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.config import settings
-from app.logging_config import get_logger
+from app.logging_config import bind_request_log, get_logger, unbind_request_log
+from app.metrics import worker_metrics
+from app.proxies import client_ip
+from app.timing import bind_phases, phases_ms, server_timing, unbind_phases
+from app.utils import classify_ua
 
 logger = get_logger("middleware")
 
+# Security headers added to every response, encoded once at import
+SECURITY_HEADERS: tuple[tuple[bytes, bytes], ...] = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+)
 
-class RequestTrackingMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware to add request tracking and logging.
-
-    Adds:
-    - Unique request ID to each request
-    - Request timing
-    - Structured logging for each request
-    """
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Generate unique request ID
-        request_id = str(uuid.uuid4())[:8]
-
-        # Store in request state for access in endpoints
-        request.state.request_id = request_id
+# Cache control for redirect responses
+REDIRECT_CACHE_HEADER = (b"cache-control", b"no-store, no-cache, must-revalidate")
+REDIRECT_STATUS_CODES = frozenset((301, 302, 307, 308))
 
-        # Record start time
-        start_time = time.perf_counter()
+# Load balancer checks, not logged to reduce noise
+QUIET_PATHS = frozenset(("/", "/ready"))
 
-        # Process request
-        response = await call_next(request)
-
-        # Calculate duration
-        duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
-
-        # Add headers
-        response.headers["X-Request-ID"] = request_id
-        response.headers["X-Response-Time"] = f"{duration_ms}ms"
-
-        # Log request (skip health check to reduce noise)
-        if settings.enable_request_logging and request.url.path != "/":
-            logger.info(
-                "Request completed",
-                extra={
-                    "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "query": str(request.query_params),
-                    "status_code": response.status_code,
-                    "duration_ms": duration_ms,
-                    "client_ip": request.client.host if request.client else None,
-                    "user_agent": request.headers.get("user-agent", "")[:200],
-                },
-            )
 
-        return response
+def _header(scope: Scope, name: bytes) -> str:
+    """Return a request header from the ASGI scope, or '' if missing."""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class RequestTrackingMiddleware:
     """
-    Middleware to add security headers to responses.
+    Middleware to add request tracking, logging and security headers.
+
+    Adds:
+    - Unique request ID to each request
+    - Request timing and per-route/env_type metrics
+    - Per-phase timings (app.timing) in a Server-Timing header and the log
+    - Security headers (and no-cache headers on redirects)
+    - One structured log event per request, including any fields the
+      handler added with ``log_request_fields``
     """
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.log_requests = settings.enable_request_logging
+        self.metrics = worker_metrics if settings.enable_metrics else None
+        self.server_timing = settings.enable_server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        # Generate unique request ID and store it in request state
+        request_id = os.urandom(4).hex()
+        scope.setdefault("state", {})["request_id"] = request_id
 
-        # Cache control for redirect responses
-        if response.status_code in (301, 302, 307, 308):
-            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
+        phases: Optional[Dict[str, float]] = None
+        if self.server_timing:
+            phases, phases_token = bind_phases()
 
-        return response
+        start_time = time.perf_counter()
+        status_code = 500
+        elapsed = 0.0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, elapsed
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter() - start_time
+                duration_ms = round(elapsed * 1000, 2)
+
+                headers = message.setdefault("headers", [])
+                if not isinstance(headers, list):
+                    headers = message["headers"] = list(headers)
+                headers.extend(SECURITY_HEADERS)
+                if status_code in REDIRECT_STATUS_CODES:
+                    headers.append(REDIRECT_CACHE_HEADER)
+                headers.append((b"x-request-id", request_id.encode("ascii")))
+                headers.append((b"x-response-time", f"{duration_ms}ms".encode("ascii")))
+                if phases is not None:
+                    headers.append((b"server-timing", server_timing(phases, elapsed)))
+            await send(message)
+
+        # Warmup requests (app.warmup) are neither logged nor counted
+        warmup = "warmup" in scope
+        log_request = self.log_requests and scope["path"] not in QUIET_PATHS and not warmup
+        metrics = self.metrics if not warmup else None
+        if log_request:
+            fields, token = bind_request_log()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if log_request:
+                unbind_request_log(token)
+            if phases is not None:
+                unbind_phases(phases_token)
+            if not elapsed:
+                elapsed = time.perf_counter() - start_time
+
+            user_agent = (
+                _header(scope, b"user-agent")
+                if log_request or metrics is not None
+                else ""
+            )
+            if metrics is not None:
+                metrics.record(
+                    scope["path"], classify_ua(user_agent).env_type, status_code, elapsed
+                )
+            if log_request:
+                self._log(
+                    scope, request_id, status_code, elapsed, user_agent, fields, phases
+                )
+
+    def _log(
+        self,
+        scope: Scope,
+        request_id: str,
+        status_code: int,
+        elapsed: float,
+        user_agent: str,
+        fields: Dict[str, Any],
+        phases: Optional[Dict[str, float]],
+    ) -> None:
+        """Emit the single log event for a request, enriched by the handler."""
+        if phases:
+            fields = {**fields, "phases_ms": phases_ms(phases)}
+        if status_code >= 500:
+            level = logging.ERROR
+        elif status_code >= 400:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        logger.log(
+            level,
+            "Request completed",
+            extra={
+                "request_id": request_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "status_code": status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "client_ip": client_ip(scope) or None,
+                "user_agent": user_agent[:200],
+                **fields,
+            },
+        )
@@ -0,0 +1,239 @@
+"""
+On-demand CPU profiling of individual requests.
+
+A request is profiled with cProfile, from the outermost middleware down to
+the handler, when either:
+
+- it carries a valid ``X-Profile`` header: ``<expiry>.<signature>``, where
+  expiry is a Unix timestamp and the signature is the hex HMAC-SHA256 of it
+  under PROFILING_SECRET. ``python -m app.profiling`` prints one; or
+- it is picked by PROFILING_SAMPLE_RATE.
+
+Profiles are kept in a bounded in-memory ring buffer per worker and listed
+and downloaded through /debug/profiles, in the pstats format that
+``python -m pstats`` and snakeviz read.
+
+When neither trigger is configured the middleware is not installed at all,
+so profiling costs nothing while off; cProfile and pstats are only imported
+once a request is profiled.
+"""
+
+import argparse
+import hmac
+import io
+import itertools
+import marshal
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from hashlib import sha256
+from typing import Any, Deque, Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+PROFILE_HEADER = b"x-profile"
+
+
+def sign(expires: int, secret: str) -> str:
+    """Value of the X-Profile header, valid until `expires` (Unix time)."""
+    signature = hmac.new(secret.encode(), str(expires).encode(), sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify(value: str, secret: str) -> bool:
+    """Check an X-Profile header value: well formed, signed, not expired."""
+    expires, _, signature = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign(int(expires), secret), f"{expires}.{signature}")
+
+
+class ProfileRecord:
+    """
+    One profiled request.
+
+    Attributes:
+        id: Identifier within this worker
+        timestamp: When the request started (ISO 8601, UTC)
+        method, path, query: Request line
+        status_code: Response status (500 if none was sent)
+        duration_ms: Wall time of the request, profiler overhead included
+        trigger: 'header' or 'sample'
+        stats: Marshalled pstats data, as written by cProfile.dump_stats
+    """
+
+    __slots__ = (
+        "id",
+        "timestamp",
+        "method",
+        "path",
+        "query",
+        "status_code",
+        "duration_ms",
+        "trigger",
+        "stats",
+    )
+
+    def __init__(self, **fields: Any) -> None:
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+    def summary(self) -> Dict[str, Any]:
+        """Metadata for the profile list."""
+        return {
+            "id": self.id,
+            "timestamp": self.timestamp,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status_code": self.status_code,
+            "duration_ms": self.duration_ms,
+            "trigger": self.trigger,
+            "size": len(self.stats),
+        }
+
+    def report(self, limit: int = 40) -> str:
+        """Top functions by cumulative time, as printed by pstats."""
+        import pstats
+
+        stream = io.StringIO()
+        stats = pstats.Stats(_StatsSource(self.stats), stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return stream.getvalue()
+
+
+class _StatsSource:
+    """Adapter letting pstats.Stats load marshalled stats from memory."""
+
+    def __init__(self, data: bytes) -> None:
+        self.stats = marshal.loads(data)
+
+    def create_stats(self) -> None:
+        pass
+
+
+class ProfileBuffer:
+    """
+    Ring buffer of the most recent profiles of this worker.
+
+    Args:
+        size: Number of profiles kept; older ones are dropped
+    """
+
+    def __init__(self, size: int) -> None:
+        self._records: Deque[ProfileRecord] = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def add(self, **fields: Any) -> ProfileRecord:
+        record = ProfileRecord(id=next(self._ids), **fields)
+        self._records.append(record)
+        return record
+
+    def get(self, profile_id: int) -> Optional[ProfileRecord]:
+        for record in self._records:
+            if record.id == profile_id:
+                return record
+        return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries, newest first."""
+        return [record.summary() for record in reversed(self._records)]
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests that carry a signed X-Profile header or are sampled.
+
+    cProfile hooks the whole thread, so one request is profiled at a time
+    per worker; a trigger that arrives meanwhile is ignored. Other requests
+    the event loop runs while a profile is open show up in it too.
+
+    Args:
+        app: The ASGI application
+        buffer: Where finished profiles go
+        secret: HMAC key for the X-Profile header; empty disables the header
+        sample_rate: Fraction of requests profiled without the header
+    """
+
+    def __init__(
+        self, app: ASGIApp, buffer: "ProfileBuffer", secret: str, sample_rate: float
+    ) -> None:
+        self.app = app
+        self.buffer = buffer
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.active = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        trigger = None
+        if scope["type"] == "http" and not self.active and "warmup" not in scope:
+            trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        import cProfile
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = datetime.now(timezone.utc).isoformat()
+        profile = cProfile.Profile()
+        self.active = True
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            self.active = False
+            profile.create_stats()
+            self.buffer.add(
+                timestamp=started,
+                method=scope["method"],
+                path=scope["path"],
+                query=scope["query_string"].decode("latin-1"),
+                status_code=status_code,
+                duration_ms=round(elapsed * 1000, 2),
+                trigger=trigger,
+                stats=marshal.dumps(profile.stats),
+            )
+
+    def _trigger(self, scope: Scope) -> Optional[str]:
+        """Why this request is profiled, or None."""
+        if self.secret:
+            for key, value in scope["headers"]:
+                if key == PROFILE_HEADER:
+                    if verify(value.decode("latin-1"), self.secret):
+                        return "header"
+                    break
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+
+def profiling_enabled() -> bool:
+    """Whether any profiling trigger is configured."""
+    return bool(settings.profiling_secret) or settings.profiling_sample_rate > 0
+
+
+# Profiles of this worker (served by /debug/profiles)
+profiles = ProfileBuffer(settings.profiling_buffer_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print an X-Profile header value")
+    parser.add_argument("--ttl", type=int, default=600, help="seconds it stays valid")
+    args = parser.parse_args()
+    if not settings.profiling_secret:
+        raise SystemExit("PROFILING_SECRET is not set")
+    print(f"X-Profile: {sign(int(time.time()) + args.ttl, settings.profiling_secret)}")
@@ -0,0 +1,73 @@
+"""
+Client addresses behind reverse proxies.
+
+Behind a load balancer the ASGI peer address (``scope["client"]``) is the
+proxy's, shared by every user. When the peer is a trusted proxy
+(TRUSTED_PROXIES), the client is the rightmost X-Forwarded-For entry that is
+not itself a trusted proxy: entries to its left were supplied by the client
+and cannot be trusted.
+
+TRUSTED_PROXIES is a comma-separated list of addresses or networks
+(``10.0.0.0/8, 127.0.0.1``). ``*`` trusts whichever peer connects, for
+platforms whose proxy addresses are not known in advance (Render): the
+client is then the last address that proxy appended.
+"""
+
+import ipaddress
+from functools import lru_cache
+from typing import Tuple, Union
+
+from starlette.types import Scope
+
+from app.config import settings
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_networks(value: str) -> Tuple[Tuple[Network, ...], bool]:
+    """
+    Parse a TRUSTED_PROXIES value.
+
+    Returns:
+        (trusted networks, whether any peer is trusted)
+    """
+    networks = []
+    any_peer = False
+    for entry in value.split(","):
+        entry = entry.strip()
+        if entry == "*":
+            any_peer = True
+        elif entry:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+    return tuple(networks), any_peer
+
+
+TRUSTED_NETWORKS, TRUST_ANY_PEER = parse_networks(settings.trusted_proxies)
+
+
+@lru_cache(maxsize=1024)
+def is_trusted(address: str) -> bool:
+    """Whether an address belongs to a trusted proxy network."""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_NETWORKS)
+
+
+def client_ip(scope: Scope) -> str:
+    """Address of the client that sent the request (empty if unknown)."""
+    client = scope.get("client")
+    peer = client[0] if client else ""
+    if not (TRUST_ANY_PEER and peer) and not (TRUSTED_NETWORKS and is_trusted(peer)):
+        return peer
+
+    forwarded = []
+    for key, value in scope["headers"]:
+        if key == b"x-forwarded-for":
+            forwarded.extend(value.decode("latin-1").split(","))
+    for hop in reversed(forwarded):
+        hop = hop.strip()
+        if hop and not is_trusted(hop):
+            return hop
+    return peer
@@ -0,0 +1,407 @@
+"""
+Minimal QR code encoder rendering SVG.
+
+Replaces the third-party QR image on the /u page. Only what the service needs
+is implemented: byte mode, a fixed error correction level, versions 1-40 and
+automatic mask selection. Rendered SVGs are kept in an LRU keyed by the
+encoded data, so popular campaign URLs are encoded once per worker.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from app.config import settings
+
+# Error correction level M: format bits, codewords per block, number of blocks
+# (indexed by version, index 0 unused)
+_ECL_FORMAT_BITS = 0
+_ECC_CODEWORDS_PER_BLOCK = (
+    -1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26,
+    26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28,
+)
+_NUM_ERROR_CORRECTION_BLOCKS = (
+    -1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+    17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49,
+)
+
+MIN_VERSION = 1
+MAX_VERSION = 40
+QUIET_ZONE = 4
+
+# Penalty weights used for mask selection
+_PENALTY_N1 = 3
+_PENALTY_N2 = 3
+_PENALTY_N3 = 40
+_PENALTY_N4 = 10
+_FINDER_LIKE = ("10111010000", "00001011101")
+
+
+class DataTooLongError(ValueError):
+    """Raised when the data does not fit in the largest QR version."""
+
+
+# =============================================================================
+# Reed-Solomon over GF(256)
+# =============================================================================
+
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _EXP[_i] = _value
+    _LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+
+
+def _gf_multiply(x: int, y: int) -> int:
+    if x == 0 or y == 0:
+        return 0
+    return _EXP[_LOG[x] + _LOG[y]]
+
+
+@lru_cache(maxsize=None)
+def _rs_divisor(degree: int) -> Tuple[int, ...]:
+    """Generator polynomial coefficients, highest power first (leading 1 omitted)."""
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _gf_multiply(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _gf_multiply(root, 0x02)
+    return tuple(result)
+
+
+def _rs_remainder(data: List[int], divisor: Tuple[int, ...]) -> List[int]:
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        if factor:
+            log_factor = _LOG[factor]
+            for i, coef in enumerate(divisor):
+                if coef:
+                    result[i] ^= _EXP[_LOG[coef] + log_factor]
+    return result
+
+
+# =============================================================================
+# Capacity
+# =============================================================================
+
+
+def _num_raw_data_modules(version: int) -> int:
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        num_align = version // 7 + 2
+        result -= (25 * num_align - 10) * num_align - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def _num_data_codewords(version: int) -> int:
+    return (
+        _num_raw_data_modules(version) // 8
+        - _ECC_CODEWORDS_PER_BLOCK[version] * _NUM_ERROR_CORRECTION_BLOCKS[version]
+    )
+
+
+def _alignment_positions(version: int) -> List[int]:
+    if version == 1:
+        return []
+    size = version * 4 + 17
+    num_align = version // 7 + 2
+    step = (version * 8 + num_align * 3 + 5) // (num_align * 4 - 4) * 2
+    positions = [size - 7 - i * step for i in range(num_align - 1)] + [6]
+    return positions[::-1]
+
+
+# =============================================================================
+# Encoder
+# =============================================================================
+
+
+class _Symbol:
+    """Module matrix of one QR symbol while it is being built."""
+
+    def __init__(self, version: int) -> None:
+        self.version = version
+        self.size = version * 4 + 17
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.is_function = [[False] * self.size for _ in range(self.size)]
+        self._draw_function_patterns()
+
+    def _set_function(self, x: int, y: int, dark: bool) -> None:
+        self.modules[y][x] = dark
+        self.is_function[y][x] = True
+
+    def _draw_function_patterns(self) -> None:
+        size = self.size
+        for i in range(size):
+            self._set_function(6, i, i % 2 == 0)
+            self._set_function(i, 6, i % 2 == 0)
+
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self._set_function(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+
+        positions = _alignment_positions(self.version)
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self._set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+
+        self.draw_format_bits(0)  # reserve the area; redrawn once masked
+        self._draw_version()
+
+    def draw_format_bits(self, mask: int) -> None:
+        data = _ECL_FORMAT_BITS << 3 | mask
+        rem = data
+        for _ in range(10):
+            rem = (rem << 1) ^ ((rem >> 9) * 0x537)
+        bits = (data << 10 | rem) ^ 0x5412
+        size = self.size
+
+        for i in range(6):
+            self._set_function(8, i, (bits >> i) & 1 != 0)
+        self._set_function(8, 7, (bits >> 6) & 1 != 0)
+        self._set_function(8, 8, (bits >> 7) & 1 != 0)
+        self._set_function(7, 8, (bits >> 8) & 1 != 0)
+        for i in range(9, 15):
+            self._set_function(14 - i, 8, (bits >> i) & 1 != 0)
+
+        for i in range(8):
+            self._set_function(size - 1 - i, 8, (bits >> i) & 1 != 0)
+        for i in range(8, 15):
+            self._set_function(8, size - 15 + i, (bits >> i) & 1 != 0)
+        self._set_function(8, size - 8, True)
+
+    def _draw_version(self) -> None:
+        if self.version < 7:
+            return
+        rem = self.version
+        for _ in range(12):
+            rem = (rem << 1) ^ ((rem >> 11) * 0x1F25)
+        bits = self.version << 12 | rem
+        for i in range(18):
+            dark = (bits >> i) & 1 != 0
+            a = self.size - 11 + i % 3
+            b = i // 3
+            self._set_function(a, b, dark)
+            self._set_function(b, a, dark)
+
+    def draw_codewords(self, codewords: List[int]) -> None:
+        size = self.size
+        total_bits = len(codewords) * 8
+        i = 0
+        for right in range(size - 1, 0, -2):
+            if right <= 6:
+                right -= 1
+            upward = (right + 1) & 2 == 0
+            for vert in range(size):
+                y = size - 1 - vert if upward else vert
+                for x in (right, right - 1):
+                    if not self.is_function[y][x] and i < total_bits:
+                        self.modules[y][x] = (codewords[i >> 3] >> (7 - (i & 7))) & 1 != 0
+                        i += 1
+
+    def apply_mask(self, mask: int) -> None:
+        condition = _MASKS[mask]
+        for y in range(self.size):
+            row = self.modules[y]
+            function_row = self.is_function[y]
+            for x in range(self.size):
+                if not function_row[x] and condition(x, y):
+                    row[x] = not row[x]
+
+    def penalty(self) -> int:
+        modules = self.modules
+        size = self.size
+        rows = ["".join("1" if m else "0" for m in row) for row in modules]
+        columns = ["".join(row[x] for row in rows) for x in range(size)]
+
+        score = 0
+        for line in rows + columns:
+            # Runs of five or more modules of the same color
+            run_color, run_length = line[0], 1
+            for char in line[1:]:
+                if char == run_color:
+                    run_length += 1
+                else:
+                    if run_length >= 5:
+                        score += _PENALTY_N1 + run_length - 5
+                    run_color, run_length = char, 1
+            if run_length >= 5:
+                score += _PENALTY_N1 + run_length - 5
+
+            # Finder-like patterns, counting the quiet zone as light
+            padded = "0000" + line + "0000"
+            for pattern in _FINDER_LIKE:
+                score += padded.count(pattern) * _PENALTY_N3
+
+        # 2x2 blocks of the same color
+        for y in range(size - 1):
+            upper, lower = modules[y], modules[y + 1]
+            for x in range(size - 1):
+                color = upper[x]
+                if color == upper[x + 1] == lower[x] == lower[x + 1]:
+                    score += _PENALTY_N2
+
+        # Balance of dark and light modules
+        dark = sum(row.count("1") for row in rows)
+        total = size * size
+        k = (abs(dark * 20 - total * 10) + total - 1) // total - 1
+        score += k * _PENALTY_N4
+        return score
+
+
+_MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+
+def _encode_data(data: bytes) -> Tuple[int, List[int]]:
+    """Pick the smallest version and return (version, data codewords)."""
+    for version in range(MIN_VERSION, MAX_VERSION + 1):
+        count_bits = 8 if version < 10 else 16
+        capacity_bits = _num_data_codewords(version) * 8
+        if 4 + count_bits + len(data) * 8 <= capacity_bits:
+            break
+    else:
+        raise DataTooLongError(f"{len(data)} bytes do not fit in a QR code")
+
+    bits = []
+    for value, length in ((0b0100, 4), (len(data), count_bits)):
+        bits.extend((value >> i) & 1 for i in range(length - 1, -1, -1))
+    for byte in data:
+        bits.extend((byte >> i) & 1 for i in range(7, -1, -1))
+
+    bits.extend([0] * min(4, capacity_bits - len(bits)))
+    bits.extend([0] * (-len(bits) % 8))
+    codewords = [
+        int("".join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)
+    ]
+    pad = 0xEC
+    while len(codewords) < capacity_bits // 8:
+        codewords.append(pad)
+        pad ^= 0xEC ^ 0x11
+    return version, codewords
+
+
+def _add_ecc_and_interleave(version: int, data: List[int]) -> List[int]:
+    num_blocks = _NUM_ERROR_CORRECTION_BLOCKS[version]
+    block_ecc_len = _ECC_CODEWORDS_PER_BLOCK[version]
+    raw_codewords = _num_raw_data_modules(version) // 8
+    num_short_blocks = num_blocks - raw_codewords % num_blocks
+    short_block_len = raw_codewords // num_blocks
+    divisor = _rs_divisor(block_ecc_len)
+
+    blocks = []
+    k = 0
+    for i in range(num_blocks):
+        length = short_block_len - block_ecc_len + (0 if i < num_short_blocks else 1)
+        block = data[k:k + length]
+        k += length
+        ecc = _rs_remainder(block, divisor)
+        if i < num_short_blocks:
+            block.append(0)
+        blocks.append(block + ecc)
+
+    result = []
+    for i in range(len(blocks[0])):
+        for j, block in enumerate(blocks):
+            if i != short_block_len - block_ecc_len or j >= num_short_blocks:
+                result.append(block[i])
+    return result
+
+
+def encode(data: bytes, mask: Optional[int] = None) -> List[List[bool]]:
+    """
+    Encode bytes as a QR code.
+
+    Args:
+        data: Bytes to encode
+        mask: Mask pattern 0-7; None picks the one with the lowest penalty
+
+    Returns:
+        Square matrix of modules, True for dark, without the quiet zone
+
+    Raises:
+        DataTooLongError: If the data exceeds the capacity of version 40
+    """
+    version, codewords = _encode_data(data)
+    symbol = _Symbol(version)
+    symbol.draw_codewords(_add_ecc_and_interleave(version, codewords))
+
+    best_mask, best_penalty = mask or 0, None
+    for candidate in range(8) if mask is None else ():
+        symbol.apply_mask(candidate)
+        symbol.draw_format_bits(candidate)
+        penalty = symbol.penalty()
+        if best_penalty is None or penalty < best_penalty:
+            best_mask, best_penalty = candidate, penalty
+        symbol.apply_mask(candidate)  # masks are XOR, applying again undoes it
+
+    symbol.apply_mask(best_mask)
+    symbol.draw_format_bits(best_mask)
+    return symbol.modules
+
+
+def to_svg(modules: List[List[bool]]) -> str:
+    """Render a module matrix as a compact SVG, one path for all dark runs."""
+    size = len(modules) + 2 * QUIET_ZONE
+    path = []
+    for y, row in enumerate(modules):
+        x = 0
+        width = len(row)
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                path.append(f"M{start + QUIET_ZONE},{y + QUIET_ZONE}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    )
+
+
+@lru_cache(maxsize=settings.qr_cache_size)
+def render_qr_svg(data: str) -> Tuple[bytes, str]:
+    """
+    Render a QR code for the given text as SVG.
+
+    Returns:
+        Tuple of (SVG bytes, strong ETag)
+
+    Raises:
+        DataTooLongError: If the data does not fit in a QR code
+    """
+    svg = to_svg(encode(data.encode("utf-8"))).encode("utf-8")
+    etag = '"' + hashlib.blake2b(svg, digest_size=12).hexdigest() + '"'
+    return svg, etag
@@ -0,0 +1,261 @@
+"""
+Per-client-IP token bucket rate limiting shared by all workers.
+
+Buckets live in a fixed-size, memory-mapped table that every gunicorn worker
+maps from the same file, so a client gets one budget no matter which worker
+serves it. The table is set-associative: a client's hash picks one group of
+slots, it is looked up by linear probing inside that group only, and when the
+group is full the least recently seen client in it is evicted. Memory is
+therefore fixed no matter how many IPs a bot rotates through, and every check
+touches a single group behind a byte-range lock on that group.
+
+Clients are told apart by app.proxies.client_ip: without TRUSTED_PROXIES,
+every request arriving through a load balancer shares the proxy's bucket.
+"""
+
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.proxies import client_ip
+
+# Slot: client key hash (0 = empty), tokens left, last update (Unix time;
+# the table file may outlive a reboot, where monotonic readings mean nothing)
+_SLOT = struct.Struct("<Qdd")
+_HEADER = struct.Struct("<8sQQ")
+_MAGIC = b"TALRL002"
+GROUP_SIZE = 8
+
+# Attempts at a group's lock before the request is let through unchecked
+LOCK_ATTEMPTS = 3
+
+# Paths that are never limited (load balancer and monitoring checks)
+EXEMPT_PATHS = frozenset(("/", "/health", "/ready", "/metrics"))
+
+
+def table_path() -> str:
+    """Return the path of the shared bucket table."""
+    return settings.rate_limit_file or os.path.join(
+        tempfile.gettempdir(), "tal_redirector_ratelimit.db"
+    )
+
+
+def _client_key(client_ip: str) -> int:
+    """Stable 64-bit key for an IP (hash() differs between workers)."""
+    key = int.from_bytes(
+        hashlib.blake2b(client_ip.encode(), digest_size=8).digest(), "little"
+    )
+    return key or 1
+
+
+class SharedTokenBuckets:
+    """
+    Token buckets in a shared, fixed-size, set-associative table.
+
+    Args:
+        path: File backing the table; all workers must use the same path
+        capacity: Bucket size, i.e. the burst a client may send
+        window: Seconds to refill an empty bucket completely
+        slots: Table size; rounded up to a multiple of GROUP_SIZE
+    """
+
+    def __init__(self, path: str, capacity: int, window: float, slots: int) -> None:
+        self.path = path
+        self.capacity = float(capacity)
+        self.refill_rate = capacity / window
+        self.groups = max(1, math.ceil(slots / GROUP_SIZE))
+        self.slots = self.groups * GROUP_SIZE
+        self.size = _HEADER.size + self.slots * _SLOT.size
+
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+        self.contended = 0
+
+        self._fd: Optional[int] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def _open(self) -> mmap.mmap:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        expected = _HEADER.pack(_MAGIC, self.slots, GROUP_SIZE)
+        # Workers opening the table at once take turns on a separate lock file
+        lock = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            fd = self._open_existing(expected)
+            if fd is None:
+                # New file or another layout: build an empty table beside it
+                # and rename it into place. Truncating the old file instead
+                # would crash (SIGBUS) workers that still have it mapped.
+                temporary = f"{self.path}.{os.getpid()}.tmp"
+                fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, expected, 0)
+                os.replace(temporary, self.path)
+            table = mmap.mmap(fd, self.size)
+        finally:
+            os.close(lock)
+        self._fd = fd
+        self._mmap = table
+        return table
+
+    def _open_existing(self, expected: bytes) -> Optional[int]:
+        """Open the table file if it exists with this layout."""
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        if os.pread(fd, _HEADER.size, 0) == expected and os.fstat(fd).st_size == self.size:
+            return fd
+        os.close(fd)
+        return None
+
+    def reset_after_fork(self) -> None:
+        """Reopen the table in a forked child (locks are per open file)."""
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._mmap = None
+        self.allowed = self.limited = self.evictions = self.contended = 0
+
+    def acquire(self, client_ip: str) -> bool:
+        """
+        Take one token from the client's bucket; False if it is empty.
+
+        Runs on the event loop, so it never waits for the group's lock: if
+        another worker holds it for LOCK_ATTEMPTS tries in a row, the
+        request is let through unchecked (and counted as contended).
+        """
+        table = self._mmap
+        if table is None:
+            table = self._open()
+
+        key = _client_key(client_ip)
+        group = key % self.groups
+        start = _HEADER.size + group * GROUP_SIZE * _SLOT.size
+        group_bytes = GROUP_SIZE * _SLOT.size
+        now = time.time()
+
+        for _ in range(LOCK_ATTEMPTS):
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, group_bytes, start)
+                break
+            except OSError:
+                continue
+        else:
+            self.contended += 1
+            return True
+        try:
+            victim = start
+            victim_seen = math.inf
+            offset = start
+            for offset in range(start, start + group_bytes, _SLOT.size):
+                slot_key, tokens, updated = _SLOT.unpack_from(table, offset)
+                if slot_key == key:
+                    # max(): the wall clock may have stepped back
+                    tokens = min(
+                        self.capacity, tokens + max(0.0, now - updated) * self.refill_rate
+                    )
+                    break
+                if slot_key == 0:
+                    tokens = self.capacity
+                    break
+                if updated < victim_seen:
+                    victim, victim_seen = offset, updated
+            else:
+                # Group full: evict the least recently seen client
+                offset = victim
+                tokens = self.capacity
+                self.evictions += 1
+
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            _SLOT.pack_into(table, offset, key, tokens, now)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, group_bytes, start)
+
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return allowed
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for this worker (reported on /health)."""
+        return {
+            "capacity": int(self.capacity),
+            "window_seconds": settings.rate_limit_window,
+            "table_slots": self.slots,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions,
+            "contended": self.contended,
+        }
+
+
+class RateLimitMiddleware:
+    """
+    Reject clients over their request budget with a precomputed 429.
+
+    The response headers and body are built once; an over-limit request
+    costs one table lookup and two send() calls.
+    """
+
+    def __init__(self, app: ASGIApp, buckets: "SharedTokenBuckets") -> None:
+        self.app = app
+        self.buckets = buckets
+        retry_after = str(max(1, math.ceil(1 / buckets.refill_rate))).encode()
+        self._body = b"Too Many Requests"
+        self._start = {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(self._body)).encode()),
+                (b"retry-after", retry_after),
+            ],
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or "warmup" in scope:
+            await self.app(scope, receive, send)
+            return
+
+        if self.buckets.acquire(client_ip(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        # Copy the header list: outer middleware appends to it in place
+        start = dict(self._start)
+        start["headers"] = list(self._start["headers"])
+        await send(start)
+        await send({"type": "http.response.body", "body": self._body})
+
+
+rate_limiter: Optional[SharedTokenBuckets] = None
+if settings.enable_rate_limit:
+    rate_limiter = SharedTokenBuckets(
+        table_path(),
+        settings.rate_limit_requests,
+        settings.rate_limit_window,
+        settings.rate_limit_table_size,
+    )
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=rate_limiter.reset_after_fork)
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Return rate limiter counters for this worker."""
+    if rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **rate_limiter.stats()}
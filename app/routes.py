@@ -2,29 +2,30 @@
 API routes for the Tal Redirector service.
 """
 
+import hmac
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Annotated, Awaitable, Callable, Optional
 
 from fastapi import APIRouter, Query, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
 
 from app import __version__
+from app.clicks import click_counters, get_click_stats
+from app.compression import ENCODINGS, encoded_etag, get_compression_stats
 from app.config import settings
-from app.logging_config import get_logger
-from app.templates import ERROR_PAGE_TEMPLATE, FALLBACK_PAGE_TEMPLATE, CHROME_INTENT_TEMPLATE, CHROME_OPEN_TEMPLATE, AUTO_COPY_TEMPLATE, ULTIMATE_TEMPLATE, LINKEDIN_TEMPLATE, CHROME_ESCAPE_TEMPLATE
-from app.utils import (
-    build_wa_me_url,
-    get_device_type,
-    get_env_type,
-    get_webview_source,
-    is_android,
-    is_desktop,
-    is_ios,
-    is_risky_environment,
-    validate_phone,
-)
-
-logger = get_logger("routes")
+from app.journal import get_journal_stats
+from app.logging_config import get_log_stats, log_request_fields
+from app.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_prometheus
+from app.profiling import profiles, profiling_enabled
+from app.proxies import client_ip
+from app.qr import render_qr_svg
+from app.rate_limit import get_rate_limit_stats
+from app.short_links import short_links
+from app.static_assets import CACHE_CONTROL as IMMUTABLE_CACHE_CONTROL
+from app.strategies import STRATEGIES, RedirectStrategy, handle, respond
+from app.templates import find_asset, get_page
+from app.utils import classify_ua, get_cache_stats, get_link_target
+from app.warmup import warmup_state
 
 router = APIRouter()
 
@@ -52,9 +53,10 @@ async def health_check():
 @router.get("/health", tags=["Health"])
 async def detailed_health():
     """
-    Detailed health check endpoint.
+    Detailed health check endpoint (liveness).
 
-    Returns comprehensive service health information.
+    Returns comprehensive service health information. Always 200 while the
+    process serves requests; use /ready to know whether it is warmed up.
     """
     return {
         "status": "healthy",
@@ -66,483 +68,288 @@ async def detailed_health():
             "config_loaded": True,
             "logging_enabled": settings.enable_request_logging,
             "metrics_enabled": settings.enable_metrics,
+            "short_links_loaded": len(short_links),
+            "warmed_up": warmup_state.ready,
         },
+        "logging": get_log_stats(),
+        "rate_limit": get_rate_limit_stats(),
+        "clicks": get_click_stats(),
+        "journal": get_journal_stats(),
+        "compression": get_compression_stats(),
+        "caches": get_cache_stats(),
     }
 
 
-# =============================================================================
-# Main Redirect Endpoint
-# =============================================================================
-
-
-@router.get("/w", tags=["Redirect"])
-async def whatsapp_redirect(
-    request: Request,
-    phone: str = Query(
-        ...,
-        description="WhatsApp number in E.164 format without '+' (e.g., 9198XXXXXXXX)",
-        min_length=10,
-        max_length=15,
-    ),
-    text: Optional[str] = Query(
-        None,
-        description="Prefilled WhatsApp message",
-        max_length=1000,
-    ),
-    src: Optional[str] = Query(
-        None,
-        description="Traffic source (e.g., 'linkedin_ad', 'twitter', 'email')",
-        max_length=50,
-    ),
-    campaign: Optional[str] = Query(
-        None,
-        description="Campaign identifier",
-        max_length=100,
-    ),
-    ad_id: Optional[str] = Query(
-        None,
-        description="Ad identifier",
-        max_length=100,
-    ),
-    debug: int = Query(
-        0,
-        description="Set to 1 to force showing the fallback HTML page",
-        ge=0,
-        le=1,
-    ),
-):
+@router.get("/ready", tags=["Health"])
+async def readiness_check():
     """
-    Main WhatsApp redirect endpoint.
-
-    Intelligently redirects users to WhatsApp chat:
-    - Direct 302 redirect for safe environments (iOS, desktop, Android browser)
-    - Fallback HTML page for risky environments (Android webviews)
+    Readiness check for load balancers.
 
-    The fallback page includes:
-    - Auto-redirect attempt via JavaScript
-    - Manual "Open WhatsApp" button
-    - Instructions to open in browser
-    - Copyable link as last resort
+    503 until this worker has finished its startup warmup, 200 after.
     """
-    # Get request context
-    request_id = getattr(request.state, "request_id", "unknown")
-    user_agent = request.headers.get("user-agent", "")
-    client_ip = request.client.host if request.client else None
-
-    # Validate phone number
-    is_valid, error_msg = validate_phone(phone)
-    if not is_valid:
-        logger.warning(
-            "Invalid phone number",
-            extra={
-                "request_id": request_id,
-                "phone": phone,
-                "error": error_msg,
-            },
-        )
-        html = ERROR_PAGE_TEMPLATE.format(
-            error_message="The phone number provided is invalid. Please check the link and try again.",
-            error_code="INVALID_PHONE",
-        )
-        return HTMLResponse(content=html, status_code=400)
-
-    # Build WhatsApp URL
-    wa_url = build_wa_me_url(phone, text)
-
-    # Environment detection
-    device_type = get_device_type(user_agent)
-    webview_source = get_webview_source(user_agent)
-    env_type = get_env_type(user_agent)
-    is_risky = is_risky_environment(user_agent)
-
-    # Log the redirect request
-    log_extra = {
-        "request_id": request_id,
-        "phone": phone[:4] + "****" + phone[-2:] if len(phone) > 6 else "****",  # Mask phone
-        "text": text[:50] if text else None,
-        "src": src,
-        "campaign": campaign,
-        "ad_id": ad_id,
-        "device_type": device_type,
-        "webview_source": webview_source,
-        "env_type": env_type,
-        "is_risky": is_risky,
-        "debug_mode": debug == 1,
-        "client_ip": client_ip,
-    }
-
-    logger.info("Redirect request received", extra=log_extra)
-
-    # Always direct redirect - no intermediary pages
-    logger.info(
-        "Direct redirect",
-        extra={"request_id": request_id, "env_type": env_type},
-    )
-    return RedirectResponse(url=wa_url, status_code=302)
-
+    if not warmup_state.ready:
+        return JSONResponse({"status": "warming_up"}, status_code=503)
+    return {"status": "ready", "warmup": warmup_state.summary()}
 
-# =============================================================================
-# Chrome Intent Route (for Android webviews)
-# =============================================================================
 
-
-@router.get("/wc", tags=["Redirect"])
-async def whatsapp_chrome_redirect(
-    request: Request,
-    phone: str = Query(
-        ...,
-        description="WhatsApp number in E.164 format without '+' (e.g., 9198XXXXXXXX)",
-        min_length=10,
-        max_length=15,
-    ),
-    text: Optional[str] = Query(
-        None,
-        description="Prefilled WhatsApp message",
-        max_length=1000,
-    ),
-    src: Optional[str] = Query(
-        None,
-        description="Traffic source (e.g., 'linkedin_ad', 'twitter', 'email')",
-        max_length=50,
-    ),
-    campaign: Optional[str] = Query(
-        None,
-        description="Campaign identifier",
-        max_length=100,
-    ),
-    ad_id: Optional[str] = Query(
-        None,
-        description="Ad identifier",
-        max_length=100,
-    ),
-):
+def _token_error(request: Request, token: str) -> Optional[JSONResponse]:
     """
-    WhatsApp redirect using Chrome intent for Android.
+    Guard of the internal reporting endpoints.
 
-    This route attempts to open Chrome browser on Android devices,
-    which can then properly handle WhatsApp links even from webviews
-    like LinkedIn's in-app browser.
+    With a token set, the request needs ``Authorization: Bearer <token>``;
+    without one the endpoint is not available in production.
 
-    On non-Android devices, redirects directly to wa.me.
+    Returns:
+        The error response to send, or None to serve the request
     """
-    import re
-
-    # Get request context
-    request_id = getattr(request.state, "request_id", "unknown")
-    user_agent = request.headers.get("user-agent", "")
-    client_ip = request.client.host if request.client else None
-
-    # Validate phone number
-    is_valid, error_msg = validate_phone(phone)
-    if not is_valid:
-        logger.warning(
-            "Invalid phone number",
-            extra={
-                "request_id": request_id,
-                "phone": phone,
-                "error": error_msg,
-            },
-        )
-        html = ERROR_PAGE_TEMPLATE.format(
-            error_message="The phone number provided is invalid. Please check the link and try again.",
-            error_code="INVALID_PHONE",
-        )
-        return HTMLResponse(content=html, status_code=400)
-
-    # Build WhatsApp URL
-    wa_url = build_wa_me_url(phone, text)
-    clean_phone = re.sub(r"\D", "", phone)
-
-    # Environment detection
-    device_type = get_device_type(user_agent)
-    env_type = get_env_type(user_agent)
-
-    # Log the redirect request
-    logger.info(
-        "Chrome intent redirect request",
-        extra={
-            "request_id": request_id,
-            "phone": phone[:4] + "****" + phone[-2:] if len(phone) > 6 else "****",
-            "text": text[:50] if text else None,
-            "src": src,
-            "campaign": campaign,
-            "ad_id": ad_id,
-            "device_type": device_type,
-            "env_type": env_type,
-            "client_ip": client_ip,
-            "route": "/wc",
-        },
-    )
+    if token:
+        authorization = request.headers.get("authorization", "").encode()
+        if not hmac.compare_digest(authorization, f"Bearer {token}".encode()):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+    elif settings.environment == "production":
+        return JSONResponse({"error": "Not available in production"}, status_code=404)
+    return None
 
-    # For non-Android, just redirect to wa.me
-    if not is_android(user_agent):
-        logger.info(
-            "Non-Android device - direct redirect",
-            extra={"request_id": request_id, "device_type": device_type},
-        )
-        return RedirectResponse(url=wa_url, status_code=302)
 
-    # For Android, show Chrome intent page
-    logger.info(
-        "Android device - showing Chrome intent page",
-        extra={"request_id": request_id, "env_type": env_type},
-    )
-    html = CHROME_INTENT_TEMPLATE.format(
-        wa_url=wa_url,
-        phone=clean_phone,
-        text=text or "",
-    )
-    return HTMLResponse(content=html, status_code=200)
+@router.get("/metrics", tags=["Health"], include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """
+    Prometheus metrics endpoint.
 
+    Request counters and latency histograms summed across all workers.
+    Needs the METRICS_TOKEN bearer token when one is set, and is not
+    available in production without one.
+    """
+    error = _token_error(request, settings.metrics_token)
+    if error is not None:
+        return error
+    if not settings.enable_metrics:
+        return PlainTextResponse("Metrics are disabled\n", status_code=404)
 
-# =============================================================================
-# Simple Chrome Opener Route
-# =============================================================================
+    return PlainTextResponse(render_prometheus(), media_type=METRICS_CONTENT_TYPE)
 
 
-@router.get("/c", tags=["Redirect"])
-async def chrome_redirect(
+@router.get("/clicks", tags=["Health"], include_in_schema=False)
+async def click_counts(
     request: Request,
-    phone: str = Query(..., min_length=10, max_length=15),
-    text: Optional[str] = Query(None, max_length=1000),
-    src: Optional[str] = Query(None, max_length=50),
-    campaign: Optional[str] = Query(None, max_length=100),
-    ad_id: Optional[str] = Query(None, max_length=100),
+    minutes: Annotated[
+        int,
+        Query(ge=1, le=settings.click_rollup_minutes, description="Minutes of history"),
+    ] = settings.click_rollup_minutes,
 ):
     """
-    Simple Chrome opener for Android.
+    Click counts by route, env_type, src, campaign and ad_id, across workers.
 
-    Uses meta refresh + JavaScript + iframe to aggressively try to open Chrome.
-    On non-Android, redirects directly to wa.me.
+    Totals since the running workers started and over the last `minutes`
+    minutes; other workers' counts are as of their last publish
+    (CLICK_PUBLISH_INTERVAL). Needs the CLICKS_TOKEN bearer token when one
+    is set, and is not available in production without one.
     """
-    import re
-    from urllib.parse import quote
+    error = _token_error(request, settings.clicks_token)
+    if error is not None:
+        return error
+    if click_counters is None:
+        return JSONResponse({"error": "Click counters are disabled"}, status_code=404)
 
-    user_agent = request.headers.get("user-agent", "")
+    return click_counters.snapshot(minutes)
 
-    # Validate phone
-    is_valid, error_msg = validate_phone(phone)
-    if not is_valid:
-        html = ERROR_PAGE_TEMPLATE.format(
-            error_message="Invalid phone number.",
-            error_code="INVALID_PHONE",
-        )
-        return HTMLResponse(content=html, status_code=400)
-
-    # Build URLs
-    clean_phone = re.sub(r"\D", "", phone)
-    wa_url = build_wa_me_url(phone, text)
-
-    # Chrome intent URL - opens wa.me URL in Chrome
-    chrome_intent_url = f"intent://wa.me/{clean_phone}"
-    if text:
-        chrome_intent_url += f"?text={quote(text)}"
-    chrome_intent_url += f"#Intent;scheme=https;package=com.android.chrome;S.browser_fallback_url={quote(wa_url)};end"
-
-    # Log
-    logger.info(
-        "Chrome opener request",
-        extra={
-            "phone": clean_phone[:4] + "****",
-            "src": src,
-            "campaign": campaign,
-            "route": "/c",
-        },
-    )
 
-    # Non-Android: direct redirect
-    if not is_android(user_agent):
-        return RedirectResponse(url=wa_url, status_code=302)
+# =============================================================================
+# Redirect Routes (one per entry in app.strategies.STRATEGIES)
+# =============================================================================
 
-    # Android: show Chrome opener page
-    html = CHROME_OPEN_TEMPLATE.format(
-        chrome_intent_url=chrome_intent_url,
-        wa_url=wa_url,
+PhoneQuery = Annotated[
+    str,
+    Query(
+        description="WhatsApp number in E.164 format without '+' (e.g., 9198XXXXXXXX)",
+        min_length=10,
+        max_length=15,
+    ),
+]
+TextQuery = Annotated[
+    Optional[str], Query(description="Prefilled WhatsApp message", max_length=1000)
+]
+SrcQuery = Annotated[
+    Optional[str],
+    Query(
+        description="Traffic source (e.g., 'linkedin_ad', 'twitter', 'email')",
+        max_length=50,
+    ),
+]
+CampaignQuery = Annotated[
+    Optional[str], Query(description="Campaign identifier", max_length=100)
+]
+AdIdQuery = Annotated[Optional[str], Query(description="Ad identifier", max_length=100)]
+DebugQuery = Annotated[
+    int,
+    Query(
+        description="Set to 1 to force showing the fallback HTML page",
+        ge=0,
+        le=1,
+    ),
+]
+
+
+def _redirect_endpoint(strategy: RedirectStrategy) -> Callable[..., Awaitable[Response]]:
+    """Build the endpoint of a strategy's route."""
+    if strategy.debug_param:
+
+        async def endpoint(
+            request: Request,
+            phone: PhoneQuery,
+            text: TextQuery = None,
+            src: SrcQuery = None,
+            campaign: CampaignQuery = None,
+            ad_id: AdIdQuery = None,
+            debug: DebugQuery = 0,
+        ) -> Response:
+            return handle(
+                strategy, request.headers.get("user-agent", ""), client_ip(request.scope),
+                phone, text, src, campaign, ad_id, debug_mode=debug == 1,
+            )
+
+    else:
+
+        async def endpoint(
+            request: Request,
+            phone: PhoneQuery,
+            text: TextQuery = None,
+            src: SrcQuery = None,
+            campaign: CampaignQuery = None,
+            ad_id: AdIdQuery = None,
+        ) -> Response:
+            return handle(
+                strategy, request.headers.get("user-agent", ""), client_ip(request.scope),
+                phone, text, src, campaign, ad_id,
+            )
+
+    endpoint.__name__ = strategy.name
+    return endpoint
+
+
+for _strategy in STRATEGIES.values():
+    router.add_api_route(
+        _strategy.path,
+        _redirect_endpoint(_strategy),
+        methods=["GET"],
+        tags=["Redirect"],
+        name=_strategy.name,
+        description=_strategy.description,
     )
-    return HTMLResponse(content=html, status_code=200)
 
 
 # =============================================================================
-# Auto-Copy Route
+# Short Link Route
 # =============================================================================
 
 
-@router.get("/a", tags=["Redirect"])
-async def auto_copy_redirect(
-    request: Request,
-    phone: str = Query(..., min_length=10, max_length=15),
-    text: Optional[str] = Query(None, max_length=1000),
-    src: Optional[str] = Query(None, max_length=50),
-    campaign: Optional[str] = Query(None, max_length=100),
-    ad_id: Optional[str] = Query(None, max_length=100),
-):
+@router.get("/s/{code}", tags=["Redirect"])
+async def short_link_redirect(request: Request, code: str):
     """
-    Auto-copy route for LinkedIn Android.
-
-    Automatically copies the WhatsApp link to clipboard on page load.
-    User just needs to open Chrome and paste.
+    Short link redirect.
 
-    On non-Android/non-webview, redirects directly to wa.me.
+    Resolves the code from the short link index and then behaves exactly
+    like the redirect route the link was created for, using the
+    destination URLs pre-built when the index was loaded.
     """
-    import re
-
-    user_agent = request.headers.get("user-agent", "")
-
-    # Validate phone
-    is_valid, error_msg = validate_phone(phone)
-    if not is_valid:
-        html = ERROR_PAGE_TEMPLATE.format(
-            error_message="Invalid phone number.",
-            error_code="INVALID_PHONE",
+    link = short_links.get(code)
+    if link is None:
+        log_request_fields(short_code=code[:50], error="Unknown short link")
+        html = get_page("error").render(
+            error_message="This link does not exist. Please check the link and try again.",
+            error_code="LINK_NOT_FOUND",
         )
-        return HTMLResponse(content=html, status_code=400)
-
-    # Build URL
-    wa_url = build_wa_me_url(phone, text)
-
-    # Log
-    logger.info(
-        "Auto-copy request",
-        extra={
-            "phone": phone[:4] + "****" if len(phone) > 4 else "****",
-            "src": src,
-            "campaign": campaign,
-            "route": "/a",
-        },
-    )
-
-    # Safe environment: direct redirect
-    if not is_risky_environment(user_agent):
-        return RedirectResponse(url=wa_url, status_code=302)
+        return HTMLResponse(content=html, status_code=404)
 
-    # Risky environment: show auto-copy page
-    html = AUTO_COPY_TEMPLATE.format(wa_url=wa_url)
-    return HTMLResponse(content=html, status_code=200)
+    log_request_fields(short_code=code, short_route=f"/{link.route}")
+    return respond(
+        STRATEGIES[link.route], request.headers.get("user-agent", ""), client_ip(request.scope),
+        link.target, link.src, link.campaign, link.ad_id,
+    )
 
 
 # =============================================================================
-# Ultimate Route - Everything + QR Code
+# Static Assets & QR Code
 # =============================================================================
 
 
-@router.get("/u", tags=["Redirect"])
-async def ultimate_redirect(
-    request: Request,
-    phone: str = Query(..., min_length=10, max_length=15),
-    text: Optional[str] = Query(None, max_length=1000),
-    src: Optional[str] = Query(None, max_length=50),
-    campaign: Optional[str] = Query(None, max_length=100),
-    ad_id: Optional[str] = Query(None, max_length=100),
-):
+def _etag_matches(request: Request, etag: str) -> Optional[str]:
     """
-    Ultimate route - tries everything + shows QR code.
+    The tag in the request's If-None-Match that covers the given strong ETag.
 
-    - Auto-copies link to clipboard
-    - Tries all WhatsApp URL schemes
-    - Shows QR code for camera scan
-    - Copy and Share buttons
-    - Clear instructions
+    Compressed responses carry the ETag with an encoding suffix (see
+    app.compression), so those variants match too.
 
-    On safe environments, redirects directly.
+    Returns:
+        The matching tag, to send back with the 304, or None
     """
-    import re
-    from urllib.parse import quote
-
-    user_agent = request.headers.get("user-agent", "")
-
-    # Validate
-    is_valid, _ = validate_phone(phone)
-    if not is_valid:
-        return HTMLResponse(
-            ERROR_PAGE_TEMPLATE.format(error_message="Invalid phone", error_code="INVALID"),
-            status_code=400
-        )
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    variants = {etag, *(encoded_etag(etag, encoding) for encoding in ENCODINGS)}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag in variants:
+            return tag
+    return None
+
+
+@router.api_route(
+    "/static/{filename}", methods=["GET", "HEAD"], tags=["Static"], include_in_schema=False
+)
+async def static_asset(request: Request, filename: str):
+    """
+    Versioned static asset (page stylesheets).
 
-    # Build URLs
-    clean_phone = re.sub(r"\D", "", phone)
-    wa_url = build_wa_me_url(phone, text)
-    wa_url_encoded = quote(wa_url, safe='')
-    text_encoded = quote(text or '', safe='')
-
-    # Log
-    logger.info("Ultimate redirect", extra={"phone": clean_phone[:4] + "****", "src": src, "route": "/u"})
-
-    # Safe: direct redirect
-    if not is_risky_environment(user_agent):
-        return RedirectResponse(url=wa_url, status_code=302)
-
-    # Risky: show ultimate page
-    html = ULTIMATE_TEMPLATE.format(
-        wa_url=wa_url,
-        wa_url_encoded=wa_url_encoded,
-        phone=clean_phone,
-        text_encoded=text_encoded,
-    )
-    return HTMLResponse(content=html, status_code=200)
+    URLs contain a hash of the content, so responses are cacheable forever.
+    """
+    asset = find_asset(filename)
+    if asset is None:
+        return PlainTextResponse("Not found", status_code=404)
 
+    headers = {"ETag": asset.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    matched = _etag_matches(request, asset.etag)
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(asset.body))
+        return Response(media_type=asset.content_type, headers=headers)
 
-# =============================================================================
-# LinkedIn-Optimized Route
-# =============================================================================
+    return Response(content=asset.body, media_type=asset.content_type, headers=headers)
 
 
-@router.get("/l", tags=["Redirect"])
-async def linkedin_redirect(
-    request: Request,
-    phone: str = Query(..., min_length=10, max_length=15),
-    text: Optional[str] = Query(None, max_length=1000),
-    src: Optional[str] = Query(None, max_length=50),
-    campaign: Optional[str] = Query(None, max_length=100),
-    ad_id: Optional[str] = Query(None, max_length=100),
-):
+@router.get("/qr", tags=["Redirect"])
+async def qr_code(request: Request, phone: PhoneQuery, text: TextQuery = None):
     """
-    LinkedIn redirect route - Chrome Intent for Android.
+    QR code of the wa.me link for a phone number and message, as SVG.
 
-    For Android: Shows Chrome Intent page that tries to open Chrome browser,
-    which can then properly handle WhatsApp links.
+    Used by the /u fallback page instead of a third-party QR service. Takes
+    the parameters of the redirect routes and builds the URL itself, so no
+    caller can have arbitrary data encoded. The encoder is pure Python and
+    runs on the event loop: a message that would make the URL longer than
+    QR_MAX_URL_LENGTH is left out of the code (scanning it still opens the
+    chat), which keeps every uncached encode small.
 
-    For non-Android: Direct redirect to wa.me.
+    Rendered codes are cached per worker and served with a strong ETag and
+    a long-lived Cache-Control, so repeat visitors never re-download them.
     """
-    import re
-
-    user_agent = request.headers.get("user-agent", "")
+    target = get_link_target(phone, text)
+    if target.error:
+        return PlainTextResponse("Invalid phone number", status_code=400)
+    url = target.wa_url
+    if len(url) > settings.qr_max_url_length:
+        url = get_link_target(phone).wa_url
 
-    # Validate phone
-    is_valid, error_msg = validate_phone(phone)
-    if not is_valid:
-        html = ERROR_PAGE_TEMPLATE.format(
-            error_message="Invalid phone number.",
-            error_code="INVALID_PHONE",
-        )
-        return HTMLResponse(content=html, status_code=400)
-
-    # Build WhatsApp URL
-    wa_url = build_wa_me_url(phone, text)
-    clean_phone = re.sub(r"\D", "", phone)
-
-    # Log
-    logger.info(
-        "LinkedIn redirect - Chrome Intent",
-        extra={
-            "phone": phone[:4] + "****" if len(phone) > 4 else "****",
-            "src": src,
-            "campaign": campaign,
-            "route": "/l",
-            "is_android": is_android(user_agent),
-        },
-    )
+    svg, etag = render_qr_svg(url)
 
-    # Non-Android: direct redirect
-    if not is_android(user_agent):
-        return RedirectResponse(url=wa_url, status_code=302)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    matched = _etag_matches(request, etag)
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
 
-    # Android: show Chrome Intent page
-    html = CHROME_INTENT_TEMPLATE.format(
-        wa_url=wa_url,
-        phone=clean_phone,
-        text=text or "",
-    )
-    return HTMLResponse(content=html, status_code=200)
+    return Response(content=svg, media_type="image/svg+xml", headers=headers)
 
 
 # =============================================================================
@@ -561,16 +368,76 @@ async def debug_user_agent(request: Request):
         return {"error": "Not available in production"}
 
     user_agent = request.headers.get("user-agent", "")
+    ua_info = classify_ua(user_agent)
+    cache_info = classify_ua.cache_info()
 
     return {
         "user_agent": user_agent,
         "detection": {
-            "device_type": get_device_type(user_agent),
-            "is_android": is_android(user_agent),
-            "is_ios": is_ios(user_agent),
-            "is_desktop": is_desktop(user_agent),
-            "webview_source": get_webview_source(user_agent),
-            "env_type": get_env_type(user_agent),
-            "is_risky": is_risky_environment(user_agent),
+            "device_type": ua_info.device,
+            "is_android": ua_info.is_android,
+            "is_ios": ua_info.is_ios,
+            "is_desktop": ua_info.is_desktop,
+            "webview_source": ua_info.webview,
+            "env_type": ua_info.env_type,
+            "is_risky": ua_info.risky,
+        },
+        "ua_cache": {
+            "hits": cache_info.hits,
+            "misses": cache_info.misses,
+            "size": cache_info.currsize,
+            "max_size": cache_info.maxsize,
         },
     }
+
+
+@router.get("/debug/profiles", tags=["Debug"])
+async def debug_profiles():
+    """
+    List the request profiles recorded by this worker, newest first.
+
+    Only available in non-production environments.
+    """
+    if settings.environment == "production":
+        return {"error": "Not available in production"}
+
+    return {
+        "enabled": profiling_enabled(),
+        "sample_rate": settings.profiling_sample_rate,
+        "buffer_size": settings.profiling_buffer_size,
+        "profiles": profiles.list(),
+    }
+
+
+@router.get("/debug/profiles/{profile_id}", tags=["Debug"])
+async def debug_profile(
+    profile_id: int,
+    format: Annotated[
+        str,
+        Query(
+            description="'pstats' to download the profile, 'text' for a summary",
+            pattern="^(pstats|text)$",
+        ),
+    ] = "pstats",
+):
+    """
+    Download one request profile.
+
+    The pstats file opens with ``python -m pstats`` or snakeviz. Only
+    available in non-production environments.
+    """
+    if settings.environment == "production":
+        return {"error": "Not available in production"}
+
+    record = profiles.get(profile_id)
+    if record is None:
+        return PlainTextResponse("Profile not found\n", status_code=404)
+    if format == "text":
+        return PlainTextResponse(record.report())
+    return Response(
+        content=record.stats,
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'
+        },
+    )
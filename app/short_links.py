@@ -0,0 +1,174 @@
+"""
+Short link index for the /s/{code} route.
+
+Short codes map to the same parameters the redirect routes (/w, /wc, /u,
+...) take in their query strings. The index is loaded once from a JSON file
+or an SQLite database and kept in memory as a dict of slotted records, each
+holding a LinkTarget with every URL pre-built, so resolving a code does no
+per-request URL building.
+
+JSON files hold either a list of objects with a "code" key or an object
+keyed by code; entries that are not objects are skipped like invalid ones.
+SQLite databases need a ``short_links`` table with the columns ``code,
+route, phone, text, src, campaign, ad_id``.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.strategies import STRATEGIES
+from app.utils import LinkTarget
+
+logger = get_logger("short_links")
+
+# Routes a short link may resolve through
+SHORT_LINK_ROUTES = tuple(STRATEGIES)
+
+# Same limits as the query parameters of the redirect routes
+_MAX_LENGTHS = {"text": 1000, "src": 50, "campaign": 100, "ad_id": 100}
+
+
+class ShortLink:
+    """A resolved short link with its destination URLs pre-built."""
+
+    __slots__ = ("code", "route", "target", "src", "campaign", "ad_id")
+
+    def __init__(
+        self,
+        code: str,
+        route: str,
+        target: LinkTarget,
+        src: Optional[str] = None,
+        campaign: Optional[str] = None,
+        ad_id: Optional[str] = None,
+    ) -> None:
+        self.code = code
+        self.route = route
+        self.target = target
+        self.src = src
+        self.campaign = campaign
+        self.ad_id = ad_id
+
+    def __repr__(self) -> str:
+        return f"ShortLink(code={self.code!r}, route={self.route!r})"
+
+
+def _parse_entry(entry: Any) -> ShortLink:
+    """Validate one raw entry and build its ShortLink."""
+    if not isinstance(entry, Mapping):
+        raise ValueError(f"entry is not an object: {json.dumps(entry)[:50]}")
+
+    code = str(entry.get("code") or "")
+    if not code:
+        raise ValueError("missing code")
+
+    route = str(entry.get("route") or "w").lstrip("/")
+    if route not in SHORT_LINK_ROUTES:
+        raise ValueError(f"unsupported route {route!r}")
+
+    phone = str(entry.get("phone") or "")
+    if not 10 <= len(phone) <= 15:
+        raise ValueError("phone must be 10 to 15 characters")
+
+    values: Dict[str, Optional[str]] = {}
+    for field, max_length in _MAX_LENGTHS.items():
+        value = entry.get(field)
+        if value is not None:
+            value = str(value)
+            if len(value) > max_length:
+                raise ValueError(f"{field} longer than {max_length} characters")
+        values[field] = value or None
+
+    target = LinkTarget(phone, values.pop("text"))
+    is_valid, error_msg = target.validate()
+    if not is_valid:
+        raise ValueError(error_msg)
+
+    return ShortLink(code=code, route=route, target=target, **values)
+
+
+def _read_json(path: str) -> Iterator[Any]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        for code, entry in data.items():
+            # Non-objects go through as they are, for _parse_entry to reject
+            yield {"code": code, **entry} if isinstance(entry, dict) else entry
+    elif isinstance(data, list):
+        yield from data
+    else:
+        raise ValueError(f"{path}: expected a JSON list or object")
+
+
+def _read_sqlite(path: str) -> Iterator[Mapping[str, Any]]:
+    import sqlite3  # only deployments with an SQLite index pay for the import
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(
+            "SELECT code, route, phone, text, src, campaign, ad_id FROM short_links"
+        )
+        for row in rows:
+            yield dict(row)
+    finally:
+        connection.close()
+
+
+class ShortLinkIndex:
+    """In-memory code -> ShortLink index."""
+
+    def __init__(self, links: Iterable[ShortLink] = ()) -> None:
+        self._links: Dict[str, ShortLink] = {link.code: link for link in links}
+        self.source: Optional[str] = None
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def get(self, code: str) -> Optional[ShortLink]:
+        """Resolve a short code, or None if it is unknown."""
+        return self._links.get(code)
+
+    @classmethod
+    def load(cls, path: str) -> "ShortLinkIndex":
+        """
+        Load an index from a JSON file or an SQLite database.
+
+        Invalid entries are logged and skipped rather than failing the load.
+        """
+        if path.endswith((".db", ".sqlite", ".sqlite3")):
+            reader = _read_sqlite
+        else:
+            reader = _read_json
+        index = cls()
+        index.source = path
+        for entry in reader(path):
+            try:
+                link = _parse_entry(entry)
+            except ValueError as exc:
+                index.skipped += 1
+                logger.warning(
+                    "Skipping invalid short link",
+                    extra={
+                        "code": entry.get("code") if isinstance(entry, Mapping) else None,
+                        "error": str(exc),
+                    },
+                )
+                continue
+            index._links[link.code] = link
+
+        logger.info(
+            "Short links loaded",
+            extra={"source": path, "links": len(index), "skipped": index.skipped},
+        )
+        return index
+
+
+short_links = (
+    ShortLinkIndex.load(settings.short_links_file)
+    if settings.short_links_file
+    else ShortLinkIndex()
+)
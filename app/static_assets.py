@@ -0,0 +1,111 @@
+"""
+Versioned static assets for the HTML pages.
+
+The stylesheets of the fallback pages are identical for every visitor, so
+they are moved out of the templates when the pages are compiled and served
+from memory at content-hashed URLs (``/static/<page>.<hash>.css``). A URL
+changes whenever its content does, which lets browsers cache assets forever.
+
+Only blocks without placeholders are extracted; the page scripts embed the
+per-link URLs and stay inline.
+"""
+
+import hashlib
+import re
+from string import Formatter
+from typing import Dict, Optional
+
+URL_PREFIX = "/static/"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+CSS_CONTENT_TYPE = "text/css; charset=utf-8"
+
+_STYLE_BLOCK = re.compile(r"<style>(.*?)</style>", re.S)
+_STYLESHEET_LINK = re.compile(
+    rb'<link rel="stylesheet" href="' + re.escape(URL_PREFIX.encode()) + rb'([^"]+)">'
+)
+
+
+class StaticAsset:
+    """An in-memory asset with its versioned URL and strong ETag."""
+
+    __slots__ = ("filename", "url", "body", "content_type", "etag")
+
+    def __init__(self, filename: str, body: bytes, content_type: str) -> None:
+        self.filename = filename
+        self.url = URL_PREFIX + filename
+        self.body = body
+        self.content_type = content_type
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+    def __repr__(self) -> str:
+        return f"StaticAsset({self.url!r}, {len(self.body)} bytes)"
+
+
+# filename -> asset, and content digest -> asset so identical blocks share a URL
+ASSETS: Dict[str, StaticAsset] = {}
+_BY_DIGEST: Dict[str, StaticAsset] = {}
+
+
+def register(name: str, body: bytes, content_type: str) -> StaticAsset:
+    """
+    Register an asset under a content-hashed filename.
+
+    Args:
+        name: Logical filename, e.g. "ultimate.css"
+        body: Asset content
+        content_type: Content-Type to serve it with
+
+    Returns:
+        The registered asset (an existing one if the content is already known)
+    """
+    digest = hashlib.blake2b(body, digest_size=5).hexdigest()
+    asset = _BY_DIGEST.get(digest)
+    if asset is not None:
+        return asset
+
+    stem, dot, extension = name.rpartition(".")
+    asset = StaticAsset(f"{stem}.{digest}{dot}{extension}", body, content_type)
+    ASSETS[asset.filename] = asset
+    _BY_DIGEST[digest] = asset
+    return asset
+
+
+def get_asset(filename: str) -> Optional[StaticAsset]:
+    """Look up an asset by the filename part of its URL."""
+    return ASSETS.get(filename)
+
+
+def extract_styles(source: str, name: str) -> str:
+    """
+    Move the static ``<style>`` blocks of a str.format template into assets.
+
+    Args:
+        source: Template source in str.format syntax
+        name: Page name the stylesheet is named after
+
+    Returns:
+        The template source with each extracted block replaced by a
+        ``<link rel="stylesheet">`` to its asset
+    """
+
+    def replace(match: "re.Match[str]") -> str:
+        parsed = list(Formatter().parse(match.group(1)))
+        if any(field is not None for _, field, _, _ in parsed):
+            return match.group(0)
+        css = "".join(text for text, _, _, _ in parsed)
+        asset = register(f"{name}.css", css.encode("utf-8"), CSS_CONTENT_TYPE)
+        return f'<link rel="stylesheet" href="{asset.url}">'
+
+    return _STYLE_BLOCK.sub(replace, source)
+
+
+def inline_styles(html: bytes) -> bytes:
+    """Replace stylesheet links to registered assets with inline blocks."""
+
+    def replace(match: "re.Match[bytes]") -> bytes:
+        asset = ASSETS.get(match.group(1).decode("ascii"))
+        if asset is None:
+            return match.group(0)
+        return b"<style>" + asset.body + b"</style>"
+
+    return _STYLESHEET_LINK.sub(replace, html)
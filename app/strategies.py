@@ -0,0 +1,315 @@
+"""
+Redirect strategies for the wa.me redirect routes.
+
+Every redirect route runs the same pipeline: validate the phone, derive the
+wa.me URLs (a cached LinkTarget bundle), classify the User-Agent,
+add the redirect details to the request log, then either 302 to wa.me or
+show a fallback page. Routes differ only in which environments get a page,
+which page, and the text of their error page, so each route is one entry
+in STRATEGIES; routes.py registers an endpoint for every entry.
+"""
+
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+
+from app.clicks import click_counters, counting
+from app.journal import click_journal
+from app.logging_config import log_request_fields
+from app.templates import CompiledTemplate, get_page, placeholders
+from app.timing import mark
+from app.utils import (
+    LinkTarget,
+    UAClassification,
+    classify_ua,
+    get_link_target,
+    mask_phone,
+    normalize_phone,
+)
+
+INVALID_PHONE_MESSAGE = (
+    "The phone number provided is invalid. Please check the link and try again."
+)
+
+# Template slots of the Chrome intent page, filled from LinkTarget attributes
+_CHROME_INTENT_FIELDS = (("wa_url", "wa_url"), ("phone", "clean_phone"), ("text", "message"))
+
+
+class RedirectStrategy:
+    """
+    How one redirect route responds.
+
+    Args:
+        route: Path segment of the route, e.g. "wc" for /wc
+        name: Endpoint name (also the OpenAPI operation name)
+        description: Route documentation shown in the API docs
+        page: Name of the fallback page (see app.templates.PAGE_SOURCES),
+            or None to always redirect
+        page_when: UAClassification attribute that selects the page
+            (e.g. "is_android" or "risky"); other environments get the 302
+        page_action: Action logged when the page is shown
+        page_fields: (template slot, LinkTarget attribute) pairs
+        error_message: Message of the invalid-phone page
+        error_code: Code shown on the invalid-phone page
+        debug_param: Whether the route accepts the ``debug`` query parameter
+    """
+
+    __slots__ = (
+        "route",
+        "path",
+        "name",
+        "description",
+        "page_name",
+        "page_when",
+        "page_action",
+        "page_fields",
+        "error_message",
+        "error_code",
+        "debug_param",
+        "_error_body",
+    )
+
+    def __init__(
+        self,
+        route: str,
+        name: str,
+        description: str,
+        page: Optional[str] = None,
+        page_when: Optional[str] = None,
+        page_action: str = "",
+        page_fields: Tuple[Tuple[str, str], ...] = (),
+        error_message: str = "Invalid phone number.",
+        error_code: str = "INVALID_PHONE",
+        debug_param: bool = False,
+    ) -> None:
+        if (page is None) != (page_when is None):
+            raise ValueError(f"Strategy {route!r} needs both page and page_when")
+        if page is not None and placeholders(page) != {slot for slot, _ in page_fields}:
+            raise ValueError(f"Strategy {route!r} does not fill every slot of its page")
+
+        self.route = route
+        self.path = f"/{route}"
+        self.name = name
+        self.description = description
+        self.page_name = page
+        self.page_when = page_when
+        self.page_action = page_action
+        self.page_fields = page_fields
+        self.error_message = error_message
+        self.error_code = error_code
+        self.debug_param = debug_param
+        self._error_body: Optional[bytes] = None
+
+    @property
+    def page(self) -> Optional[CompiledTemplate]:
+        """The compiled fallback page (pages are compiled on first use)."""
+        return get_page(self.page_name) if self.page_name is not None else None
+
+    @property
+    def error_body(self) -> bytes:
+        """The invalid-phone page, rendered on first use."""
+        if self._error_body is None:
+            self._error_body = get_page("error").render(
+                error_message=self.error_message, error_code=self.error_code
+            )
+        return self._error_body
+
+    def __repr__(self) -> str:
+        return f"RedirectStrategy({self.path!r}, page_when={self.page_when!r})"
+
+
+STRATEGIES: Dict[str, RedirectStrategy] = {
+    strategy.route: strategy
+    for strategy in (
+        RedirectStrategy(
+            "w",
+            name="whatsapp_redirect",
+            description=(
+                "Main WhatsApp redirect endpoint. Always redirects straight to "
+                "wa.me; the phone is validated and the visit logged with its "
+                "detected environment."
+            ),
+            error_message=INVALID_PHONE_MESSAGE,
+            debug_param=True,
+        ),
+        RedirectStrategy(
+            "wc",
+            name="whatsapp_chrome_redirect",
+            description=(
+                "WhatsApp redirect using Chrome intent for Android. Android "
+                "devices get a page that opens Chrome, which can handle wa.me "
+                "links even from webviews like LinkedIn's in-app browser; "
+                "other devices are redirected to wa.me."
+            ),
+            page="chrome_intent",
+            page_when="is_android",
+            page_action="chrome_intent_page",
+            page_fields=_CHROME_INTENT_FIELDS,
+            error_message=INVALID_PHONE_MESSAGE,
+        ),
+        RedirectStrategy(
+            "c",
+            name="chrome_redirect",
+            description=(
+                "Simple Chrome opener for Android, using meta refresh, "
+                "JavaScript and an iframe to open Chrome. Other devices are "
+                "redirected to wa.me."
+            ),
+            page="chrome_open",
+            page_when="is_android",
+            page_action="chrome_open_page",
+            page_fields=(("chrome_intent_url", "chrome_intent_url"), ("wa_url", "wa_url")),
+        ),
+        RedirectStrategy(
+            "a",
+            name="auto_copy_redirect",
+            description=(
+                "Auto-copy route for risky webviews: copies the WhatsApp link "
+                "to the clipboard on page load so the user only has to open "
+                "Chrome and paste. Safe environments are redirected to wa.me."
+            ),
+            page="auto_copy",
+            page_when="risky",
+            page_action="auto_copy_page",
+            page_fields=(("wa_url", "wa_url"),),
+        ),
+        RedirectStrategy(
+            "u",
+            name="ultimate_redirect",
+            description=(
+                "Ultimate route for risky webviews: auto-copies the link, tries "
+                "every WhatsApp URL scheme, and shows a QR code plus Copy and "
+                "Share buttons. Safe environments are redirected to wa.me."
+            ),
+            page="ultimate",
+            page_when="risky",
+            page_action="ultimate_page",
+            page_fields=(
+                ("wa_url", "wa_url"),
+                ("phone", "clean_phone"),
+                ("text_encoded", "text_encoded"),
+            ),
+            error_message="Invalid phone",
+            error_code="INVALID",
+        ),
+        RedirectStrategy(
+            "l",
+            name="linkedin_redirect",
+            description=(
+                "LinkedIn redirect route. Android devices get the Chrome intent "
+                "page; other devices are redirected to wa.me."
+            ),
+            page="chrome_intent",
+            page_when="is_android",
+            page_action="chrome_intent_page",
+            page_fields=_CHROME_INTENT_FIELDS,
+        ),
+    )
+}
+
+
+def handle(
+    strategy: RedirectStrategy,
+    user_agent: str,
+    client_ip: str,
+    phone: str,
+    text: Optional[str],
+    src: Optional[str],
+    campaign: Optional[str],
+    ad_id: Optional[str],
+    **log_fields: Any,
+) -> Response:
+    """
+    Run the redirect pipeline for a request to a strategy's route.
+
+    Args:
+        strategy: Strategy of the requested route
+        user_agent: Request User-Agent
+        client_ip: Client address (hashed into the click journal)
+        phone, text, src, campaign, ad_id: Query parameters
+        **log_fields: Extra fields for the request log event
+
+    Returns:
+        The 302, fallback page, or invalid-phone page
+    """
+    started = perf_counter()
+    error = normalize_phone(phone).error
+    started = mark("validate", started)
+    if error:
+        log_request_fields(phone=mask_phone(phone), error=error)
+        return HTMLResponse(content=strategy.error_body, status_code=400)
+
+    target = get_link_target(phone, text)
+    mark("url", started)
+    return respond(strategy, user_agent, client_ip, target, src, campaign, ad_id, **log_fields)
+
+
+def respond(
+    strategy: RedirectStrategy,
+    user_agent: str,
+    client_ip: str,
+    target: LinkTarget,
+    src: Optional[str],
+    campaign: Optional[str],
+    ad_id: Optional[str],
+    **log_fields: Any,
+) -> Response:
+    """Respond for an already validated target (also used by short links)."""
+    started = perf_counter()
+    ua_info = classify_ua(user_agent)
+    started = mark("classify", started)
+    show_page = shows_page(strategy, ua_info)
+    log_redirect(
+        strategy, ua_info, client_ip, target, src, campaign, ad_id, show_page, **log_fields
+    )
+    started = mark("log", started)
+
+    if not show_page:
+        return RedirectResponse(url=target.wa_url, status_code=302)
+
+    html = strategy.page.render(
+        **{slot: getattr(target, attr) for slot, attr in strategy.page_fields}
+    )
+    mark("render", started)
+    return HTMLResponse(content=html, status_code=200)
+
+
+def shows_page(strategy: RedirectStrategy, ua_info: UAClassification) -> bool:
+    """Whether the strategy answers this environment with its page."""
+    return strategy.page_when is not None and getattr(ua_info, strategy.page_when)
+
+
+def log_redirect(
+    strategy: RedirectStrategy,
+    ua_info: UAClassification,
+    client_ip: str,
+    target: LinkTarget,
+    src: Optional[str],
+    campaign: Optional[str],
+    ad_id: Optional[str],
+    show_page: bool,
+    **log_fields: Any,
+) -> None:
+    """Count the click and add the redirect details to the request log event."""
+    if counting():
+        if click_counters is not None:
+            click_counters.record(strategy.path, ua_info.env_type, src, campaign, ad_id)
+        if click_journal is not None:
+            click_journal.append(
+                strategy.path, ua_info.env_type, show_page, src, campaign, ad_id, client_ip
+            )
+    log_request_fields(
+        phone=mask_phone(target.clean_phone),
+        country_code=target.country_code,
+        text=target.text[:50] if target.text else None,
+        src=src,
+        campaign=campaign,
+        ad_id=ad_id,
+        device_type=ua_info.device,
+        webview_source=ua_info.webview,
+        env_type=ua_info.env_type,
+        is_risky=ua_info.risky,
+        action=strategy.page_action if show_page else "direct_redirect",
+        **log_fields,
+    )
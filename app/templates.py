@@ -1,9 +1,23 @@
 """
 HTML templates for fallback pages.
 
-All templates use inline CSS/JS to avoid external dependencies.
+Templates are written with inline CSS/JS and use no third-party resources
+(the QR code on the ultimate page is served by this service at /qr).
+Routes render the precompiled versions from ``get_page``, compiled on first
+use so that startup only pays for the pages it serves; their stylesheets
+are served as versioned static assets unless ENABLE_STATIC_ASSETS is off.
+
+Run ``python -m app.templates`` to check that every page renders the same
+with and without the stylesheets split out.
 """
 
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.static_assets import StaticAsset, extract_styles, get_asset, inline_styles
+
 FALLBACK_PAGE_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -816,7 +830,7 @@ ULTIMATE_TEMPLATE = """<!DOCTYPE html>
         <div class="qr-section">
             <p>Scan with your camera app:</p>
             <div class="qr-code">
-                <img src="https://api.qrserver.com/v1/create-qr-code/?size=140x140&data={wa_url_encoded}" width="140" height="140" alt="QR Code">
+                <img src="/qr?phone={phone}&amp;text={text_encoded}" width="140" height="140" alt="QR Code">
             </div>
         </div>
     </div>
@@ -1689,3 +1703,161 @@ ERROR_PAGE_TEMPLATE = """<!DOCTYPE html>
     </div>
 </body>
 </html>"""
+
+
+# =============================================================================
+# Precompiled Templates
+# =============================================================================
+#
+# The templates above are written in str.format syntax, which means every
+# render rescans the whole page (hundreds of escaped CSS/JS braces) just to
+# find a handful of placeholders. They are parsed once here instead into a
+# sequence of pre-encoded static chunks and named slots; rendering only
+# encodes the slot values and joins the pieces.
+
+
+class CompiledTemplate:
+    """
+    A str.format template parsed once into static byte chunks and slots.
+
+    Rendering produces exactly the same bytes as
+    ``source.format(**values).encode("utf-8")``.
+    """
+
+    __slots__ = ("name", "source", "fields", "_chunks", "_slots")
+
+    def __init__(self, source: str, name: str = "") -> None:
+        self.name = name
+        self.source = source
+
+        chunks: list[bytes] = []
+        slots: list[tuple[int, str, str, Optional[str]]] = []
+        literal = ""
+        for text, field, spec, conversion in Formatter().parse(source):
+            literal += text
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(
+                    f"Unsupported placeholder {{{field}}} in template {name!r}"
+                )
+            chunks.append(literal.encode("utf-8"))
+            slots.append((len(chunks), field, spec or "", conversion))
+            chunks.append(b"")
+            literal = ""
+        chunks.append(literal.encode("utf-8"))
+
+        self._chunks = tuple(chunks)
+        self._slots = tuple(slots)
+        self.fields = frozenset(field for _, field, _, _ in slots)
+
+    def render(self, **values: Any) -> bytes:
+        """
+        Render the template with the given slot values.
+
+        Raises:
+            KeyError: If a placeholder has no value, as str.format does.
+        """
+        buf = list(self._chunks)
+        for index, field, spec, conversion in self._slots:
+            value = values[field]
+            if conversion is not None or spec or type(value) is not str:
+                value = _format_value(value, spec, conversion)
+            buf[index] = value.encode("utf-8")
+        return b"".join(buf)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.name!r}, fields={sorted(self.fields)})"
+
+
+def _format_value(value: Any, spec: str, conversion: Optional[str]) -> str:
+    """Apply a placeholder's conversion and format spec like str.format."""
+    if conversion == "r":
+        value = repr(value)
+    elif conversion == "s":
+        value = str(value)
+    elif conversion == "a":
+        value = ascii(value)
+    return format(value, spec)
+
+
+# Template sources by page name
+PAGE_SOURCES: Dict[str, str] = {
+    "fallback": FALLBACK_PAGE_TEMPLATE,
+    "chrome_intent": CHROME_INTENT_TEMPLATE,
+    "ultimate": ULTIMATE_TEMPLATE,
+    "auto_copy": AUTO_COPY_TEMPLATE,
+    "chrome_open": CHROME_OPEN_TEMPLATE,
+    "chrome_escape": CHROME_ESCAPE_TEMPLATE,
+    "linkedin": LINKEDIN_TEMPLATE,
+    "error": ERROR_PAGE_TEMPLATE,
+}
+
+
+def compile_page(name: str, split_assets: Optional[bool] = None) -> CompiledTemplate:
+    """
+    Compile a page, with its stylesheets moved to static assets if enabled.
+
+    Args:
+        name: Key in PAGE_SOURCES
+        split_assets: Override settings.enable_static_assets
+    """
+    if split_assets is None:
+        split_assets = settings.enable_static_assets
+    source = PAGE_SOURCES[name]
+    if split_assets:
+        source = extract_styles(source, name)
+    return CompiledTemplate(source, name)
+
+
+def verify_static_split() -> None:
+    """
+    Check that every page renders the same with and without the split.
+
+    Each page is rendered both ways with placeholder values; inlining the
+    linked stylesheets again must give back the inline page byte for byte.
+
+    Raises:
+        RuntimeError: If a page differs
+    """
+    for name in PAGE_SOURCES:
+        inline = compile_page(name, split_assets=False)
+        split = compile_page(name, split_assets=True)
+        values = {field: f"<{field}>" for field in inline.fields}
+        if inline_styles(split.render(**values)) != inline.render(**values):
+            raise RuntimeError(f"Page {name!r} renders differently with static assets")
+
+
+@lru_cache(maxsize=None)
+def _compiled_pages() -> Dict[str, CompiledTemplate]:
+    """
+    Compile every page, once, on first use.
+
+    Pages are compiled together and in a fixed order because stylesheets
+    shared by several pages are named after the first one: every worker
+    must link them under the same URL.
+    """
+    return {name: compile_page(name) for name in PAGE_SOURCES}
+
+
+def get_page(name: str) -> CompiledTemplate:
+    """The compiled page; the first call compiles all of them."""
+    return _compiled_pages()[name]
+
+
+def placeholders(name: str) -> frozenset:
+    """Placeholder names of a page, read from its source without compiling."""
+    return frozenset(
+        field for _, field, _, _ in Formatter().parse(PAGE_SOURCES[name]) if field is not None
+    )
+
+
+def find_asset(filename: str) -> Optional[StaticAsset]:
+    """Look up a page stylesheet, compiling the pages first if needed."""
+    _compiled_pages()
+    return get_asset(filename)
+
+
+if __name__ == "__main__":
+    verify_static_split()
+    print(f"{len(PAGE_SOURCES)} pages render the same with and without static assets")
@@ -0,0 +1,59 @@
+"""
+Per-phase request timing.
+
+Handlers time their phases (phone validation, UA classification, URL
+building, page rendering, logging, compression) with ``mark``; the request
+tracking middleware binds a collector per request and reports the phases
+in a ``Server-Timing`` header and in the request log event.
+
+Outside a bound request (or with ENABLE_SERVER_TIMING off) ``mark`` only
+reads the clock.
+"""
+
+from contextvars import ContextVar, Token
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+# Phase name -> seconds, for the current request
+_request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_phases", default=None
+)
+
+
+def bind_phases() -> Tuple[Dict[str, float], Token]:
+    """Start collecting phase timings for the current request."""
+    phases: Dict[str, float] = {}
+    return phases, _request_phases.set(phases)
+
+
+def unbind_phases(token: Token) -> None:
+    """Stop collecting phase timings for the current request."""
+    _request_phases.reset(token)
+
+
+def mark(phase: str, start: float) -> float:
+    """
+    Close a phase that started at `start` (a perf_counter() reading).
+
+    Phases recorded more than once in a request add up.
+
+    Returns:
+        The current perf_counter() reading, to start the next phase with
+    """
+    now = perf_counter()
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + now - start
+    return now
+
+
+def server_timing(phases: Dict[str, float], total: float) -> bytes:
+    """Server-Timing header value: each phase, then the total, in ms."""
+    metrics = [f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in phases.items()]
+    metrics.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(metrics).encode("ascii")
+
+
+def phases_ms(phases: Dict[str, float]) -> Dict[str, float]:
+    """Phase timings for the request log, in ms."""
+    return {phase: round(seconds * 1000, 3) for phase, seconds in phases.items()}
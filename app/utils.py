@@ -2,33 +2,139 @@
 Utility functions for URL building and User-Agent detection.
 """
 
-import re
-from typing import Optional
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, Optional
 from urllib.parse import quote
 
 from app.config import settings
 
+# =============================================================================
+# Phone Numbers
+# =============================================================================
 
-def build_wa_me_url(phone: str, text: Optional[str] = None) -> str:
+# E.164 country calling codes in use. The codes are prefix-free, so at most
+# one of a number's first 1-3 digits can match.
+COUNTRY_CODES = frozenset(
     """
-    Build a wa.me URL for WhatsApp deep linking.
+    1 7
+    20 27 30 31 32 33 34 36 39 40 41 43 44 45 46 47 48 49 51 52 53 54 55 56
+    57 58 60 61 62 63 64 65 66 81 82 84 86 90 91 92 93 94 95 98
+    211 212 213 216 218 220 221 222 223 224 225 226 227 228 229
+    230 231 232 233 234 235 236 237 238 239 240 241 242 243 244 245 246 247
+    248 249 250 251 252 253 254 255 256 257 258 260 261 262 263 264 265 266
+    267 268 269 290 291 297 298 299 350 351 352 353 354 355 356 357 358 359
+    370 371 372 373 374 375 376 377 378 380 381 382 383 385 386 387 389
+    420 421 423 500 501 502 503 504 505 506 507 508 509
+    590 591 592 593 594 595 596 597 598 599 670 672 673 674 675 676 677 678
+    679 680 681 682 683 685 686 687 688 689 690 691 692
+    850 852 853 855 856 870 878 880 881 882 883 886 888
+    960 961 962 963 964 965 966 967 968 970 971 972 973 974 975 976 977
+    992 993 994 995 996 998
+    """.split()
+)
+
+# Every byte except ASCII 0-9, for bytes.translate(None, delete)
+_NON_DIGIT_BYTES = bytes(c for c in range(256) if not 48 <= c <= 57)
+
+
+def _digits(phone: str) -> str:
+    """Keep only the decimal digits of a string, as ASCII 0-9."""
+    if phone.isascii():
+        if phone.isdigit():
+            return phone
+        return phone.encode("ascii").translate(None, _NON_DIGIT_BYTES).decode("ascii")
+    # Other scripts' digits (e.g. Devanagari) count too, like regex \d
+    return "".join(str(unicodedata.decimal(ch)) for ch in phone if ch.isdecimal())
+
+
+class PhoneNumber:
+    """
+    Immutable result of normalizing a phone number.
+
+    Attributes:
+        digits: The number's digits only, e.g. '919876543210'
+        country_code: E.164 country calling code, or None if unknown
+        error: Validation error message, '' if the number is valid
+    """
+
+    __slots__ = ("digits", "country_code", "error")
+
+    def __init__(self, digits: str, country_code: Optional[str], error: str) -> None:
+        set_attr = object.__setattr__
+        set_attr(self, "digits", digits)
+        set_attr(self, "country_code", country_code)
+        set_attr(self, "error", error)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.error
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("PhoneNumber is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("PhoneNumber is immutable")
+
+    def __repr__(self) -> str:
+        return (
+            f"PhoneNumber(digits={self.digits!r}, "
+            f"country_code={self.country_code!r}, error={self.error!r})"
+        )
+
+
+@lru_cache(maxsize=settings.phone_cache_size)
+def normalize_phone(phone: str) -> PhoneNumber:
+    """
+    Strip, validate and split a phone number, cached per input string.
 
     Args:
-        phone: WhatsApp number in E.164 format without '+', e.g., '9198XXXXXXX'
-        text: Optional prefilled message text
+        phone: Phone number as given, e.g. '+91 98765-43210'
 
     Returns:
-        Full wa.me URL, e.g., 'https://wa.me/9198XXXXXXX?text=Hi%20Tal'
+        PhoneNumber with the digits, country code and any validation error
     """
-    # Clean phone number - remove any non-digit characters
-    clean_phone = re.sub(r"\D", "", phone)
+    digits = _digits(phone)
+
+    if not digits:
+        error = "Phone number is required"
+    elif len(digits) < settings.phone_min_length:
+        error = f"Phone number must be at least {settings.phone_min_length} digits"
+    elif len(digits) > settings.phone_max_length:
+        error = f"Phone number must be at most {settings.phone_max_length} digits"
+    else:
+        error = ""
+
+    country_code = None
+    for length in (1, 2, 3):
+        if digits[:length] in COUNTRY_CODES:
+            country_code = digits[:length]
+            break
+
+    return PhoneNumber(digits, country_code, error)
+
 
+def _wa_me_url(clean_phone: str, text: Optional[str]) -> str:
     url = f"https://wa.me/{clean_phone}"
     if text:
         url += f"?text={quote(text)}"
     return url
 
 
+def build_wa_me_url(phone: str, text: Optional[str] = None) -> str:
+    """
+    Build a wa.me URL for WhatsApp deep linking.
+
+    Args:
+        phone: WhatsApp number in E.164 format without '+', e.g., '9198XXXXXXX'
+        text: Optional prefilled message text
+
+    Returns:
+        Full wa.me URL, e.g., 'https://wa.me/9198XXXXXXX?text=Hi%20Tal'
+    """
+    return _wa_me_url(normalize_phone(phone).digits, text)
+
+
 def validate_phone(phone: str) -> tuple[bool, str]:
     """
     Validate phone number format.
@@ -39,37 +145,255 @@ def validate_phone(phone: str) -> tuple[bool, str]:
     Returns:
         Tuple of (is_valid, error_message)
     """
-    # Remove any non-digit characters for validation
-    clean_phone = re.sub(r"\D", "", phone)
+    number = normalize_phone(phone)
+    return number.is_valid, number.error
 
-    if not clean_phone:
-        return False, "Phone number is required"
 
-    if len(clean_phone) < settings.phone_min_length:
-        return False, f"Phone number must be at least {settings.phone_min_length} digits"
+class LinkTarget:
+    """
+    Immutable bundle of a phone/text pair and every URL derived from it.
+
+    Holds the destination in each form the routes and page templates use,
+    so a cached bundle (see get_link_target) serves any route without
+    building a string.
+
+    Attributes:
+        phone: Phone number as given
+        text: Prefilled message, or None
+        clean_phone: Phone number with non-digits removed
+        country_code: E.164 country calling code, or None if unknown
+        error: Phone validation error message, '' if valid
+        message: Prefilled message, '' if none
+        text_encoded: Message percent-encoded for use as a query parameter
+        wa_url: wa.me URL, as built by build_wa_me_url()
+        wa_url_encoded: wa_url percent-encoded for use as a query parameter
+        api_url: api.whatsapp.com/send URL
+        whatsapp_url: whatsapp://send URL (app scheme)
+        whatsapp_intent_url: Android intent URL that opens the WhatsApp app
+        chrome_intent_url: Android intent URL that opens wa_url in Chrome
+    """
 
-    if len(clean_phone) > settings.phone_max_length:
-        return False, f"Phone number must be at most {settings.phone_max_length} digits"
+    __slots__ = (
+        "phone",
+        "text",
+        "clean_phone",
+        "country_code",
+        "error",
+        "message",
+        "text_encoded",
+        "wa_url",
+        "wa_url_encoded",
+        "api_url",
+        "whatsapp_url",
+        "whatsapp_intent_url",
+        "chrome_intent_url",
+    )
+
+    def __init__(self, phone: str, text: Optional[str] = None) -> None:
+        number = normalize_phone(phone)
+        clean_phone = number.digits
+        text_encoded = quote(text or "", safe="")
+        wa_url = _wa_me_url(clean_phone, text)
+        send_query = f"send?phone={clean_phone}&text={text_encoded}"
+
+        chrome_intent_url = f"intent://wa.me/{clean_phone}"
+        if text:
+            chrome_intent_url += f"?text={quote(text)}"
+        chrome_intent_url += (
+            "#Intent;scheme=https;package=com.android.chrome;"
+            f"S.browser_fallback_url={quote(wa_url)};end"
+        )
+
+        set_attr = object.__setattr__
+        set_attr(self, "phone", phone)
+        set_attr(self, "text", text)
+        set_attr(self, "clean_phone", clean_phone)
+        set_attr(self, "country_code", number.country_code)
+        set_attr(self, "error", number.error)
+        set_attr(self, "message", text or "")
+        set_attr(self, "text_encoded", text_encoded)
+        set_attr(self, "wa_url", wa_url)
+        set_attr(self, "wa_url_encoded", quote(wa_url, safe=""))
+        set_attr(self, "api_url", f"https://api.whatsapp.com/{send_query}")
+        set_attr(self, "whatsapp_url", f"whatsapp://{send_query}")
+        set_attr(
+            self,
+            "whatsapp_intent_url",
+            f"intent://{send_query}#Intent;scheme=whatsapp;package=com.whatsapp;end",
+        )
+        set_attr(self, "chrome_intent_url", chrome_intent_url)
+
+    def validate(self) -> tuple[bool, str]:
+        """Validate the phone number, like validate_phone()."""
+        return not self.error, self.error
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("LinkTarget is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("LinkTarget is immutable")
+
+    def __repr__(self) -> str:
+        return f"LinkTarget(phone={self.clean_phone!r}, text={self.text!r})"
+
+
+@lru_cache(maxsize=settings.link_cache_size)
+def get_link_target(phone: str, text: Optional[str] = None) -> LinkTarget:
+    """
+    Return the URL bundle for a phone/text pair, cached per pair.
 
-    if not clean_phone.isdigit():
-        return False, "Phone number must contain only digits"
+    Ad traffic repeats a few pairs, so most requests reuse a bundle.
+    """
+    return LinkTarget(phone, text)
+
+
+def mask_phone(phone: str) -> str:
+    """
+    Mask a phone number for logging, keeping only a few leading/trailing digits.
 
-    return True, ""
+    Example: '919876543210' -> '9198****10'
+    """
+    if len(phone) > 6:
+        return phone[:4] + "****" + phone[-2:]
+    return "****"
 
 
 # =============================================================================
 # User-Agent Detection
 # =============================================================================
 
+# Every value classify_ua() can report
+DEVICE_TYPES = ("android", "ios", "desktop", "unknown")
+WEBVIEW_SOURCES = ("linkedin", "twitter", "facebook", "instagram")
+ENV_TYPES = tuple(
+    env_type
+    for device in DEVICE_TYPES
+    for env_type in (
+        device,
+        *(f"{device}_{source}_webview" for source in WEBVIEW_SOURCES),
+    )
+)
+
+
+class UAClassification:
+    """
+    Immutable result of classifying a User-Agent string.
+
+    Attributes:
+        device: One of 'android', 'ios', 'desktop', 'unknown'
+        webview: Webview source ('linkedin', 'twitter', ...) or None
+        env_type: Combined environment label, e.g. 'android_linkedin_webview'
+        risky: Whether direct wa.me redirects are unreliable here
+        is_desktop: Whether the UA looks like a desktop browser
+        is_android: Whether the UA indicates an Android device
+        is_ios: Whether the UA indicates an iOS device
+    """
+
+    __slots__ = (
+        "device",
+        "webview",
+        "env_type",
+        "risky",
+        "is_desktop",
+        "is_android",
+        "is_ios",
+    )
+
+    def __init__(
+        self,
+        device: str,
+        webview: Optional[str],
+        env_type: str,
+        risky: bool,
+        is_desktop: bool,
+        is_android: bool,
+        is_ios: bool,
+    ) -> None:
+        set_attr = object.__setattr__
+        set_attr(self, "device", device)
+        set_attr(self, "webview", webview)
+        set_attr(self, "env_type", env_type)
+        set_attr(self, "risky", risky)
+        set_attr(self, "is_desktop", is_desktop)
+        set_attr(self, "is_android", is_android)
+        set_attr(self, "is_ios", is_ios)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("UAClassification is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("UAClassification is immutable")
+
+    def __repr__(self) -> str:
+        return (
+            f"UAClassification(device={self.device!r}, webview={self.webview!r}, "
+            f"env_type={self.env_type!r}, risky={self.risky!r})"
+        )
+
+
+def _classify(ua_lower: str) -> UAClassification:
+    """Classify an already lowercased User-Agent string."""
+    android = "android" in ua_lower
+    ios = "iphone" in ua_lower or "ipad" in ua_lower or "ipod" in ua_lower
+    desktop = (
+        "macintosh" in ua_lower
+        or "windows" in ua_lower
+        or "linux" in ua_lower
+    ) and not android and not ios
+
+    if "linkedin" in ua_lower:
+        webview = "linkedin"
+    elif "twitter" in ua_lower or "x-client" in ua_lower:
+        webview = "twitter"
+    elif "fban" in ua_lower or "fbav" in ua_lower or "fb_iab" in ua_lower:
+        webview = "facebook"
+    elif "instagram" in ua_lower:
+        webview = "instagram"
+    else:
+        webview = None
+
+    if android:
+        device = "android"
+    elif ios:
+        device = "ios"
+    elif desktop:
+        device = "desktop"
+    else:
+        device = "unknown"
+
+    env_type = f"{device}_{webview}_webview" if webview else device
+
+    return UAClassification(
+        device=device,
+        webview=webview,
+        env_type=env_type,
+        risky=android and webview is not None,
+        is_desktop=desktop,
+        is_android=android,
+        is_ios=ios,
+    )
+
+
+@lru_cache(maxsize=settings.ua_cache_size)
+def classify_ua(ua: str) -> UAClassification:
+    """
+    Classify a User-Agent string in a single lowercase pass.
+
+    Results are kept in a bounded LRU keyed by the raw UA string, so the
+    handful of UAs that dominate ad traffic are O(1) lookups. Hit and miss
+    counters are available through ``classify_ua.cache_info()``.
+    """
+    return _classify(ua.lower())
+
+
 def is_android(ua: str) -> bool:
     """Check if User-Agent indicates an Android device."""
-    return "android" in ua.lower()
+    return classify_ua(ua).is_android
 
 
 def is_ios(ua: str) -> bool:
     """Check if User-Agent indicates an iOS device (iPhone/iPad)."""
-    ua_lower = ua.lower()
-    return "iphone" in ua_lower or "ipad" in ua_lower or "ipod" in ua_lower
+    return classify_ua(ua).is_ios
 
 
 def is_linkedin_webview(ua: str) -> bool:
@@ -79,8 +403,7 @@ def is_linkedin_webview(ua: str) -> bool:
     LinkedIn webview typically contains 'LinkedIn' in the UA string.
     Some versions also include 'LinkedInApp'.
     """
-    ua_lower = ua.lower()
-    return "linkedin" in ua_lower or "linkedinapp" in ua_lower
+    return classify_ua(ua).webview == "linkedin"
 
 
 def is_twitter_webview(ua: str) -> bool:
@@ -89,8 +412,7 @@ def is_twitter_webview(ua: str) -> bool:
 
     Twitter webview typically contains 'Twitter' or 'X-Client' in the UA.
     """
-    ua_lower = ua.lower()
-    return "twitter" in ua_lower or "x-client" in ua_lower
+    return classify_ua(ua).webview == "twitter"
 
 
 def is_facebook_webview(ua: str) -> bool:
@@ -99,8 +421,7 @@ def is_facebook_webview(ua: str) -> bool:
 
     Facebook webview typically contains 'FBAN' or 'FBAV' in the UA.
     """
-    ua_lower = ua.lower()
-    return "fban" in ua_lower or "fbav" in ua_lower or "fb_iab" in ua_lower
+    return classify_ua(ua).webview == "facebook"
 
 
 def is_instagram_webview(ua: str) -> bool:
@@ -109,7 +430,7 @@ def is_instagram_webview(ua: str) -> bool:
 
     Instagram webview typically contains 'Instagram' in the UA.
     """
-    return "instagram" in ua.lower()
+    return classify_ua(ua).webview == "instagram"
 
 
 def is_desktop(ua: str) -> bool:
@@ -119,22 +440,12 @@ def is_desktop(ua: str) -> bool:
     Heuristic: contains 'macintosh', 'windows', or 'linux' (non-Android)
     and is not a mobile device.
     """
-    ua_lower = ua.lower()
-    is_mac = "macintosh" in ua_lower
-    is_win = "windows" in ua_lower
-    is_linux_desktop = "linux" in ua_lower and not is_android(ua)
-
-    return (is_mac or is_win or is_linux_desktop) and not is_android(ua) and not is_ios(ua)
+    return classify_ua(ua).is_desktop
 
 
 def is_webview(ua: str) -> bool:
     """Check if User-Agent indicates any known in-app webview."""
-    return (
-        is_linkedin_webview(ua)
-        or is_twitter_webview(ua)
-        or is_facebook_webview(ua)
-        or is_instagram_webview(ua)
-    )
+    return classify_ua(ua).webview is not None
 
 
 def get_webview_source(ua: str) -> Optional[str]:
@@ -144,15 +455,7 @@ def get_webview_source(ua: str) -> Optional[str]:
     Returns:
         String identifier of the webview source, or None if not a known webview.
     """
-    if is_linkedin_webview(ua):
-        return "linkedin"
-    if is_twitter_webview(ua):
-        return "twitter"
-    if is_facebook_webview(ua):
-        return "facebook"
-    if is_instagram_webview(ua):
-        return "instagram"
-    return None
+    return classify_ua(ua).webview
 
 
 def get_device_type(ua: str) -> str:
@@ -162,13 +465,7 @@ def get_device_type(ua: str) -> str:
     Returns:
         One of: 'android', 'ios', 'desktop', 'unknown'
     """
-    if is_android(ua):
-        return "android"
-    if is_ios(ua):
-        return "ios"
-    if is_desktop(ua):
-        return "desktop"
-    return "unknown"
+    return classify_ua(ua).device
 
 
 def get_env_type(ua: str) -> str:
@@ -178,12 +475,7 @@ def get_env_type(ua: str) -> str:
     Returns a human-readable string describing the detected environment.
     Example: 'android_linkedin_webview', 'ios', 'desktop'
     """
-    device = get_device_type(ua)
-    webview = get_webview_source(ua)
-
-    if webview:
-        return f"{device}_{webview}_webview"
-    return device
+    return classify_ua(ua).env_type
 
 
 def is_risky_environment(ua: str) -> bool:
@@ -198,6 +490,33 @@ def is_risky_environment(ua: str) -> bool:
     Android in a regular browser is safe.
     Android in a social media webview (LinkedIn, Twitter, FB, IG) is risky.
     """
-    # Only Android webviews are considered risky
-    # iOS handles wa.me links well even in webviews
-    return is_android(ua) and is_webview(ua)
+    return classify_ua(ua).risky
+
+
+# =============================================================================
+# Cache Statistics
+# =============================================================================
+
+
+def _lru_stats(cached: Any) -> Dict[str, Any]:
+    """Counters of an lru_cache-wrapped function."""
+    info = cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        # Nothing is ever cleared, so every miss beyond the size evicted one
+        "evictions": max(0, info.misses - info.currsize),
+    }
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the counters of this worker's lookup caches."""
+    return {
+        "user_agents": _lru_stats(classify_ua),
+        "phones": _lru_stats(normalize_phone),
+        "links": _lru_stats(get_link_target),
+    }
@@ -0,0 +1,174 @@
+"""
+Worker warmup, run in the background right after startup.
+
+A fresh worker has nothing compiled or cached: the first clicks it serves
+would pay for compiling the pages, classifying their User-Agents and the
+first pass through every route. The warmup does that work up front:
+
+1. compiles every page
+2. classifies a representative set of User-Agents and builds a link target
+3. sends a few in-process requests to every redirect route (and one with
+   an invalid phone, for its error page) and to a page stylesheet, through
+   the whole middleware stack
+
+Warmup requests are marked in their ASGI scope (``scope["warmup"]``), so
+they are not logged, counted in metrics or rate limited, and their
+redirects are not counted as clicks. /ready answers 503
+until the warmup is done, so load balancers keep clicks off a cold worker;
+/health stays a plain liveness check.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message
+
+from app.clicks import pause_counting
+from app.config import settings
+from app.logging_config import get_logger
+from app.static_assets import ASSETS
+from app.strategies import STRATEGIES
+from app.templates import PAGE_SOURCES, get_page
+from app.utils import classify_ua, get_link_target
+
+logger = get_logger("warmup")
+
+# One User-Agent per environment the redirect routes treat differently
+WARMUP_USER_AGENTS = (
+    "Mozilla/5.0 (Linux; Android 13; SM-S918B Build/TP1A.220624.014; wv) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/123.0.6312.118 "
+    "Mobile Safari/537.36 [LinkedInApp]/9.29.7470",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.6367.82 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 12; SM-A525F Build/SP1A.210812.016; wv) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/123.0.6312.99 "
+    "Mobile Safari/537.36 [FB_IAB/FB4A;FBAV/458.0.0.54.108;]",
+    "Mozilla/5.0 (Linux; Android 13; Pixel 7 Build/TQ3A.230901.001; wv) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/123.0.6312.99 "
+    "Mobile Safari/537.36 Instagram 327.0.0.36.89 Android",
+    "Mozilla/5.0 (Linux; Android 11; Redmi Note 9 Pro Build/RKQ1.200826.002; wv) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/122.0.6261.119 "
+    "Mobile Safari/537.36 TwitterAndroid",
+)
+
+WARMUP_QUERY = b"phone=919876543210&text=Hi&src=warmup"
+INVALID_PHONE_QUERY = b"phone=0000000000"
+
+
+class WarmupState:
+    """Progress of this worker's warmup."""
+
+    __slots__ = ("ready", "duration_ms", "requests", "error")
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.duration_ms: Optional[float] = None
+        self.requests = 0
+        self.error: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "duration_ms": self.duration_ms,
+            "requests": self.requests,
+            "error": self.error,
+        }
+
+
+# Warmup of this worker (served by /ready)
+warmup_state = WarmupState()
+
+
+def _scope(path: str, query: bytes, user_agent: str) -> Dict[str, Any]:
+    """ASGI scope of a warmup GET request."""
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "root_path": "",
+        "query_string": query,
+        "headers": [
+            (b"host", b"localhost"),
+            (b"user-agent", user_agent.encode("latin-1")),
+            (b"accept-encoding", b"gzip, deflate, br"),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", settings.port),
+        "warmup": True,
+    }
+
+
+async def _request(app: ASGIApp, path: str, query: bytes, user_agent: str) -> int:
+    """Send one warmup request through the app; return its status code."""
+    status = 0
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(_scope(path, query, user_agent), receive, send)
+    return status
+
+
+async def warm_up(app: ASGIApp, requests_per_route: int) -> None:
+    """
+    Warm this worker up, then mark it ready.
+
+    A failing warmup is logged and the worker marked ready anyway: it can
+    still serve, only colder.
+
+    Args:
+        app: The full ASGI application (middleware included)
+        requests_per_route: In-process requests sent to each redirect route
+    """
+    start = time.perf_counter()
+    pause_counting()  # this task's redirects are not clicks
+    try:
+        for name in PAGE_SOURCES:
+            get_page(name)
+        for user_agent in WARMUP_USER_AGENTS:
+            classify_ua(user_agent)
+        get_link_target("919876543210", "Hi")
+
+        # (path, query, number of requests)
+        requests: List[Tuple[str, bytes, int]] = []
+        for strategy in STRATEGIES.values():
+            requests.append((strategy.path, WARMUP_QUERY, requests_per_route))
+            requests.append((strategy.path, INVALID_PHONE_QUERY, 1))
+        for asset in list(ASSETS.values())[:1]:
+            requests.append((asset.url, b"", 1))
+
+        for path, query, count in requests:
+            for i in range(count):
+                user_agent = WARMUP_USER_AGENTS[i % len(WARMUP_USER_AGENTS)]
+                status = await _request(app, path, query, user_agent)
+                warmup_state.requests += 1
+                if not 200 <= status < 500:
+                    raise RuntimeError(f"GET {path} answered {status}")
+                await asyncio.sleep(0)  # let real requests (health checks) through
+    except Exception as exc:  # noqa: BLE001 - never keep a worker out of rotation
+        warmup_state.error = f"{type(exc).__name__}: {exc}"
+        logger.warning("Warmup failed", extra={"error": warmup_state.error})
+
+    warmup_state.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+    warmup_state.ready = True
+    logger.info(
+        "Warmup complete",
+        extra={
+            "duration_ms": warmup_state.duration_ms,
+            "requests": warmup_state.requests,
+        },
+    )
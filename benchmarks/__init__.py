@@ -0,0 +1,12 @@
+"""
+Benchmarks for the Tal Redirector service.
+
+Run a benchmark module from the repository root, e.g.:
+    python -m benchmarks.log_formatter
+    python -m benchmarks.redirect_rps
+    python -m benchmarks.load --mode socket --output report.json
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.memory --workers 4
+    python -m benchmarks.journal
+    python -m benchmarks.startup
+"""
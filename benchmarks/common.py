@@ -0,0 +1,146 @@
+"""
+Shared fixtures for the benchmarks: User-Agent mix, ASGI scopes and an
+isolated environment for the app under test.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+# One User-Agent per environment the redirect routes treat differently
+USER_AGENTS: Dict[str, str] = {
+    "ios": (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 "
+        "(KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1"
+    ),
+    "desktop": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "android_chrome": (
+        "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.6367.82 Mobile Safari/537.36"
+    ),
+    "android_linkedin": (
+        "Mozilla/5.0 (Linux; Android 13; SM-S918B Build/TP1A.220624.014; wv) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/123.0.6312.118 "
+        "Mobile Safari/537.36 [LinkedInApp]/9.29.7470"
+    ),
+    "android_facebook": (
+        "Mozilla/5.0 (Linux; Android 12; SM-A525F Build/SP1A.210812.016; wv) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/123.0.6312.99 "
+        "Mobile Safari/537.36 [FB_IAB/FB4A;FBAV/458.0.0.54.108;]"
+    ),
+    "android_instagram": (
+        "Mozilla/5.0 (Linux; Android 13; Pixel 7 Build/TQ3A.230901.001; wv) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/123.0.6312.99 "
+        "Mobile Safari/537.36 Instagram 327.0.0.36.89 Android"
+    ),
+    "android_twitter": (
+        "Mozilla/5.0 (Linux; Android 11; Redmi Note 9 Pro Build/RKQ1.200826.002; wv) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/122.0.6261.119 "
+        "Mobile Safari/537.36 TwitterAndroid"
+    ),
+}
+
+# Share of traffic per environment (LinkedIn ads dominate)
+UA_MIX: Dict[str, int] = {
+    "ios": 25,
+    "desktop": 10,
+    "android_chrome": 15,
+    "android_linkedin": 30,
+    "android_facebook": 8,
+    "android_instagram": 8,
+    "android_twitter": 4,
+}
+
+REDIRECT_ROUTES: Tuple[str, ...] = ("/w", "/wc", "/c", "/a", "/u", "/l")
+
+QUERY = (
+    "phone=919876543210&text=Hi%20Tal%2C%20I%20saw%20your%20ad"
+    "&src=linkedin_ad&campaign=spring_launch&ad_id=ad_12345"
+)
+
+
+def ua_sequence() -> List[str]:
+    """One cycle of User-Agents, interleaved in UA_MIX proportions."""
+    remaining = dict(UA_MIX)
+    sequence: List[str] = []
+    while any(remaining.values()):
+        for name in UA_MIX:
+            if remaining[name]:
+                sequence.append(USER_AGENTS[name])
+                remaining[name] -= 1
+    return sequence
+
+
+def make_scope(path: str, query: str, user_agent: str) -> Dict[str, Any]:
+    """ASGI HTTP scope for a GET request as uvicorn would build it."""
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "root_path": "",
+        "query_string": query.encode("latin-1"),
+        "headers": [
+            (b"host", b"localhost"),
+            (b"user-agent", user_agent.encode("latin-1")),
+            (b"accept-encoding", b"gzip, deflate, br"),
+        ],
+        "client": ("203.0.113.7", 50000),
+        "server": ("localhost", 8000),
+    }
+
+
+def isolated_env(directory: str, **overrides: str) -> Dict[str, str]:
+    """
+    Environment for running the app under test.
+
+    Rate limiting is off (all requests come from one client) and metrics go
+    to `directory`, away from any real metrics directory.
+    """
+    return {
+        **os.environ,
+        "ENABLE_RATE_LIMIT": "false",
+        "METRICS_DIR": os.path.join(directory, "metrics"),
+        **overrides,
+    }
+
+
+def free_port() -> int:
+    """A TCP port that is free on localhost right now."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Start one uvicorn worker serving main:app, its output discarded."""
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--no-access-log", "--log-level", "warning",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def start_gunicorn(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Start gunicorn with gunicorn.conf.py (WORKERS, PRELOAD_APP from env)."""
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app",
+            "--bind", f"127.0.0.1:{port}", "--log-level", "warning",
+        ],
+        env={**env, "LOG_LEVEL": "WARNING"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
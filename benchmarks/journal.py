@@ -0,0 +1,86 @@
+"""
+Click journal: cost of appending a click, group commit, and reader speed.
+
+Appends --clicks clicks through app.journal.ClickJournal (with real fsyncs,
+in a temporary directory) from the calling thread, as log_redirect does,
+then reads them back with count_clicks:
+
+    append   time per append() on the calling thread (the per-request cost,
+             including the writer thread competing for the GIL)
+    commit   clicks per second until all are durable, and per group commit
+    scan     records per second counting by campaign, and by route + env_type
+
+Run:
+    python -m benchmarks.journal [--clicks N] [--segment-mb N]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from app.journal import ClickJournal, count_clicks, segment_paths
+from app.utils import ENV_TYPES
+
+ROUTES = ("/w", "/wc", "/c", "/a", "/u", "/l")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clicks", type=int, default=2_000_000)
+    parser.add_argument("--segment-mb", type=int, default=64)
+    parser.add_argument("--campaigns", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(20240601)
+    campaigns = [f"campaign-{i}" for i in range(args.campaigns)]
+    clicks = [
+        (
+            rng.choice(ROUTES),
+            rng.choice(ENV_TYPES),
+            rng.random() < 0.3,
+            rng.choice(("linkedin", "twitter", "email", None)),
+            rng.choice(campaigns),
+            f"ad-{rng.randrange(1000)}",
+            f"203.0.{rng.randrange(256)}.{rng.randrange(256)}",
+        )
+        for _ in range(min(args.clicks, 100_000))
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = ClickJournal(
+            directory,
+            args.segment_mb * 1024 * 1024,
+            commit_interval=0.05,
+            max_pending=args.clicks,
+            ip_salt="benchmark",
+        )
+        append = journal.append
+        start = time.perf_counter()
+        for i in range(args.clicks):
+            append(*clicks[i % len(clicks)])
+        appending = time.perf_counter() - start
+        journal.stop(timeout=600)
+        durable = time.perf_counter() - start
+
+        stats = journal.stats()
+        print(f"append   {appending / args.clicks * 1e9:>8.0f} ns per click")
+        print(
+            f"commit   {stats['written'] / durable / 1e6:>8.2f}M clicks/s"
+            f"  ({stats['commits']} commits, {stats['written']} written,"
+            f" {stats['dropped']} dropped, {stats['segments']} segments)"
+        )
+
+        paths = segment_paths([directory])
+        for by in (("campaign",), ("route", "env_type")):
+            start = time.perf_counter()
+            totals, scanned = count_clicks(paths, by)
+            elapsed = time.perf_counter() - start
+            print(
+                f"scan     {scanned / elapsed / 1e6:>8.1f}M records/s"
+                f"  by {'+'.join(by)} ({len(totals)} keys)"
+            )
+
+
+if __name__ == "__main__":
+    main()
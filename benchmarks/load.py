@@ -0,0 +1,343 @@
+"""
+Load test of every redirect route, in-process or over a real socket.
+
+Replays the User-Agent mix from benchmarks.common against /w, /wc, /c, /a,
+/u and /l and reports, per route, requests per second and p50/p95/p99
+latency. In-process runs also report allocations per request (tracemalloc
+peak) and blocks left allocated afterwards.
+
+Modes:
+    inprocess  Drives the ASGI app on one event loop, one request at a time:
+               the per-worker CPU cost, without sockets or HTTP parsing.
+    socket     Starts one uvicorn worker and drives it over keep-alive
+               connections: what a client sees from a single worker.
+
+The app runs in a child process in both modes, with rate limiting off and
+its logs discarded.
+
+Run:
+    python -m benchmarks.load [--mode inprocess|socket] [--requests N]
+                              [--output report.json]
+                              [--compare baseline.json [--threshold 0.1]]
+
+With --compare, exits with status 1 if any route lost more than the
+threshold in RPS or gained more than it in p99 latency.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import (
+    QUERY,
+    REDIRECT_ROUTES,
+    free_port,
+    isolated_env,
+    make_scope,
+    start_uvicorn,
+    ua_sequence,
+)
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """RPS and latency percentiles (ms) for one route."""
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(cuts[49] * 1000, 4),
+        "p95_ms": round(cuts[94] * 1000, 4),
+        "p99_ms": round(cuts[98] * 1000, 4),
+    }
+
+
+# =============================================================================
+# In-process
+# =============================================================================
+
+
+async def _call(app: Any, scope: Dict[str, Any]) -> int:
+    """Run one request through the app; return the status code."""
+    status = 0
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure_inprocess(
+    app: Any, route: str, requests: int, alloc_requests: int
+) -> Dict[str, Any]:
+    scopes = [make_scope(route, QUERY, ua) for ua in ua_sequence()]
+    for i in range(min(requests, 500)):  # warmup: caches, lazy imports
+        await _call(app, dict(scopes[i % len(scopes)]))
+
+    latencies: List[float] = []
+    clock = time.perf_counter
+    start = clock()
+    for i in range(requests):
+        t0 = clock()
+        status = await _call(app, dict(scopes[i % len(scopes)]))
+        latencies.append(clock() - t0)
+        if status >= 400:
+            raise RuntimeError(f"{route} answered {status}")
+    result = summarize(latencies, clock() - start)
+
+    # Allocations, measured separately: tracemalloc slows everything down
+    peaks: List[int] = []
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    for i in range(alloc_requests):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await _call(app, dict(scopes[i % len(scopes)]))
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    result["alloc_peak_kib"] = round(statistics.median(peaks) / 1024, 2)
+    result["retained_blocks_per_request"] = round(
+        (sys.getallocatedblocks() - blocks_before) / alloc_requests, 2
+    )
+    return result
+
+
+def run_child(routes: List[str], requests: int, alloc_requests: int, output: str) -> None:
+    """Measure in-process, in the child started by run_inprocess."""
+    from main import app
+
+    async def measure_all() -> Dict[str, Any]:
+        return {
+            route: await measure_inprocess(app, route, requests, alloc_requests)
+            for route in routes
+        }
+
+    with open(output, "w") as f:
+        json.dump(asyncio.run(measure_all()), f)
+
+
+def run_inprocess(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "routes.json")
+        subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.load",
+                "--routes", *args.routes,
+                "--requests", str(args.requests),
+                "--alloc-requests", str(args.alloc_requests),
+                "--child", output,
+            ],
+            env=isolated_env(tmp),
+            stdout=subprocess.DEVNULL,  # request logs
+            check=True,
+        )
+        with open(output) as f:
+            return json.load(f)
+
+
+# =============================================================================
+# Socket (uvicorn)
+# =============================================================================
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    """Read one HTTP/1.1 response; return its status code."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split()[1])
+    length: Optional[int] = None
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    if length is None:
+        raise RuntimeError("Response without Content-Length")
+    await reader.readexactly(length)
+    return status
+
+
+async def _connection(
+    port: int, requests: List[bytes], latencies: List[float]
+) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    clock = time.perf_counter
+    try:
+        for raw in requests:
+            t0 = clock()
+            writer.write(raw)
+            status = await _read_response(reader)
+            latencies.append(clock() - t0)
+            if status >= 400:
+                raise RuntimeError(f"Request answered {status}")
+    finally:
+        writer.close()
+
+
+async def measure_socket(
+    port: int, route: str, requests: int, concurrency: int
+) -> Dict[str, Any]:
+    raws = [
+        (
+            f"GET {route}?{QUERY} HTTP/1.1\r\nHost: localhost\r\n"
+            f"User-Agent: {ua}\r\nAccept-Encoding: gzip, deflate, br\r\n\r\n"
+        ).encode("latin-1")
+        for ua in ua_sequence()
+    ]
+    per_connection = max(1, requests // concurrency)
+    batches = [
+        [raws[(c + i) % len(raws)] for i in range(per_connection)]
+        for c in range(concurrency)
+    ]
+
+    warmup: List[float] = []
+    await _connection(port, raws * 2, warmup)
+
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_connection(port, batch, latencies) for batch in batches))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_socket(args: argparse.Namespace) -> Dict[str, Any]:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_uvicorn(port, isolated_env(tmp))
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("uvicorn did not start")
+                    time.sleep(0.1)
+
+            async def measure_all() -> Dict[str, Any]:
+                return {
+                    route: await measure_socket(port, route, args.requests, args.concurrency)
+                    for route in args.routes
+                }
+
+            return asyncio.run(measure_all())
+        finally:
+            server.terminate()
+            server.wait()
+
+
+# =============================================================================
+# Report & comparison
+# =============================================================================
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"mode: {report['mode']}  python: {report['python']}")
+    print(
+        f"{'route':<6} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        f" {'alloc KiB':>10} {'retained':>9}"
+    )
+    for route, r in report["routes"].items():
+        alloc = r.get("alloc_peak_kib")
+        retained = r.get("retained_blocks_per_request")
+        print(
+            f"{route:<6} {r['rps']:>9.0f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}"
+            f" {r['p99_ms']:>8.3f}"
+            f" {'-' if alloc is None else f'{alloc:.2f}':>10}"
+            f" {'-' if retained is None else f'{retained:.2f}':>9}"
+        )
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[Tuple[str, str]]:
+    """
+    Compare a report against a baseline.
+
+    Returns:
+        (route, description) for each regression beyond the threshold
+    """
+    regressions: List[Tuple[str, str]] = []
+    if report["mode"] != baseline["mode"]:
+        raise SystemExit(
+            f"Cannot compare a {report['mode']} run with a {baseline['mode']} baseline"
+        )
+
+    print(f"\n{'route':<6} {'rps':>9} {'p99 ms':>9}   vs baseline")
+    for route, current in report["routes"].items():
+        base = baseline["routes"].get(route)
+        if base is None:
+            continue
+        rps_change = current["rps"] / base["rps"] - 1
+        p99_change = current["p99_ms"] / base["p99_ms"] - 1
+        print(f"{route:<6} {rps_change:>+8.1%} {p99_change:>+9.1%}")
+        if rps_change < -threshold:
+            regressions.append((route, f"RPS {rps_change:+.1%}"))
+        if p99_change > threshold:
+            regressions.append((route, f"p99 {p99_change:+.1%}"))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("inprocess", "socket"), default="inprocess")
+    parser.add_argument("--routes", nargs="+", default=list(REDIRECT_ROUTES))
+    parser.add_argument("--requests", type=int, default=5000, help="per route")
+    parser.add_argument("--alloc-requests", type=int, default=200, help="per route")
+    parser.add_argument("--concurrency", type=int, default=16, help="socket mode")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--child", metavar="OUTPUT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.routes, args.requests, args.alloc_requests, args.child)
+        return
+
+    routes = run_inprocess(args) if args.mode == "inprocess" else run_socket(args)
+    report = {
+        "mode": args.mode,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests_per_route": args.requests,
+        "concurrency": args.concurrency if args.mode == "socket" else 1,
+        "routes": routes,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for route, description in regressions:
+                print(f"  {route}: {description}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Per-record cost of the JSON log formatter.
+
+Compares FastJsonFormatter (with each available JSON backend) against the
+python-json-logger based formatter it replaced, on a typical redirect log
+record.
+
+Run:
+    python -m benchmarks.log_formatter [--records N] [--repeat N]
+"""
+
+import argparse
+import logging
+import statistics
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from app import logging_config
+from app.config import settings
+from app.logging_config import FastJsonFormatter
+
+REDIRECT_EXTRA = {
+    "request_id": "3f2a9c1e",
+    "phone": "9198****10",
+    "text": "Hi Tal, I saw your ad on LinkedIn",
+    "src": "linkedin_ad",
+    "campaign": "spring_launch",
+    "ad_id": "ad_12345",
+    "device_type": "android",
+    "webview_source": "linkedin",
+    "env_type": "android_linkedin_webview",
+    "is_risky": True,
+    "debug_mode": False,
+    "client_ip": "203.0.113.7",
+}
+
+
+def make_record() -> logging.LogRecord:
+    """Build a log record like the one /w emits for each redirect."""
+    logger = logging.getLogger("tal_redirector.routes")
+    return logger.makeRecord(
+        logger.name,
+        logging.INFO,
+        "routes.py",
+        165,
+        "Redirect request received",
+        (),
+        None,
+        func="whatsapp_redirect",
+        extra=REDIRECT_EXTRA,
+    )
+
+
+def legacy_formatter() -> logging.Formatter:
+    """The python-json-logger based formatter used before FastJsonFormatter."""
+    from pythonjsonlogger import jsonlogger
+
+    class CustomJsonFormatter(jsonlogger.JsonFormatter):
+        def add_fields(
+            self,
+            log_record: Dict[str, Any],
+            record: logging.LogRecord,
+            message_dict: Dict[str, Any],
+        ) -> None:
+            super().add_fields(log_record, record, message_dict)
+            log_record["timestamp"] = datetime.now(timezone.utc).isoformat()
+            log_record["level"] = record.levelname
+            log_record["service"] = settings.app_name
+            log_record["environment"] = settings.environment
+            log_record["logger"] = record.name
+            log_record["module"] = record.module
+            log_record["function"] = record.funcName
+            log_record["line"] = record.lineno
+            log_record.pop("levelname", None)
+            log_record.pop("asctime", None)
+
+    return CustomJsonFormatter("%(timestamp)s %(level)s %(name)s %(message)s")
+
+
+def measure(fn: Callable[[], Any], records: int, repeat: int) -> List[float]:
+    """Return the per-call cost in nanoseconds for each repeat."""
+    fn()  # warmup
+    timer = timeit.Timer(fn)
+    return [t / records * 1e9 for t in timer.repeat(repeat=repeat, number=records)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    record = make_record()
+    results: Dict[str, List[float]] = {}
+
+    try:
+        legacy = legacy_formatter()
+        results["python-json-logger (old)"] = measure(
+            lambda: legacy.format(record), args.records, args.repeat
+        )
+    except ImportError:
+        print("python-json-logger not installed; skipping the old formatter")
+
+    backends = {"json": logging_config._dumps_json}
+    if logging_config.orjson is not None:
+        backends["orjson"] = logging_config._dumps_orjson
+
+    default_dumps = logging_config.dumps
+    for backend, dumps in backends.items():
+        logging_config.dumps = dumps
+        fast = FastJsonFormatter(settings.app_name, settings.environment)
+        results[f"FastJsonFormatter[{backend}] str"] = measure(
+            lambda: fast.format(record), args.records, args.repeat
+        )
+        results[f"FastJsonFormatter[{backend}] bytes"] = measure(
+            lambda: fast.format_bytes(record), args.records, args.repeat
+        )
+    logging_config.dumps = default_dumps
+
+    baseline = min(next(iter(results.values())))
+    print(f"{'formatter':<36} {'min ns':>9} {'median ns':>10} {'speedup':>8}")
+    for name, samples in results.items():
+        best = min(samples)
+        print(
+            f"{name:<36} {best:>9.0f} {statistics.median(samples):>10.0f}"
+            f" {baseline / best:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Memory of a gunicorn deployment, with and without PRELOAD_APP.
+
+Starts gunicorn with gunicorn.conf.py twice, forking the workers from a
+master that did not import the app (PRELOAD_APP=false) and from one that
+imported and froze it (PRELOAD_APP=true). Each time, once the workers are
+warmed up and have served some traffic, it reads every process's memory
+from /proc/<pid>/smaps_rollup (Linux only):
+
+    uss  unique set size: private pages, freed if the process exits
+    pss  proportional set size: private pages plus a share of shared ones
+    rss  resident set size: every page mapped, shared ones counted in full
+
+The per-worker USS is what each extra worker costs; the total PSS of the
+master and workers is what the deployment costs against a container limit.
+
+Run:
+    python -m benchmarks.memory [--workers N] [--requests N]
+                                [--output memory.json]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from benchmarks.common import QUERY, free_port, isolated_env, start_gunicorn, ua_sequence
+
+FIELDS = ("Rss", "Pss", "Private_Clean", "Private_Dirty")
+
+
+def read_memory(pid: int) -> Dict[str, float]:
+    """USS, PSS and RSS of a process, in MiB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        "uss": round(values["Private_Clean"] + values["Private_Dirty"], 2),
+        "pss": round(values["Pss"], 2),
+        "rss": round(values["Rss"], 2),
+    }
+
+
+def children(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _status(port: int, path: str, user_agent: str = "memory-benchmark") -> int:
+    """GET a path on a new connection; return the status code (0 if refused)."""
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", headers={"User-Agent": user_agent}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+    except OSError:
+        return 0
+
+
+def measure(preload: bool, workers: int, requests: int) -> Dict[str, Any]:
+    """Start gunicorn, send traffic, read the memory of every process."""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = isolated_env(
+            tmp,
+            ENVIRONMENT="production",
+            WORKERS=str(workers),
+            PRELOAD_APP=str(preload).lower(),
+        )
+        server = start_gunicorn(port, env)
+        try:
+            deadline = time.monotonic() + 60
+            while len(children(server.pid)) < workers or _status(port, "/ready") != 200:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+            time.sleep(1)  # the other workers finish their warmup too
+
+            # Every route, several User-Agents; connections land on any worker
+            user_agents = ua_sequence()
+            routes = ("/w", "/wc", "/c", "/a", "/u", "/l")
+            for i in range(requests):
+                path = f"{routes[i % len(routes)]}?{QUERY}"
+                _status(port, path, user_agents[i % len(user_agents)])
+            time.sleep(1)
+
+            return {
+                "master": read_memory(server.pid),
+                "workers": [read_memory(pid) for pid in children(server.pid)],
+            }
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def summarize(run: Dict[str, Any]) -> Dict[str, float]:
+    workers = run["workers"]
+    return {
+        "worker_uss": round(sum(w["uss"] for w in workers) / len(workers), 2),
+        "worker_pss": round(sum(w["pss"] for w in workers) / len(workers), 2),
+        "worker_rss": round(sum(w["rss"] for w in workers) / len(workers), 2),
+        "master_uss": run["master"]["uss"],
+        "total_pss": round(run["master"]["pss"] + sum(w["pss"] for w in workers), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=600, help="sent before measuring")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        raise SystemExit("needs /proc/<pid>/smaps_rollup (Linux)")
+
+    runs = {
+        "no_preload": measure(False, args.workers, args.requests),
+        "preload": measure(True, args.workers, args.requests),
+    }
+    summaries = {mode: summarize(run) for mode, run in runs.items()}
+
+    print(f"{args.workers} workers, {args.requests} requests, MiB")
+    print(f"{'':<22} {'no preload':>11} {'preload':>9} {'change':>8}")
+    for key in ("worker_uss", "worker_pss", "worker_rss", "master_uss", "total_pss"):
+        before = summaries["no_preload"][key]
+        after = summaries["preload"][key]
+        change = after / before - 1 if before else 0.0
+        print(f"{key:<22} {before:>11.1f} {after:>9.1f} {change:>+8.1%}")
+
+    if args.output:
+        report = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workers": args.workers,
+            "requests": args.requests,
+            "summary": summaries,
+            "processes": runs,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
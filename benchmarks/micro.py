@@ -0,0 +1,331 @@
+"""
+Microbenchmarks of the per-request hot functions.
+
+Times User-Agent detection (is_android, get_env_type, is_risky_environment),
+phone handling (validate_phone, build_wa_me_url) and rendering of each of
+the eight pages, over the corpus from benchmarks.ua_corpus.
+
+Detection and phone handling sit behind LRU caches, so each is measured
+twice:
+    miss  caches cleared before every pass over the whole corpus
+    hit   a warm pass over as many inputs as the cache holds
+
+Each sample is one or more untimed setup + timed passes, sized to last at
+least --min-time; samples of all benchmarks are interleaved so drift in
+machine speed hits every benchmark alike. Reported per call: the median,
+its 95% confidence interval (distribution-free, from order statistics) and
+the minimum. A relative interval of ±2% or less is tight enough to resolve
+a 5% change; noisier benchmarks are marked with "~".
+
+Run:
+    python -m benchmarks.micro [--repeat N] [--filter NAME]
+                               [--corpus user_agents.txt]
+                               [--output micro.json]
+                               [--compare baseline.json [--threshold 0.05]]
+
+With --compare, a benchmark counts as changed when the confidence
+intervals do not overlap, and the run exits with status 1 if any got
+slower by more than the threshold.
+"""
+
+import argparse
+import gc
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app import templates, utils
+from app.config import settings
+from benchmarks import ua_corpus
+
+MESSAGES = (
+    None,
+    "Hi",
+    "Hi Tal, I saw your ad on LinkedIn",
+    "Hello! I'm interested in the role & would like to know more 🙂",
+)
+
+
+class Benchmark:
+    """
+    One benchmark: a function called once per input in each pass.
+
+    Args:
+        name: Name shown in the report
+        fn: Function under test, called as fn(*args) for each input
+        inputs: Argument tuples, one call per tuple
+        setup: Untimed preparation before each pass
+    """
+
+    __slots__ = ("name", "fn", "inputs", "setup", "passes", "samples")
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        inputs: Sequence[tuple],
+        setup: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.setup = setup
+        self.passes = 1
+        self.samples: List[float] = []
+
+    def run_pass(self) -> float:
+        """Run setup and one timed pass; return the elapsed nanoseconds."""
+        if self.setup is not None:
+            self.setup()
+        fn = self.fn
+        inputs = self.inputs
+        clock = time.perf_counter_ns
+        start = clock()
+        for args in inputs:
+            fn(*args)
+        return clock() - start
+
+    def calibrate(self, min_time: float) -> None:
+        """Pick the number of passes per sample so a sample lasts min_time."""
+        elapsed = min(self.run_pass() for _ in range(3))
+        self.passes = max(1, math.ceil(min_time * 1e9 / max(elapsed, 1)))
+
+    def sample(self) -> None:
+        """Record one sample, in nanoseconds per call."""
+        total = sum(self.run_pass() for _ in range(self.passes))
+        self.samples.append(total / (self.passes * len(self.inputs)))
+
+
+def median_ci(samples: List[float], z: float = 1.96) -> tuple:
+    """
+    Distribution-free confidence interval of the median.
+
+    Returns:
+        (low, high): order statistics around the median, about 95% coverage
+    """
+    ordered = sorted(samples)
+    n = len(ordered)
+    half_width = z * math.sqrt(n) / 2
+    low = max(0, math.floor(n / 2 - half_width))
+    high = min(n - 1, math.ceil(n / 2 + half_width) - 1)
+    return ordered[low], ordered[high]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    median = statistics.median(samples)
+    low, high = median_ci(samples)
+    return {
+        "median_ns": round(median, 2),
+        "ci_low_ns": round(low, 2),
+        "ci_high_ns": round(high, 2),
+        "min_ns": round(min(samples), 2),
+        "ci_percent": round(max(median - low, high - median) / median * 100, 2),
+        "samples": len(samples),
+    }
+
+
+# =============================================================================
+# Benchmarks
+# =============================================================================
+
+
+def _warm(fn: Callable[[str], Any], inputs: Sequence[str]) -> Callable[[], None]:
+    def setup() -> None:
+        for value in inputs:
+            fn(value)
+
+    return setup
+
+
+def build_benchmarks(user_agents: List[str], phones: List[str]) -> List[Benchmark]:
+    benchmarks: List[Benchmark] = []
+
+    ua_args = [(ua,) for ua in user_agents]
+    ua_hot = user_agents[: settings.ua_cache_size]
+    for fn in (utils.is_android, utils.get_env_type, utils.is_risky_environment):
+        benchmarks.append(
+            Benchmark(f"{fn.__name__} miss", fn, ua_args, utils.classify_ua.cache_clear)
+        )
+        benchmarks.append(
+            Benchmark(f"{fn.__name__} hit", fn, [(ua,) for ua in ua_hot], _warm(fn, ua_hot))
+        )
+
+    phone_hot = phones[: settings.phone_cache_size]
+    benchmarks.append(
+        Benchmark(
+            "validate_phone miss",
+            utils.validate_phone,
+            [(phone,) for phone in phones],
+            utils.normalize_phone.cache_clear,
+        )
+    )
+    benchmarks.append(
+        Benchmark(
+            "validate_phone hit",
+            utils.validate_phone,
+            [(phone,) for phone in phone_hot],
+            _warm(utils.validate_phone, phone_hot),
+        )
+    )
+    url_args = [(phone, MESSAGES[i % len(MESSAGES)]) for i, phone in enumerate(phones)]
+    benchmarks.append(
+        Benchmark(
+            "build_wa_me_url miss",
+            utils.build_wa_me_url,
+            url_args,
+            utils.normalize_phone.cache_clear,
+        )
+    )
+    url_hot = url_args[: settings.phone_cache_size]
+
+    def warm_urls() -> None:
+        for args in url_hot:
+            utils.build_wa_me_url(*args)
+
+    benchmarks.append(
+        Benchmark("build_wa_me_url hit", utils.build_wa_me_url, url_hot, warm_urls)
+    )
+
+    # Page values as the routes fill them in, from valid phones
+    targets = [
+        utils.LinkTarget(phone, MESSAGES[i % len(MESSAGES)])
+        for i, phone in enumerate(phones)
+    ]
+    targets = [target for target in targets if not target.error][:500]
+    values = [
+        {
+            "phone": target.clean_phone,
+            "text": target.message,
+            "wa_url": target.wa_url,
+            "wa_url_encoded": target.wa_url_encoded,
+            "text_encoded": target.text_encoded,
+            "chrome_intent_url": target.chrome_intent_url,
+            "error_message": "Invalid phone number.",
+            "error_code": "INVALID_PHONE",
+        }
+        for target in targets
+    ]
+    for name in templates.PAGE_SOURCES:
+        page = templates.get_page(name)
+        page_values = [
+            ({field: value[field] for field in page.fields},) for value in values
+        ]
+        benchmarks.append(
+            Benchmark(f"render {name}", lambda v, render=page.render: render(**v), page_values)
+        )
+
+    return benchmarks
+
+
+# =============================================================================
+# Report & comparison
+# =============================================================================
+
+
+def print_report(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'benchmark':<28} {'median ns':>10} {'95% CI':>9} {'min ns':>9}")
+    for name, r in results.items():
+        noisy = "~" if r["ci_percent"] > 2 else ""
+        print(
+            f"{name:<28} {r['median_ns']:>10.1f} {'±' + format(r['ci_percent'], '.1f') + '%':>9}"
+            f" {r['min_ns']:>9.1f} {noisy}"
+        )
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """
+    Compare results against a baseline.
+
+    Returns:
+        Names of the benchmarks that got significantly slower beyond the threshold
+    """
+    regressions: List[str] = []
+    print(f"\n{'benchmark':<28} {'change':>8}   vs baseline")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = current["median_ns"] / base["median_ns"] - 1
+        significant = (
+            current["ci_low_ns"] > base["ci_high_ns"]
+            or current["ci_high_ns"] < base["ci_low_ns"]
+        )
+        verdict = ("slower" if change > 0 else "faster") if significant else "same"
+        print(f"{name:<28} {change:>+8.1%}   {verdict}")
+        if significant and change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="file with one User-Agent per line")
+    parser.add_argument("--size", type=int, default=3000, help="synthetic corpus size")
+    parser.add_argument("--repeat", type=int, default=40, help="samples per benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="discarded samples")
+    parser.add_argument("--min-time", type=float, default=0.02, help="seconds per sample")
+    parser.add_argument("--filter", help="only benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.05)
+    args = parser.parse_args()
+
+    user_agents = ua_corpus.load(args.corpus, args.size)
+    benchmarks = build_benchmarks(user_agents, ua_corpus.phone_inputs())
+    if args.filter:
+        benchmarks = [b for b in benchmarks if args.filter in b.name]
+
+    print(
+        f"{len(user_agents)} User-Agents, {len(benchmarks)} benchmarks, "
+        f"{args.repeat} samples each"
+    )
+    gc.collect()
+    gc.disable()  # collections would land in random samples
+    try:
+        for benchmark in benchmarks:
+            benchmark.calibrate(args.min_time)
+        for round_ in range(args.warmup + args.repeat):
+            for benchmark in benchmarks:
+                benchmark.sample()
+                if round_ < args.warmup:
+                    benchmark.samples.clear()
+            gc.collect()
+    finally:
+        gc.enable()
+
+    results = {b.name: summarize(b.samples) for b in benchmarks}
+    print_report(results)
+
+    if args.output:
+        report = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": args.corpus or f"synthetic:{args.size}",
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nSlower beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNothing slower beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
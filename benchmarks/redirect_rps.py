@@ -0,0 +1,109 @@
+"""
+Requests per second of /w on one worker, with and without the fast path.
+
+Drives the full ASGI application (middleware, logging, metrics) in-process
+on a single event loop, so the numbers are the per-worker CPU ceiling
+without any socket or HTTP parsing overhead. Each configuration runs in its
+own process because the middleware stack is built from settings at import.
+Rate limiting is disabled (every request comes from the same client) and
+metrics go to a temporary directory.
+
+Run:
+    python -m benchmarks.redirect_rps [--requests N] [--repeat N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import QUERY, isolated_env, make_scope, ua_sequence
+
+CONFIGS = {
+    "router": {"ENABLE_FAST_PATH": "false"},
+    "fast path": {"ENABLE_FAST_PATH": "true"},
+}
+
+
+async def run_requests(app: Any, count: int) -> float:
+    """Send `count` requests through the app; return the elapsed seconds."""
+    statuses: List[int] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    scopes = [make_scope("/w", QUERY, ua) for ua in ua_sequence()]
+    start = time.perf_counter()
+    for i in range(count):
+        await app(dict(scopes[i % len(scopes)]), receive, send)
+    elapsed = time.perf_counter() - start
+
+    if set(statuses) != {302}:
+        raise RuntimeError(f"Unexpected statuses: {sorted(set(statuses))}")
+    return elapsed
+
+
+def child(requests: int, repeat: int, output: str) -> None:
+    """Measure the configuration selected by the environment."""
+    from main import app
+
+    async def measure() -> List[float]:
+        await run_requests(app, min(requests, 1000))  # warmup
+        return [requests / await run_requests(app, requests) for _ in range(repeat)]
+
+    with open(output, "w") as f:
+        json.dump(asyncio.run(measure()), f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", metavar="OUTPUT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests, args.repeat, args.child)
+        return
+
+    results: Dict[str, List[float]] = {}
+    for name, overrides in CONFIGS.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "result.json")
+            env = isolated_env(tmp, **overrides)
+            subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.redirect_rps",
+                    "--requests", str(args.requests),
+                    "--repeat", str(args.repeat),
+                    "--child", output,
+                ],
+                env=env,
+                stdout=subprocess.DEVNULL,  # request logs
+                check=True,
+            )
+            with open(output) as f:
+                results[name] = json.load(f)
+
+    baseline = max(next(iter(results.values())))
+    print(f"{'/w':<12} {'max rps':>9} {'median rps':>11} {'speedup':>8}")
+    for name, samples in results.items():
+        best = max(samples)
+        print(
+            f"{name:<12} {best:>9.0f} {statistics.median(samples):>11.0f}"
+            f" {best / baseline:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Cold start: import time of the app and time to the first redirect.
+
+Each run starts fresh processes with ENVIRONMENT=production, as a deploy
+waking from sleep would:
+
+    import   ``import main`` in a new interpreter; also reports how many
+             modules it loaded and checks that the lazily loaded pieces
+             (LAZY_MODULES, the compiled pages) were left alone
+    first    a uvicorn worker from process start to the first 302 from
+             /w, and to the port accepting connections
+
+Run:
+    python -m benchmarks.startup [--runs N] [--output startup.json]
+                                 [--compare baseline.json [--threshold 0.15]]
+
+Exits with status 1 if startup loaded something it should load lazily, or
+with --compare, if import or first-response time grew beyond the threshold.
+"""
+
+import argparse
+import json
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from benchmarks.common import QUERY, free_port, isolated_env, start_uvicorn
+
+# Modules only some requests or deployments need; none may load at startup
+LAZY_MODULES = ("cProfile", "pstats", "sqlite3", "pythonjsonlogger")
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+from app import templates
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "modules": len(sys.modules),
+    "eager": [name for name in %r if name in sys.modules],
+    "pages_compiled": templates._compiled_pages.cache_info().currsize > 0,
+}))
+"""
+
+
+def measure_import(env: Dict[str, str]) -> Dict[str, Any]:
+    """Import main in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE % (LAZY_MODULES,)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response(env: Dict[str, str]) -> Dict[str, float]:
+    """Start uvicorn and time its first /w response."""
+    port = free_port()
+    request = (
+        f"GET /w?{QUERY} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+    ).encode("latin-1")
+
+    start = time.perf_counter()
+    server = start_uvicorn(port, env)
+    try:
+        while True:
+            try:
+                connection = socket.create_connection(("127.0.0.1", port), timeout=10)
+                break
+            except OSError:
+                if server.poll() is not None or time.perf_counter() - start > 30:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.002)
+        listening = time.perf_counter() - start
+
+        with connection:
+            connection.sendall(request)
+            response = b""
+            while b"\r\n" not in response:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+        first = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    status = response.split(b" ", 2)[1:2]
+    if status != [b"302"]:
+        raise RuntimeError(f"First response was not a 302: {response[:80]!r}")
+    return {"listening_ms": listening * 1000, "first_response_ms": first * 1000}
+
+
+def median_of(runs: List[Dict[str, Any]], key: str) -> float:
+    return round(statistics.median(run[key] for run in runs), 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = isolated_env(tmp, ENVIRONMENT="production")
+        measure_import(env)  # warm the OS file cache and write bytecode
+        imports = [measure_import(env) for _ in range(args.runs)]
+        starts = [measure_first_response(env) for _ in range(args.runs)]
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "import_ms": median_of(imports, "import_ms"),
+        "modules": imports[0]["modules"],
+        "listening_ms": median_of(starts, "listening_ms"),
+        "first_response_ms": median_of(starts, "first_response_ms"),
+        "eager": imports[0]["eager"],
+        "pages_compiled": imports[0]["pages_compiled"],
+    }
+
+    print(f"import main        {report['import_ms']:>8.1f} ms  ({report['modules']} modules)")
+    print(f"port listening     {report['listening_ms']:>8.1f} ms")
+    print(f"first 302          {report['first_response_ms']:>8.1f} ms")
+    print(f"(median of {args.runs} runs)")
+
+    failures = []
+    if report["eager"]:
+        failures.append(f"loaded at startup: {', '.join(report['eager'])}")
+    if report["pages_compiled"]:
+        failures.append("pages compiled at import")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n{'metric':<18} {'change':>8}   vs baseline")
+        for key in ("import_ms", "first_response_ms"):
+            change = report[key] / baseline[key] - 1
+            print(f"{key:<18} {change:>+8.1%}")
+            if change > args.threshold:
+                failures.append(f"{key} {change:+.1%}")
+
+    if failures:
+        print("\nFAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
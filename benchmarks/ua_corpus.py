@@ -0,0 +1,334 @@
+"""
+Corpus of User-Agent strings and phone inputs for the microbenchmarks.
+
+The UA corpus is built deterministically from the UA formats that reach the
+redirect routes: Android and iOS browsers, the LinkedIn, Facebook,
+Instagram and Twitter in-app browsers on both, desktop browsers, link
+preview bots and bare clients, across many device models and app and
+browser versions. The same seed always gives the same corpus, so runs stay
+comparable. A file of captured User-Agents (one per line, e.g. pulled from
+the request logs) can be used instead.
+
+Run ``python -m benchmarks.ua_corpus`` to print the corpus.
+"""
+
+import random
+from typing import Callable, List, Optional, Tuple
+
+SEED = 20240601
+
+ANDROID_DEVICES = (
+    "SM-S918B", "SM-S911B", "SM-A525F", "SM-A546E", "SM-A146P", "SM-M336BU",
+    "SM-G991B", "SM-G780G", "SM-F946B", "SM-A055F", "Pixel 8", "Pixel 8 Pro",
+    "Pixel 7", "Pixel 7a", "Pixel 6", "Pixel 6a", "Redmi Note 9 Pro",
+    "Redmi Note 12", "Redmi Note 13 Pro", "M2101K6G", "2201116PI", "23021RAAEG",
+    "CPH2487", "CPH2381", "CPH2527", "RMX3686", "RMX3771", "RMX3085",
+    "V2202", "V2231", "V2318", "IN2023", "NE2211", "PHB110", "LE2111",
+    "moto g54 5G", "moto g(60)", "motorola edge 40", "Nokia G21", "itel A70",
+    "Infinix X6831", "TECNO KI5q", "A063", "22101320I",
+)
+ANDROID_BUILDS = (
+    "TP1A.220624.014", "SP1A.210812.016", "TQ3A.230901.001", "RKQ1.200826.002",
+    "UP1A.231005.007", "AP1A.240305.019", "SKQ1.211019.001", "QP1A.190711.020",
+    "UKQ1.230917.001", "RP1A.200720.011",
+)
+IOS_DEVICES = ("iPhone", "iPad")
+IOS_VERSIONS = (
+    "15_7", "15_8", "16_1", "16_3_1", "16_5", "16_6_1", "16_7_2", "17_0_3",
+    "17_1_2", "17_2_1", "17_3", "17_4", "17_4_1", "17_5", "17_5_1", "18_0",
+)
+IOS_MODELS = (
+    "iPhone12,1", "iPhone13,2", "iPhone13,4", "iPhone14,2", "iPhone14,5",
+    "iPhone14,7", "iPhone15,2", "iPhone15,3", "iPhone15,4", "iPhone16,1",
+    "iPhone16,2", "iPad13,18",
+)
+
+
+def _chrome(rng: random.Random) -> str:
+    major = rng.randint(108, 126)
+    return f"{major}.0.{rng.randint(5300, 6500)}.{rng.randint(10, 220)}"
+
+
+def _android_version(rng: random.Random) -> str:
+    return str(rng.choice((10, 11, 12, 13, 13, 14, 14, 14)))
+
+
+def _android_base(rng: random.Random, webview: bool) -> str:
+    device = rng.choice(ANDROID_DEVICES)
+    version = _android_version(rng)
+    if webview:
+        build = rng.choice(ANDROID_BUILDS)
+        return (
+            f"Mozilla/5.0 (Linux; Android {version}; {device} Build/{build}; wv) "
+            f"AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 "
+            f"Chrome/{_chrome(rng)} Mobile Safari/537.36"
+        )
+    return (
+        f"Mozilla/5.0 (Linux; Android {version}; {device}) AppleWebKit/537.36 "
+        f"(KHTML, like Gecko) Chrome/{_chrome(rng)} Mobile Safari/537.36"
+    )
+
+
+def _ios_base(rng: random.Random) -> str:
+    version = rng.choice(IOS_VERSIONS)
+    device = rng.choice(IOS_DEVICES)
+    os_name = "CPU iPhone OS" if device == "iPhone" else "CPU OS"
+    return (
+        f"Mozilla/5.0 ({device}; {os_name} {version} like Mac OS X) "
+        f"AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148"
+    )
+
+
+def android_chrome(rng: random.Random) -> str:
+    return _android_base(rng, webview=False)
+
+
+def android_samsung(rng: random.Random) -> str:
+    device = rng.choice(ANDROID_DEVICES[:10])
+    return (
+        f"Mozilla/5.0 (Linux; Android {_android_version(rng)}; {device}) "
+        f"AppleWebKit/537.36 (KHTML, like Gecko) "
+        f"SamsungBrowser/{rng.randint(20, 25)}.0 Chrome/{_chrome(rng)} "
+        f"Mobile Safari/537.36"
+    )
+
+
+def android_linkedin(rng: random.Random) -> str:
+    return (
+        f"{_android_base(rng, webview=True)} "
+        f"[LinkedInApp]/{rng.choice((4, 9))}.{rng.randint(1, 30)}.{rng.randint(100, 9999)}"
+    )
+
+
+def android_facebook(rng: random.Random) -> str:
+    app = rng.choice(("FB4A", "Orca-Android"))
+    return (
+        f"{_android_base(rng, webview=True)} "
+        f"[FB_IAB/{app};FBAV/{rng.randint(400, 470)}.0.0.{rng.randint(10, 60)}."
+        f"{rng.randint(100, 120)};]"
+    )
+
+
+def android_instagram(rng: random.Random) -> str:
+    return (
+        f"{_android_base(rng, webview=True)} "
+        f"Instagram {rng.randint(280, 340)}.0.0.{rng.randint(10, 40)}.{rng.randint(50, 120)} "
+        f"Android ({rng.randint(29, 34)}/{_android_version(rng)}; "
+        f"{rng.choice((420, 440, 480, 560))}dpi; 1080x{rng.choice((2220, 2340, 2400))}; "
+        f"samsung; {rng.choice(ANDROID_DEVICES)}; qcom; en_IN; {rng.randint(400000000, 599999999)})"
+    )
+
+
+def android_twitter(rng: random.Random) -> str:
+    return f"{_android_base(rng, webview=True)} TwitterAndroid"
+
+
+def android_other_webview(rng: random.Random) -> str:
+    suffix = rng.choice(
+        (
+            "GSA/15.9.37.29.arm64",
+            "musical_ly_2023405030 JsSdk/1.0 NetType/WIFI Channel/googleplay",
+            "Snapchat/12.70.0.44 (SM-A525F; Android 13#A525FXXU6EWH1#33; gzip)",
+            "Line/13.21.2/IAB",
+            "WhatsApp/2.24.10.74",
+            "",
+        )
+    )
+    return f"{_android_base(rng, webview=True)} {suffix}".rstrip()
+
+
+def ios_safari(rng: random.Random) -> str:
+    base = _ios_base(rng)
+    return base.replace(
+        "Mobile/15E148",
+        f"Version/{rng.choice(('15.6', '16.6', '17.4', '17.5', '18.0'))} "
+        f"Mobile/15E148 Safari/604.1",
+    )
+
+
+def ios_chrome(rng: random.Random) -> str:
+    return _ios_base(rng).replace(
+        "Mobile/15E148", f"CriOS/{_chrome(rng)} Mobile/15E148 Safari/604.1"
+    )
+
+
+def ios_linkedin(rng: random.Random) -> str:
+    return (
+        f"{_ios_base(rng)} [LinkedInApp]/{rng.choice((9, 10))}.{rng.randint(0, 30)}."
+        f"{rng.randint(100, 9999)}"
+    )
+
+
+def ios_facebook(rng: random.Random) -> str:
+    return (
+        f"{_ios_base(rng)} [FBAN/FBIOS;FBAV/{rng.randint(400, 470)}.0.0.{rng.randint(10, 60)}."
+        f"{rng.randint(100, 120)};FBBV/{rng.randint(500000000, 599999999)};"
+        f"FBDV/{rng.choice(IOS_MODELS)};FBMD/iPhone;FBSN/iOS;FBSV/"
+        f"{rng.choice(IOS_VERSIONS).replace('_', '.')};FBSS/3;FBID/phone;FBLC/en_US;FBOP/5]"
+    )
+
+
+def ios_instagram(rng: random.Random) -> str:
+    return (
+        f"{_ios_base(rng)} Instagram {rng.randint(280, 340)}.0.0.{rng.randint(10, 40)}."
+        f"{rng.randint(50, 120)} ({rng.choice(IOS_MODELS)}; iOS "
+        f"{rng.choice(IOS_VERSIONS)}; en_US; en; scale=3.00; 1170x2532; "
+        f"{rng.randint(500000000, 599999999)})"
+    )
+
+
+def ios_twitter(rng: random.Random) -> str:
+    return f"{_ios_base(rng)} Twitter for iPhone/{rng.randint(9, 10)}.{rng.randint(0, 60)}"
+
+
+def desktop(rng: random.Random) -> str:
+    platform = rng.choice(
+        (
+            "Windows NT 10.0; Win64; x64",
+            "Macintosh; Intel Mac OS X 10_15_7",
+            "X11; Linux x86_64",
+            "X11; Ubuntu; Linux x86_64",
+        )
+    )
+    browser = rng.choice(("chrome", "chrome", "edge", "firefox", "safari"))
+    if browser == "firefox":
+        version = rng.randint(110, 127)
+        return f"Mozilla/5.0 ({platform}; rv:{version}.0) Gecko/20100101 Firefox/{version}.0"
+    if browser == "safari" and platform.startswith("Macintosh"):
+        return (
+            f"Mozilla/5.0 ({platform}) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+            f"Version/{rng.choice(('16.6', '17.4.1', '17.5'))} Safari/605.1.15"
+        )
+    chrome = _chrome(rng)
+    ua = (
+        f"Mozilla/5.0 ({platform}) AppleWebKit/537.36 (KHTML, like Gecko) "
+        f"Chrome/{chrome} Safari/537.36"
+    )
+    if browser == "edge":
+        ua += f" Edg/{chrome.split('.')[0]}.0.{rng.randint(2000, 2600)}.{rng.randint(10, 99)}"
+    return ua
+
+
+def desktop_linkedin(rng: random.Random) -> str:
+    return (
+        f"LinkedInApp/{rng.randint(1, 3)}.{rng.randint(0, 9)} "
+        f"(Macintosh; Intel Mac OS X 10_15_7) Electron/{rng.randint(20, 30)}.0.0"
+    )
+
+
+def bot(rng: random.Random) -> str:
+    return rng.choice(
+        (
+            "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+            "LinkedInBot/1.0 (compatible; Mozilla/5.0; Apache-HttpClient +http://www.linkedin.com)",
+            "Twitterbot/1.0",
+            "WhatsApp/2.23.20.0",
+            "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+            "Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)",
+            "TelegramBot (like TwitterBot)",
+            f"curl/{rng.choice(('7.88.1', '8.4.0', '8.7.1'))}",
+            f"python-requests/2.{rng.randint(25, 32)}.0",
+            "Go-http-client/1.1",
+            "",
+        )
+    )
+
+
+# (generator, share of the corpus), roughly the mix of LinkedIn ad traffic
+GENERATORS: List[Tuple[Callable[[random.Random], str], int]] = [
+    (android_linkedin, 22),
+    (ios_linkedin, 14),
+    (android_chrome, 12),
+    (ios_safari, 10),
+    (desktop, 9),
+    (android_facebook, 6),
+    (android_instagram, 6),
+    (ios_facebook, 4),
+    (ios_instagram, 4),
+    (android_samsung, 3),
+    (ios_chrome, 3),
+    (android_twitter, 2),
+    (ios_twitter, 1),
+    (android_other_webview, 2),
+    (desktop_linkedin, 1),
+    (bot, 1),
+]
+
+
+def generate(size: int = 3000, seed: int = SEED) -> List[str]:
+    """
+    Build the synthetic UA corpus.
+
+    Args:
+        size: Number of distinct User-Agents
+        seed: Random seed; the same seed gives the same corpus
+
+    Returns:
+        Distinct User-Agent strings, in a shuffled but fixed order
+    """
+    rng = random.Random(seed)
+    generators = [g for g, _ in GENERATORS]
+    weights = [w for _, w in GENERATORS]
+    seen = set()
+    corpus: List[str] = []
+    attempts = 0
+    while len(corpus) < size:
+        attempts += 1
+        if attempts > size * 100:
+            raise RuntimeError(f"Could only generate {len(corpus)} distinct User-Agents")
+        ua = rng.choices(generators, weights)[0](rng)
+        if ua not in seen:
+            seen.add(ua)
+            corpus.append(ua)
+    return corpus
+
+
+def load(path: Optional[str] = None, size: int = 3000) -> List[str]:
+    """
+    Load the UA corpus.
+
+    Args:
+        path: File with one User-Agent per line; None for the synthetic corpus
+        size: Size of the synthetic corpus
+
+    Returns:
+        Distinct User-Agent strings
+    """
+    if path is None:
+        return generate(size)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return list(dict.fromkeys(line.rstrip("\r\n") for line in f))
+
+
+def phone_inputs(size: int = 2000, seed: int = SEED) -> List[str]:
+    """
+    Phone query values as they arrive: E.164 digits, with a leading +,
+    spaces, dashes or parentheses, a leading 00, and some invalid values.
+    """
+    rng = random.Random(seed)
+    country_codes = ("91", "91", "91", "1", "44", "971", "65", "61", "49", "234")
+    phones: List[str] = []
+    for _ in range(size):
+        cc = rng.choice(country_codes)
+        national = "".join(rng.choice("0123456789") for _ in range(10 if cc != "65" else 8))
+        national = str(rng.randint(6, 9)) + national[1:]
+        style = rng.randrange(8)
+        if style == 0:
+            phone = f"+{cc} {national[:5]} {national[5:]}"
+        elif style == 1:
+            phone = f"+{cc}-{national[:3]}-{national[3:6]}-{national[6:]}"
+        elif style == 2:
+            phone = f"00{cc}{national}"
+        elif style == 3:
+            phone = f"({cc}) {national}"
+        elif style == 4:
+            phone = national[:rng.randint(4, 7)]  # too short
+        else:
+            phone = f"{cc}{national}"
+        phones.append(phone)
+    return phones
+
+
+if __name__ == "__main__":
+    for user_agent in generate():
+        print(user_agent)
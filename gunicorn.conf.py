@@ -0,0 +1,54 @@
+"""
+Gunicorn configuration for production.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The bind address, the number of workers and preloading come from the app
+settings (HOST, PORT, WORKERS, PRELOAD_APP).
+
+With PRELOAD_APP on, the master imports the app once, builds its read-only
+state and freezes it (app.preload); the workers are then forked with that
+state shared copy-on-write instead of each importing the app on its own.
+"""
+
+import gc
+
+from app.config import settings
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.workers
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = settings.preload_app
+
+accesslog = "-"
+errorlog = "-"
+capture_output = True
+enable_stdio_inheritance = True
+
+if preload_app:
+    # No collections in the master while it imports the app: objects freed
+    # there would leave holes in the pages the workers are about to share
+    gc.disable()
+
+
+def on_starting(server):
+    """Master is starting: drop the metrics and click files of earlier runs."""
+    from app.clicks import clear_click_files
+    from app.metrics import clear_metrics_dir
+
+    clear_metrics_dir()
+    clear_click_files()
+
+
+def when_ready(server):
+    """Master is listening, app imported, no worker forked yet."""
+    if preload_app:
+        from app.preload import prepare
+
+        prepare()
+
+
+def post_fork(server, worker):
+    """Each worker collects its own garbage; the frozen state is skipped."""
+    if preload_app:
+        gc.enable()
@@ -7,20 +7,28 @@ restrictive environments like LinkedIn's Android webview gracefully.
 Run locally:
     uvicorn main:app --reload
 
-Run in production:
-    gunicorn main:app -w 4 -k uvicorn.workers.UvicornWorker -b 0.0.0.0:8000
+Run in production (settings in gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py main:app
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app import __version__
+from app.clicks import click_counters
+from app.compression import CompressionMiddleware
 from app.config import settings
-from app.logging_config import get_logger
-from app.middleware import RequestTrackingMiddleware, SecurityHeadersMiddleware
+from app.fast_path import FastPathMiddleware
+from app.journal import click_journal
+from app.logging_config import get_logger, shutdown_logging
+from app.middleware import RequestTrackingMiddleware
+from app.profiling import ProfilingMiddleware, profiles, profiling_enabled
+from app.rate_limit import RateLimitMiddleware, rate_limiter
 from app.routes import router
+from app.warmup import warm_up, warmup_state
 
 logger = get_logger("main")
 
@@ -38,9 +46,35 @@ async def lifespan(app: FastAPI):
             "port": settings.port,
         },
     )
+    warmup = None
+    if settings.enable_warmup:
+        # In the background: the worker accepts connections (and answers
+        # /health) meanwhile, while /ready stays 503 until it is done
+        warmup = asyncio.create_task(warm_up(app, settings.warmup_requests_per_route))
+    else:
+        warmup_state.ready = True
+    summaries = publishing = None
+    if click_counters is not None and settings.click_summary_interval > 0:
+        summaries = asyncio.create_task(
+            click_counters.run_summaries(settings.click_summary_interval)
+        )
+    if click_counters is not None:
+        publishing = asyncio.create_task(
+            click_counters.run_publishing(settings.click_publish_interval)
+        )
     yield
     # Shutdown
+    if warmup is not None:
+        warmup.cancel()
+    if publishing is not None:
+        publishing.cancel()
+    if summaries is not None:
+        summaries.cancel()
+        click_counters.summarize()  # clicks since the last summary
+    if click_journal is not None:
+        click_journal.stop()  # commit the clicks still queued
     logger.info("Shutting down Tal Redirector")
+    shutdown_logging()
 
 
 # Create FastAPI application
@@ -58,10 +92,19 @@ app = FastAPI(
 # Middleware (order matters - first added = outermost)
 # =============================================================================
 
-# Security headers
-app.add_middleware(SecurityHeadersMiddleware)
+# Redirect 302s served ahead of the router (innermost)
+if settings.enable_fast_path:
+    app.add_middleware(FastPathMiddleware)
 
-# Request tracking and logging
+# HTML compression (inside request tracking, so request timing includes it)
+if settings.enable_compression:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
+# Per-client rate limiting (inside request tracking, so 429s are logged)
+if rate_limiter is not None:
+    app.add_middleware(RateLimitMiddleware, buckets=rate_limiter)
+
+# Request tracking, logging and security headers
 app.add_middleware(RequestTrackingMiddleware)
 
 # CORS
@@ -73,6 +116,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request profiling (outermost, so profiles cover the whole stack)
+if profiling_enabled():
+    app.add_middleware(
+        ProfilingMiddleware,
+        buffer=profiles,
+        secret=settings.profiling_secret,
+        sample_rate=settings.profiling_sample_rate,
+    )
+
 # =============================================================================
 # Routes
 # =============================================================================
@@ -0,0 +1,143 @@
+"""
+Click journal (app.journal): segments written by ClickJournal read back
+through JournalSegment and count_clicks.
+"""
+
+import os
+from typing import Iterator
+
+import pytest
+
+from app.journal import (
+    FLAG_PAGE,
+    HEADER,
+    RECORD,
+    ClickJournal,
+    JournalSegment,
+    count_clicks,
+    segment_paths,
+)
+
+
+@pytest.fixture
+def journal(tmp_path) -> Iterator[ClickJournal]:
+    # Three records per segment; commits are driven by the test (the writer
+    # thread started by the first append waits an hour between commits)
+    journal = ClickJournal(
+        str(tmp_path),
+        segment_bytes=HEADER.size + 3 * RECORD.size,
+        commit_interval=3600,
+        max_pending=1000,
+        ip_salt="test",
+    )
+    yield journal
+    journal.stop()
+
+
+def click(journal: ClickJournal, campaign: str, src: str = "ads", page: bool = False) -> None:
+    journal.append("/w", "android_linkedin_webview", page, src, campaign, None, "203.0.113.7")
+
+
+def test_round_trip_across_segments(journal: ClickJournal, tmp_path) -> None:
+    for campaign in ("spring", "spring", "autumn"):
+        click(journal, campaign)
+    journal._commit_pending()
+    # The first segment is full: these go to a second one, with its own ids
+    click(journal, "autumn", page=True)
+    click(journal, "winter", src="mail")
+    journal._commit_pending()
+    journal.stop()
+
+    paths = segment_paths([str(tmp_path)])
+    assert len(paths) == 2
+    assert journal.stats()["written"] == 5
+
+    with JournalSegment(paths[0]) as segment:
+        records = list(segment.records())
+        assert len(records) == 3
+        timestamp, route, env_type, flags, src, campaign, ad_id, ip_hash = records[0]
+        assert segment.decode("route", route) == "/w"
+        assert segment.decode("env_type", env_type) == "android_linkedin_webview"
+        assert segment.decode("campaign", campaign) == "spring"
+        assert segment.decode("src", src) == "ads"
+        assert segment.decode("ad_id", ad_id) is None
+        assert flags == 0
+        assert ip_hash != 0
+        # The same IP hashes the same way within a journal
+        assert {record[-1] for record in records} == {ip_hash}
+
+    with JournalSegment(paths[1]) as segment:
+        assert [flags for _, _, _, flags, *_ in segment.records()] == [FLAG_PAGE, 0]
+
+    totals, scanned = count_clicks([str(tmp_path)], ["campaign", "src"])
+    assert scanned == 5
+    assert totals == {
+        ("spring", "ads"): 2,
+        ("autumn", "ads"): 2,
+        ("winter", "mail"): 1,
+    }
+
+
+def test_time_range(journal: ClickJournal, tmp_path) -> None:
+    for campaign in ("a", "b"):
+        click(journal, campaign)
+    journal._commit_pending()
+    journal.stop()
+
+    with JournalSegment(segment_paths([str(tmp_path)])[0]) as segment:
+        first, second = (record[0] for record in segment.records())
+    totals, scanned = count_clicks([str(tmp_path)], ["campaign"], since=second)
+    assert (totals, scanned) == ({("b",): 1}, 1)
+    totals, scanned = count_clicks([str(tmp_path)], ["campaign"], until=second)
+    assert (totals, scanned) == ({("a",): 1}, 1)
+
+
+def test_failed_commit_starts_a_new_segment(
+    journal: ClickJournal, tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    click(journal, "kept")
+    journal._commit_pending()
+
+    # The ids of "lost" reach the .strings sidecar, then the record write fails
+    records = journal._records
+
+    class FailingWrite:
+        def write(self, data: bytes) -> int:
+            raise OSError("disk full")
+
+        def __getattr__(self, name: str):
+            return getattr(records, name)
+
+    monkeypatch.setattr(journal, "_records", FailingWrite())
+    click(journal, "lost")
+    click(journal, "lost")
+    journal._commit_pending()
+    monkeypatch.undo()
+    stats = journal.stats()
+    assert (stats["dropped"], stats["errors"], stats["thread_alive"]) == (2, 1, True)
+
+    # Anything else raised by a commit is counted the same way
+    monkeypatch.setattr(journal, "_hash_ip", lambda ip: 1 << 64)  # struct.error
+    click(journal, "also lost")
+    journal._commit_pending()
+    monkeypatch.undo()
+    assert journal.stats()["dropped"] == 3
+    assert journal.stats()["thread_alive"]
+
+    # Later clicks go to a new segment that defines every id it uses,
+    # including those assigned in the segments the failures left behind
+    click(journal, "lost")
+    click(journal, "also lost")
+    click(journal, "after")
+    journal._commit_pending()
+    journal.stop()
+
+    paths = segment_paths([str(tmp_path)])
+    assert len(paths) == 3
+    with JournalSegment(paths[-1]) as segment:
+        assert len(segment) == 3
+    assert os.path.getsize(paths[1]) == HEADER.size  # the failed commit's segment
+
+    totals, scanned = count_clicks([str(tmp_path)], ["campaign"])
+    assert scanned == 4
+    assert totals == {("kept",): 1, ("lost",): 1, ("also lost",): 1, ("after",): 1}
@@ -0,0 +1,87 @@
+"""
+QR encoder (app.qr) against segno, and the /qr route's caching headers.
+
+segno pads a byte-mode bit stream that already ends on a codeword boundary
+with one extra zero byte before the pad codewords; the standard (ISO/IEC
+18004, 7.4.10) adds padding bits only to reach the boundary. The reference
+matrices are built with that step replaced by the standard one.
+"""
+
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.qr import encode
+
+segno = pytest.importorskip("segno")
+segno_encoder = pytest.importorskip("segno.encoder")
+
+# Payload lengths (bytes) and the version each needs at level M: full and
+# padded symbols, versions with version information (7+) and 16-bit
+# character counts (10+), up to the capacity of version 40
+PAYLOADS = {
+    1: 1,
+    14: 1,
+    15: 2,
+    40: 3,
+    120: 7,
+    180: 9,
+    181: 10,
+    230: 11,
+    1000: 26,
+    2331: 40,
+}
+
+
+@pytest.fixture(autouse=True)
+def standard_padding(monkeypatch: pytest.MonkeyPatch) -> None:
+    def write_padding_bits(buff, version, length):
+        if length % 8:
+            buff.extend([0] * (8 - length % 8))
+
+    monkeypatch.setattr(segno_encoder, "write_padding_bits", write_padding_bits)
+
+
+def payload(length: int) -> bytes:
+    return bytes((i * 37 + 11) % 256 for i in range(length))
+
+
+def reference(data: bytes, mask: int) -> List[List[bool]]:
+    qr = segno.make_qr(data, error="m", mask=mask, mode="byte", boost_error=False)
+    return [[bool(module) for module in row] for row in qr.matrix]
+
+
+@pytest.mark.parametrize("length", sorted(PAYLOADS))
+@pytest.mark.parametrize("mask", range(8))
+def test_matrix_matches_reference(length: int, mask: int) -> None:
+    data = payload(length)
+    modules = encode(data, mask)
+    assert len(modules) == PAYLOADS[length] * 4 + 17
+    assert modules == reference(data, mask)
+
+
+@pytest.mark.parametrize("length", [1, 40, 181])
+def test_selected_mask_is_a_valid_symbol(length: int) -> None:
+    # Encoders weigh the mask penalties slightly differently, so the mask
+    # picked may differ from segno's; the symbol must be one of the eight
+    data = payload(length)
+    assert encode(data) in [reference(data, mask) for mask in range(8)]
+
+
+def test_qr_route_revalidates_with_etag() -> None:
+    client = TestClient(main.app)
+    url = "/qr?phone=919876543210&text=Hello"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    etag = response.headers["etag"]
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+    other = client.get(url, headers={"If-None-Match": '"something-else"'})
+    assert other.status_code == 200